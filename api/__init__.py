@@ -0,0 +1 @@
+# HTTP/JSON API package
@@ -0,0 +1,124 @@
+"""
+Minimal HTTP/1.1 framing for the API server: requests with a JSON body,
+JSON responses, keep-alive
+"""
+
+import json
+from datetime import date, datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+MAX_HEADER_LINES = 100
+
+
+class HttpError(Exception):
+    """Ends a request with an error response"""
+
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+        self.message = message or HTTPStatus(status).phrase
+
+
+class RawResponse:
+    """A non-JSON response body, e.g. the Prometheus metrics text"""
+
+    def __init__(self, body, content_type="text/plain; charset=utf-8"):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.content_type = content_type
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body=b""):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.version = version
+        self.headers = headers  # lower-case names
+        self.body = body
+        self.params = {}  # path parameters, set by the router
+        self.route = None  # "METHOD /pattern" of the matched route, for metrics
+        self.user = None  # token claims, set for authenticated routes
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self):
+        """The request body as a JSON object ({} when empty)"""
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HttpError(400, "Request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Request body must be a JSON object")
+        return data
+
+
+async def read_request(reader, max_body_bytes):
+    """Read one request; None when the client closed the connection between requests"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    if not version.startswith("HTTP/1."):
+        raise HttpError(505)
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(431)
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HttpError(411, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > max_body_bytes:
+        raise HttpError(413)
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, version, headers, body)
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, '_asdict'):
+        return value._asdict()
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    # ObjectId and other driver types
+    return str(value)
+
+
+def encode_response(status, payload, keep_alive, extra_headers=None):
+    """Serialize a JSON (or RawResponse) response"""
+    if isinstance(payload, RawResponse):
+        body, content_type = payload.body, payload.content_type
+    else:
+        body = json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+        content_type = "application/json"
+    headers = [
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    for name, value in (extra_headers or {}).items():
+        headers.append(f"{name}: {value}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
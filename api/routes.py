@@ -0,0 +1,326 @@
+"""
+API routes: thin JSON wrappers around the managers. Handlers are plain
+blocking functions; the server runs them on its worker threads.
+"""
+
+import math
+import re
+from api.http import HttpError, RawResponse
+from auth.auth_manager import AuthManager
+from core.ride_manager import RideManager
+from core.payment_manager import PaymentManager
+from db.monitoring import command_monitor
+from utils.metrics import metrics
+from utils.validators import Validators
+
+MAX_PAGE_SIZE = 100
+MAX_SEARCH_KM = 50
+# what a driver sees of an open request before accepting it
+OPEN_RIDE_FIELDS = ("ride_id", "status", "pickup_location", "drop_location", "fare", "requested_at")
+
+
+class Route:
+    def __init__(self, method, pattern, handler, auth=True, role=None):
+        self.method = method
+        self.pattern = pattern
+        # "/rides/{ride_id}/accept" -> named groups
+        self.regex = re.compile("^" + re.sub(r"\{(\w+)\}", r"(?P<\1>[^/]+)", pattern) + "$")
+        self.handler = handler
+        self.auth = auth
+        self.role = role
+
+
+class Router:
+    def __init__(self):
+        self.routes = []
+
+    def add(self, method, pattern, handler, auth=True, role=None):
+        self.routes.append(Route(method, pattern, handler, auth, role))
+
+    def match(self, method, path):
+        """Route and path parameters for a request; HttpError 404/405 when nothing matches"""
+        allowed = False
+        for route in self.routes:
+            match = route.regex.match(path)
+            if match:
+                if route.method == method:
+                    return route, match.groupdict()
+                allowed = True
+        raise HttpError(405 if allowed else 404)
+
+
+def _result(result, failure_status=409):
+    """Response for a manager (success, ..., message) tuple"""
+    success, message = result[0], result[-1]
+    if success:
+        return 200, {"ok": True, "message": message}
+    status = 404 if message.lower().endswith("not found") else failure_status
+    return status, {"ok": False, "error": message}
+
+
+def _page(rows, token):
+    return {"rides": rows, "next": token}
+
+
+def _int_param(request, name, default=None, minimum=None, maximum=None):
+    value = request.query.get(name)
+    if value is None:
+        if default is None:
+            raise HttpError(400, f"Missing query parameter: {name}")
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise HttpError(400, f"Query parameter {name} must be an integer")
+    if minimum is not None and value < minimum or maximum is not None and value > maximum:
+        raise HttpError(400, f"Query parameter {name} is out of range")
+    return value
+
+
+def _float_param(request, name, default=None, minimum=None, maximum=None):
+    value = request.query.get(name)
+    if value is None:
+        if default is None:
+            raise HttpError(400, f"Missing query parameter: {name}")
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        raise HttpError(400, f"Query parameter {name} must be a number")
+    if (not math.isfinite(value) or minimum is not None and value < minimum
+            or maximum is not None and value > maximum):
+        raise HttpError(400, f"Query parameter {name} is out of range")
+    return value
+
+
+def _position(request):
+    """lat/lng query parameters"""
+    return (_float_param(request, "lat", minimum=-90, maximum=90),
+            _float_param(request, "lng", minimum=-180, maximum=180))
+
+
+def _required(data, *fields):
+    missing = [field for field in fields if not data.get(field)]
+    if missing:
+        raise HttpError(400, f"Missing fields: {', '.join(missing)}")
+    return [data[field] for field in fields]
+
+
+class RideApi:
+    """Route handlers. Each takes a Request and returns (status, JSON payload)."""
+
+    def __init__(self, connection, tokens):
+        db = connection.get_database()
+        self.db = db
+        self.tokens = tokens
+        self.ride_manager = RideManager(db)
+        self.payment_manager = PaymentManager(db)
+        self.router = Router()
+        self._add_routes()
+
+    def _add_routes(self):
+        add = self.router.add
+        add("GET", "/health", self.health, auth=False)
+        add("POST", "/auth/register", self.register, auth=False)
+        add("POST", "/auth/login", self.login, auth=False)
+        add("GET", "/me", self.me)
+
+        add("POST", "/rides", self.request_ride, role="rider")
+        add("GET", "/rides/available", self.available_rides, role="driver")
+        add("GET", "/rides/nearby", self.nearby_rides, role="driver")
+        add("GET", "/rides/{ride_id}", self.get_ride)
+        add("POST", "/rides/{ride_id}/accept", self.accept_ride, role="driver")
+        add("POST", "/rides/{ride_id}/start", self.start_ride, role="driver")
+        add("POST", "/rides/{ride_id}/complete", self.complete_ride, role="driver")
+        add("POST", "/rides/{ride_id}/cancel", self.cancel_ride)
+        add("POST", "/rides/{ride_id}/rating", self.rate_ride, role="rider")
+        add("GET", "/dashboard", self.dashboard)
+        add("GET", "/dashboard/{bucket}", self.dashboard_bucket)
+        add("PUT", "/drivers/me/location", self.update_location, role="driver")
+        add("GET", "/drivers/nearest", self.nearest_drivers, role="rider")
+
+        add("GET", "/payments", self.payment_history)
+        add("POST", "/payments", self.process_payment, role="rider")
+        add("GET", "/payments/methods", self.payment_methods, auth=False)
+        add("GET", "/earnings", self.earnings, role="driver")
+
+        add("GET", "/metrics", self.prometheus_metrics, auth=False)
+        add("GET", "/metrics/summary", self.metrics_summary, auth=False)
+
+    def authenticate(self, request, route):
+        """Set request.user from the bearer token; HttpError 401/403 when not allowed"""
+        if not route.auth:
+            return
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        claims = self.tokens.verify(token) if scheme.lower() == "bearer" else None
+        if claims is None:
+            raise HttpError(401, "Missing or invalid token")
+        if route.role and claims["role"] != route.role:
+            raise HttpError(403, f"Only {route.role}s can do this")
+        request.user = claims
+
+    # ---- auth ----
+    def health(self, request):
+        return 200, {"ok": True}
+
+    def register(self, request):
+        data = request.json()
+        email, password, name, phone = _required(data, "email", "password", "name", "phone")
+        user_type = data.get("user_type", "rider")
+        license_number = data.get("license_number")
+        if user_type not in ("rider", "driver"):
+            raise HttpError(400, "user_type must be rider or driver")
+        if not Validators.validate_email(email):
+            raise HttpError(400, "Invalid email")
+        if not Validators.validate_phone(phone):
+            raise HttpError(400, "Invalid phone number")
+        is_valid, message = Validators.validate_password(password)
+        if not is_valid:
+            raise HttpError(400, message)
+        if user_type == "driver" and not (license_number and Validators.validate_license(license_number)):
+            raise HttpError(400, "A valid license number is required for drivers")
+        status, payload = _result(AuthManager(self.db).register_user(
+            email, password, name, phone, user_type, license_number))
+        return (201 if status == 200 else status), payload
+
+    def login(self, request):
+        email, password = _required(request.json(), "email", "password")
+        # a manager per login: AuthManager keeps the logged-in user on the instance
+        auth_manager = AuthManager(self.db)
+        success, message = auth_manager.login_user(email, password)
+        if not success:
+            return 401, {"ok": False, "error": message}
+        user = auth_manager.get_current_user()
+        role = "driver" if hasattr(user, 'license_number') else "rider"
+        return 200, {"ok": True, "token": self.tokens.issue(user.email, role), "role": role,
+                     "expires_in": self.tokens.ttl}
+
+    def me(self, request):
+        user = AuthManager(self.db).get_user_by_email(request.user["sub"])
+        if user is None:
+            raise HttpError(404, "User not found")
+        profile = user.to_dict()
+        profile.pop("password", None)
+        profile["role"] = request.user["role"]
+        return 200, profile
+
+    # ---- rides ----
+    def request_ride(self, request):
+        pickup, drop = _required(request.json(), "pickup_location", "drop_location")
+        success, ride_id, message = self.ride_manager.request_ride(
+            request.user["sub"], Validators.sanitize_input(pickup), Validators.sanitize_input(drop))
+        if not success:
+            return 500, {"ok": False, "error": message}
+        return 201, {"ok": True, "ride_id": ride_id, "message": message}
+
+    def available_rides(self, request):
+        limit = _int_param(request, "limit", RideManager.PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        rows, token = self.ride_manager.get_available_rides_page(limit, request.query.get("after"))
+        return 200, _page([row._replace(rider_email=None) for row in rows], token)
+
+    def nearby_rides(self, request):
+        lat, lng = _position(request)
+        radius_km = _float_param(request, "radius_km", RideManager.NEARBY_RIDES_KM, 0, MAX_SEARCH_KM)
+        limit = _int_param(request, "limit", RideManager.PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        rides = self.ride_manager.get_nearby_rides(lat, lng, radius_km, limit)
+        return 200, {"rides": [dict(row._asdict(), rider_email=None, distance_km=round(distance, 3))
+                               for row, distance in rides]}
+
+    def get_ride(self, request):
+        ride = self.ride_manager.get_ride_by_id(request.params["ride_id"])
+        email = request.user["sub"]
+        # anyone may look at an open request; otherwise only its rider and driver
+        if ride is None or (ride.status != "requested" and email not in (ride.rider_email, ride.driver_email)):
+            raise HttpError(404, "Ride not found")
+        data = ride.to_dict()
+        if email not in (ride.rider_email, ride.driver_email):
+            return 200, {field: data[field] for field in OPEN_RIDE_FIELDS}
+        return 200, data
+
+    def accept_ride(self, request):
+        return _result(self.ride_manager.accept_ride(request.params["ride_id"], request.user["sub"]))
+
+    def start_ride(self, request):
+        return _result(self.ride_manager.start_ride(request.params["ride_id"], request.user["sub"]))
+
+    def complete_ride(self, request):
+        return _result(self.ride_manager.complete_ride(request.params["ride_id"], request.user["sub"]))
+
+    def cancel_ride(self, request):
+        return _result(self.ride_manager.cancel_ride(request.params["ride_id"], request.user["sub"]))
+
+    def rate_ride(self, request):
+        rating = request.json().get("rating")
+        if not isinstance(rating, (int, float)) or isinstance(rating, bool):
+            raise HttpError(400, "rating must be a number")
+        return _result(self.ride_manager.rate_ride(request.params["ride_id"], rating, request.user["sub"]),
+                       failure_status=400)
+
+    def dashboard(self, request):
+        limit = _int_param(request, "limit", RideManager.PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        email, role = request.user["sub"], request.user["role"]
+        if role == "driver":
+            snapshot = self.ride_manager.get_driver_dashboard(email, limit)
+        else:
+            snapshot = self.ride_manager.get_rider_dashboard(email, limit)
+        payload = {bucket: _page(*page) for bucket, page in snapshot.items() if bucket != "counts"}
+        payload["counts"] = snapshot["counts"]
+        return 200, payload
+
+    def dashboard_bucket(self, request):
+        role, bucket = request.user["role"], request.params["bucket"]
+        if bucket not in RideManager.DASHBOARD_BUCKETS[role]:
+            raise HttpError(404, f"Unknown {role} dashboard bucket: {bucket}")
+        limit = _int_param(request, "limit", RideManager.PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        return 200, _page(*self.ride_manager.get_bucket_page(
+            request.user["sub"], role, bucket, limit, request.query.get("after")))
+
+    # ---- driver positions ----
+    def update_location(self, request):
+        data = request.json()
+        lat, lng = data.get("lat"), data.get("lng")
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (lat, lng)):
+            raise HttpError(400, "lat and lng must be numbers")
+        return _result(self.ride_manager.update_driver_location(request.user["sub"], lat, lng),
+                       failure_status=400)
+
+    def nearest_drivers(self, request):
+        lat, lng = _position(request)
+        k = _int_param(request, "k", RideManager.NEAREST_DRIVERS, 1, MAX_PAGE_SIZE)
+        max_km = _float_param(request, "max_km", RideManager.DRIVER_SEARCH_KM, 0, MAX_SEARCH_KM)
+        drivers = self.ride_manager.get_nearest_drivers(lat, lng, k, max_km)
+        # riders see how far away drivers are, not who they are or exactly where
+        return 200, {"drivers": [{"name": driver.name, "distance_km": round(driver.distance_km, 1)}
+                                 for driver in drivers]}
+
+    # ---- payments ----
+    def payment_history(self, request):
+        return 200, {"payments": self.payment_manager.get_payment_history(request.user["sub"])}
+
+    def process_payment(self, request):
+        data = request.json()
+        ride_id, payment_method = _required(data, "ride_id", "payment_method")
+        amount = data.get("amount")
+        if not isinstance(amount, (int, float)) or isinstance(amount, bool) or amount <= 0:
+            raise HttpError(400, "amount must be a positive number")
+        return _result(self.payment_manager.process_payment(ride_id, amount, payment_method, request.user["sub"]),
+                       failure_status=400)
+
+    def payment_methods(self, request):
+        return 200, {"methods": self.payment_manager.get_payment_methods()}
+
+    def earnings(self, request):
+        email = request.user["sub"]
+        if "year" in request.query or "month" in request.query:
+            year = _int_param(request, "year", minimum=2000, maximum=9999)
+            month = _int_param(request, "month", minimum=1, maximum=12)
+            return 200, {"year": year, "month": month,
+                         "earnings": self.payment_manager.get_monthly_earnings(email, year, month)}
+        return 200, {"earnings": self.payment_manager.get_total_earnings(email)}
+
+    # ---- metrics (this process only) ----
+    def prometheus_metrics(self, request):
+        return 200, RawResponse(metrics.render_prometheus(), "text/plain; version=0.0.4")
+
+    def metrics_summary(self, request):
+        return 200, {"operations": metrics.summary(), "database": command_monitor.summary()}
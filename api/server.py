@@ -0,0 +1,262 @@
+"""
+Asyncio HTTP/JSON API server in front of the managers.
+
+    python -m api.server [--host H] [--port P] [--workers N]
+
+Connections are kept alive between requests, at most max_concurrency
+requests are handled at once (the managers run on a thread pool sized like
+the database pool), and SIGTERM stops accepting connections, lets in-flight
+requests finish within shutdown_grace and then exits. With --workers N,
+N processes share the port through SO_REUSEPORT.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.http import HttpError, encode_response, read_request
+from api.settings import ApiSettings
+from db.monitoring import action_scope
+from utils.id_generator import NODE_ID_VAR, IdGenerator
+from utils.log import SAMPLED, configure_logging, get_logger
+from utils.metrics import metrics
+from utils.trace import start_from_env as start_tracing_from_env
+
+HTTP_REQUESTS_TOTAL = "rideapp_http_requests_total"
+HTTP_REQUEST_SECONDS = "rideapp_http_request_duration_seconds"
+metrics.describe(HTTP_REQUESTS_TOTAL, "API requests by route and status")
+metrics.describe(HTTP_REQUEST_SECONDS, "API request latency by route, including queueing")
+
+logger = get_logger("api.server")
+
+
+class ApiServer:
+    def __init__(self, api, settings, worker_threads=4):
+        self.api = api
+        self.settings = settings
+        self._executor = ThreadPoolExecutor(max_workers=worker_threads, thread_name_prefix="api-worker")
+        self._server = None
+        self._semaphore = None
+        self._stopping = None
+        self._connections = set()  # writers of open connections
+        self._busy = set()  # writers with a request in flight
+        self._tasks = set()  # connection handler tasks
+
+    @property
+    def port(self):
+        """Bound port (useful with port 0)"""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self._semaphore = asyncio.Semaphore(self.settings.max_concurrency)
+        self._stopping = asyncio.Event()
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.settings.host, self.settings.port,
+            reuse_port=self.settings.workers > 1 or None
+        )
+
+    def request_stop(self):
+        """Begin a graceful shutdown (safe to call from a signal handler on the loop)"""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def serve(self):
+        """Serve until SIGTERM/SIGINT or request_stop(), then shut down gracefully"""
+        if self._server is None:
+            await self.start()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(signum, self.request_stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # no signal handlers on Windows or off the main thread
+                pass
+        await self._stopping.wait()
+        await self.shutdown()
+
+    async def shutdown(self):
+        self._stopping.set()
+        self._server.close()  # no new connections
+        # idle kept-alive connections close now; busy ones after their response
+        for writer in self._connections - self._busy:
+            writer.close()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.settings.shutdown_grace
+        while self._busy and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for writer in list(self._connections):
+            writer.close()
+        if self._tasks:
+            # handlers see the closed connections and return
+            await asyncio.wait(self._tasks, timeout=1)
+        await self._server.wait_closed()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        self._connections.add(writer)
+        try:
+            for served in range(1, self.settings.max_keepalive_requests + 1):
+                try:
+                    request = await asyncio.wait_for(
+                        read_request(reader, self.settings.max_body_bytes), self.settings.keepalive_timeout)
+                except HttpError as e:
+                    writer.write(encode_response(e.status, {"ok": False, "error": e.message}, False))
+                    await writer.drain()
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+
+                self._busy.add(writer)
+                started = time.perf_counter()
+                try:
+                    status, payload, headers = await self._dispatch(request)
+                finally:
+                    self._busy.discard(writer)
+                elapsed = time.perf_counter() - started
+                labels = {"route": request.route or "unmatched", "status": status}
+                metrics.inc(HTTP_REQUESTS_TOTAL, labels)
+                metrics.observe(HTTP_REQUEST_SECONDS, elapsed, {"route": labels["route"]})
+                logger.info("%s %s %d %.1fms", request.method, request.path, status, elapsed * 1000, extra=SAMPLED)
+                keep_alive = (request.keep_alive and not self._stopping.is_set()
+                              and served < self.settings.max_keepalive_requests)
+                writer.write(encode_response(status, payload, keep_alive, headers))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._connections.discard(writer)
+            self._tasks.discard(task)
+            writer.close()
+
+    async def _dispatch(self, request):
+        """(status, payload, extra headers) for a request"""
+        try:
+            route, request.params = self.api.router.match(request.method, request.path)
+            request.route = f"{route.method} {route.pattern}"
+            self.api.authenticate(request, route)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.settings.queue_timeout)
+            except asyncio.TimeoutError:
+                raise HttpError(503, "Server busy, retry later")
+            try:
+                loop = asyncio.get_running_loop()
+                handler = action_scope(request.route)(route.handler)
+                status, payload = await loop.run_in_executor(self._executor, handler, request)
+            finally:
+                self._semaphore.release()
+            return status, payload, None
+        except HttpError as e:
+            headers = {"Retry-After": "1"} if e.status == 503 else None
+            return e.status, {"ok": False, "error": e.message}, headers
+        except Exception as e:
+            logger.exception("API error on %s %s: %s", request.method, request.path, e)
+            return 500, {"ok": False, "error": "Internal server error"}, None
+
+
+def serve(settings):
+    """Connect to the database and serve in this process; returns an exit code"""
+    from db.connection import db_connection
+    from db.indexes import IndexManager
+    from api.routes import RideApi
+    from api.tokens import TokenSigner
+
+    configure_logging()
+    start_tracing_from_env()
+    if not db_connection.connect():
+        logger.error("Failed to connect to database")
+        return 1
+    try:
+        success, message = IndexManager(db_connection.get_database()).ensure_indexes()
+        if not success:
+            logger.warning(message)
+        api = RideApi(db_connection, TokenSigner(settings.secret, settings.token_ttl))
+        server = ApiServer(api, settings, db_connection.settings.dispatch_workers)
+
+        async def run():
+            await server.start()
+            logger.info("API listening on http://%s:%d (pid %d)", settings.host, server.port, os.getpid())
+            await server.serve()
+
+        asyncio.run(run())
+        return 0
+    finally:
+        db_connection.close()
+
+
+def _serve_worker(settings, node_id):
+    # before the first ride ID: workers sharing a node ID would generate duplicates
+    os.environ[NODE_ID_VAR] = str(node_id)
+    sys.exit(serve(settings))
+
+
+def run_workers(settings):
+    """Run settings.workers server processes sharing the port, each with its own ride ID
+    node ID; SIGTERM is passed on to them"""
+    node_ids = IdGenerator.node_ids(settings.workers)
+    if not settings.secret:
+        # every worker has to accept tokens issued by the others
+        settings.secret = secrets.token_hex(32)
+    # spawn, not fork: database clients must not be shared across a fork
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_serve_worker, args=(settings, node_id), name=f"api-worker-{i}")
+                 for i, node_id in enumerate(node_ids)]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()  # SIGTERM: graceful shutdown in the worker
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+    return max((process.exitcode or 0) for process in processes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ride app HTTP/JSON API server")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--workers", type=int, help="server processes sharing the port")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    settings = ApiSettings.from_env()
+    for attr in ("host", "port", "workers"):
+        if getattr(args, attr) is not None:
+            setattr(settings, attr, getattr(args, attr))
+    if settings.workers > 1:
+        if not hasattr(socket, "SO_REUSEPORT"):
+            logger.warning("--workers needs SO_REUSEPORT; serving from one process")
+            settings.workers = 1
+        else:
+            from db.settings import DatabaseSettings
+            if DatabaseSettings.from_env().backend == "memory":
+                logger.warning("Each worker has its own memory database; use mongo or sqlite to share data")
+            try:
+                return run_workers(settings)
+            except ValueError as e:
+                logger.error("%s", e)
+                return 2
+    return serve(settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+HTTP API server settings
+"""
+
+import os
+
+
+class ApiSettings:
+    """API server settings, overridable with RIDEAPP_API_* environment variables"""
+
+    # environment variable -> (attribute, parser)
+    ENV_VARS = {
+        "RIDEAPP_API_HOST": ("host", str),
+        "RIDEAPP_API_PORT": ("port", int),
+        "RIDEAPP_API_WORKERS": ("workers", int),
+        "RIDEAPP_API_MAX_CONCURRENCY": ("max_concurrency", int),
+        "RIDEAPP_API_QUEUE_TIMEOUT": ("queue_timeout", float),
+        "RIDEAPP_API_KEEPALIVE_TIMEOUT": ("keepalive_timeout", float),
+        "RIDEAPP_API_MAX_KEEPALIVE_REQUESTS": ("max_keepalive_requests", int),
+        "RIDEAPP_API_MAX_BODY_BYTES": ("max_body_bytes", int),
+        "RIDEAPP_API_SHUTDOWN_GRACE": ("shutdown_grace", float),
+        "RIDEAPP_API_SECRET": ("secret", str),
+        "RIDEAPP_API_TOKEN_TTL": ("token_ttl", int),
+    }
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=1, max_concurrency=64,
+                 queue_timeout=5.0, keepalive_timeout=15.0, max_keepalive_requests=1000,
+                 max_body_bytes=64 * 1024, shutdown_grace=10.0, secret=None, token_ttl=3600):
+        self.host = host
+        self.port = port
+        # server processes sharing the port (SO_REUSEPORT); 1 serves from this process
+        self.workers = workers
+        # requests handled at once; the rest wait up to queue_timeout, then get 503
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        # idle seconds before a kept-alive connection is closed, and requests per connection
+        self.keepalive_timeout = keepalive_timeout
+        self.max_keepalive_requests = max_keepalive_requests
+        self.max_body_bytes = max_body_bytes
+        # seconds in-flight requests get to finish after SIGTERM
+        self.shutdown_grace = shutdown_grace
+        # signs login tokens; must be the same for every worker process
+        self.secret = secret
+        self.token_ttl = token_ttl
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Create settings from environment variables"""
+        environ = os.environ if environ is None else environ
+        settings = cls()
+        for var, (attr, parse) in cls.ENV_VARS.items():
+            value = environ.get(var)
+            if value not in (None, ""):
+                setattr(settings, attr, parse(value))
+        return settings
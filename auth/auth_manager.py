@@ -1,10 +1,14 @@
 from db.connection import db_connection
 from models.user import User, Driver, Rider
+from utils.log import get_logger
+from utils.metrics import record_error, timed
 import hashlib
 
+logger = get_logger(__name__)
+
 class AuthManager:
-    def __init__(self):
-        self.db = db_connection.get_database()
+    def __init__(self, db=None):
+        self.db = db if db is not None else db_connection.get_database()
         self.current_user = None
     
     def _hash_password(self, password):
@@ -15,6 +19,7 @@ class AuthManager:
         """Verify password hash"""
         return self._hash_password(password) == hashed
     
+    @timed
     def register_user(self, email, password, name, phone, user_type, license_number=None):
         """Register a new user"""
         try:
@@ -43,6 +48,7 @@ class AuthManager:
         except Exception as e:
             return False, f"Registration failed: {str(e)}"
     
+    @timed
     def login_user(self, email, password):
         """Login user"""
         try:
@@ -80,6 +86,7 @@ class AuthManager:
         """Check if user is logged in"""
         return self.current_user is not None
     
+    @timed
     def update_user_rating(self, email, new_rating):
         """Update user rating"""
         try:
@@ -88,9 +95,26 @@ class AuthManager:
                 {"$set": {"rating": new_rating}}
             )
             return result.modified_count > 0
-        except Exception:
+        except Exception as e:
+            logger.warning("Error updating rating for %s: %s", email, e)
+            record_error()
             return False
     
+    @timed
+    def save_user(self, user):
+        """Write back only the fields changed on a loaded user"""
+        try:
+            update = user.get_update()
+            if update:
+                self.db.users.update_one({"email": user.email}, update)
+                user.mark_clean()
+            return True
+        except Exception as e:
+            logger.warning("Error saving user %s: %s", user.email, e)
+            record_error()
+            return False
+    
+    @timed
     def get_user_by_email(self, email):
         """Get user by email"""
         try:
@@ -101,5 +125,7 @@ class AuthManager:
                 else:
                     return Rider.from_dict(user_data)
             return None
-        except Exception:
+        except Exception as e:
+            logger.warning("Error fetching user %s: %s", email, e)
+            record_error()
             return None
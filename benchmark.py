@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the per-document hot paths: model (de)serialization,
+validators, fare math and nearest-driver lookups, each run over a realistic
+batch (a dashboard page or a full refresh).
+
+    python benchmark.py --save baseline.json      # record a baseline
+    python benchmark.py --compare baseline.json   # fail on regressions
+
+Each benchmark reports the best per-item time over several samples, which
+is the least noisy figure on a busy machine. --compare exits with status 1
+when any benchmark is slower than the baseline by more than --threshold
+(default 10%). Baselines are only comparable on the same machine and
+Python version; a mismatch is reported.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.ride import Ride
+from models.user import Driver, Rider
+from utils.geo_index import GeoGridIndex
+from utils.location_utils import LocationUtils
+from utils.validators import Validators
+
+PAGE = 20  # one dashboard page
+REFRESH = 500  # a full refresh of a busy account
+
+# name -> (make_run(batch) -> zero-argument callable processing the batch, batch size)
+BENCHMARKS = {}
+
+
+def benchmark(name, batch):
+    """Register make_run(batch) under name"""
+    def register(make_run):
+        BENCHMARKS[name] = (make_run, batch)
+        return make_run
+    return register
+
+
+# ---- sample documents, deterministic per batch size ----
+def _ride_documents(count, iso_strings=False):
+    rng = random.Random(count)
+    now = datetime(2024, 5, 1, 8, 0)
+    documents = []
+    for i in range(count):
+        requested = now + timedelta(minutes=i)
+        document = {
+            "ride_id": f"RIDE{i:012d}", "rider_email": f"rider{i % 50}@example.com",
+            "driver_email": f"driver{i % 20}@example.com", "pickup_location": "Central Park",
+            "drop_location": "Times Square", "status": "completed",
+            "requested_at": requested, "accepted_at": requested + timedelta(minutes=2),
+            "started_at": requested + timedelta(minutes=6), "completed_at": requested + timedelta(minutes=25),
+            "updated_at": requested + timedelta(minutes=25), "fare": round(rng.uniform(8, 60), 2),
+            "rating": rng.randint(1, 5), "payment_status": "completed",
+        }
+        if iso_strings:
+            for field in Ride.TIMESTAMP_FIELDS:
+                document[field] = document[field].isoformat() + "Z"
+        documents.append(document)
+    return documents
+
+
+def _drivers(count):
+    drivers = []
+    for i in range(count):
+        driver = Driver(f"driver{i}@example.com", "password123", f"Driver {i}", "555-010-0000", f"DL{i:06d}")
+        driver.add_vehicle(f"PLT{i:04d}", "Sedan", "Toyota Camry")
+        drivers.append(driver)
+    return drivers
+
+
+def _riders(count):
+    return [Rider(f"rider{i}@example.com", "password123", f"Rider {i}", "555-010-0000") for i in range(count)]
+
+
+# ---- models ----
+@benchmark("Ride.to_dict", REFRESH)
+def _ride_to_dict(batch):
+    rides = [Ride.from_dict(document) for document in _ride_documents(batch)]
+    return lambda: [ride.to_dict() for ride in rides]
+
+
+@benchmark("Ride.from_dict", REFRESH)
+def _ride_from_dict(batch):
+    documents = _ride_documents(batch)
+    return lambda: [Ride.from_dict(document) for document in documents]
+
+
+@benchmark("Ride.from_dict[iso strings]", REFRESH)
+def _ride_from_dict_strings(batch):
+    documents = _ride_documents(batch, iso_strings=True)
+    return lambda: [Ride.from_dict(document) for document in documents]
+
+
+@benchmark("Ride._convert_to_datetime", REFRESH)
+def _convert_to_datetime(batch):
+    values = [document["requested_at"] for document in _ride_documents(batch, iso_strings=True)]
+    values += [document["requested_at"] for document in _ride_documents(batch)]
+    convert = Ride._convert_to_datetime
+    return lambda: [convert(value) for value in values]
+
+
+@benchmark("Driver.to_dict", PAGE)
+def _driver_to_dict(batch):
+    drivers = _drivers(batch)
+    return lambda: [driver.to_dict() for driver in drivers]
+
+
+@benchmark("Driver.from_dict", PAGE)
+def _driver_from_dict(batch):
+    documents = [driver.to_dict() for driver in _drivers(batch)]
+    return lambda: [Driver.from_dict(document) for document in documents]
+
+
+@benchmark("Rider.to_dict", PAGE)
+def _rider_to_dict(batch):
+    riders = _riders(batch)
+    return lambda: [rider.to_dict() for rider in riders]
+
+
+@benchmark("Rider.from_dict", PAGE)
+def _rider_from_dict(batch):
+    documents = [rider.to_dict() for rider in _riders(batch)]
+    return lambda: [Rider.from_dict(document) for document in documents]
+
+
+# ---- validators and formatting ----
+@benchmark("Validators.validate_email", REFRESH)
+def _validate_email(batch):
+    emails = [f"user.{i}+tag@example{i % 7}.com" if i % 5 else f"broken{i}@example" for i in range(batch)]
+    return lambda: [Validators.validate_email(email) for email in emails]
+
+
+@benchmark("Validators.format_phone", REFRESH)
+def _format_phone(batch):
+    phones = [f"555-{i % 1000:03d}-{i:04d}" if i % 4 else f"+1 555 {i:07d}" for i in range(batch)]
+    return lambda: [Validators.format_phone(phone) for phone in phones]
+
+
+@benchmark("Validators.format_datetime", REFRESH)
+def _format_datetime(batch):
+    values = [document["requested_at"] for document in _ride_documents(batch)]
+    return lambda: [Validators.format_datetime(value) for value in values]
+
+
+# ---- fares ----
+@benchmark("LocationUtils.get_estimated_fare", REFRESH)
+def _estimated_fare(batch):
+    locations = LocationUtils.get_sample_locations()
+    pairs = [(locations[i % len(locations)], locations[(i * 7 + 3) % len(locations)]) for i in range(batch)]
+
+    def run():
+        random.seed(0)  # the distance estimate is randomized
+        return [LocationUtils.get_estimated_fare(pickup, drop) for pickup, drop in pairs]
+    return run
+
+
+# ---- driver positions ----
+CITY_DRIVERS = 10000  # drivers online in a large city
+
+
+@benchmark("GeoGridIndex.nearest", PAGE)
+def _nearest_drivers(batch):
+    rng = random.Random(batch)
+    grid = GeoGridIndex()
+    for i in range(CITY_DRIVERS):
+        grid.update(i, 40.75 + rng.uniform(-0.25, 0.25), -73.98 + rng.uniform(-0.25, 0.25))
+    riders = [(40.75 + rng.uniform(-0.2, 0.2), -73.98 + rng.uniform(-0.2, 0.2)) for _ in range(batch)]
+    return lambda: [grid.nearest(lat, lng, 5) for lat, lng in riders]
+
+
+def environment():
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "node": platform.node()}
+
+
+def measure(name, min_time=0.2, repeat=5):
+    """{"batch", "per_item_ns", "median_ns", "samples"} for one benchmark"""
+    make_run, batch = BENCHMARKS[name]
+    timer = timeit.Timer(make_run(batch))
+    # enough calls per sample to last min_time
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    samples = [elapsed / number / batch * 1e9 for elapsed in timer.repeat(repeat, number)]
+    return {"batch": batch, "per_item_ns": min(samples), "median_ns": statistics.median(samples),
+            "samples": len(samples)}
+
+
+def run_benchmarks(names=None, min_time=0.2, repeat=5):
+    """{name: measure(name)} for the benchmarks whose name contains one of names (all by default)"""
+    return {name: measure(name, min_time, repeat) for name in BENCHMARKS
+            if not names or any(part in name for part in names)}
+
+
+def compare(results, baseline, threshold=0.10):
+    """[(name, baseline ns, current ns, change)] for benchmarks slower than threshold"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        change = result["per_item_ns"] / before["per_item_ns"] - 1
+        if change > threshold:
+            regressions.append((name, before["per_item_ns"], result["per_item_ns"], change))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f"{'benchmark':<34} {'batch':>6} {'ns/item':>10} {'median':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        before = (baseline or {}).get("results", {}).get(name)
+        columns = f"{name:<34} {result['batch']:>6} {result['per_item_ns']:>10.1f} {result['median_ns']:>10.1f}"
+        if before:
+            change = result["per_item_ns"] / before["per_item_ns"] - 1
+            columns += f" {before['per_item_ns']:>10.1f} {change:>+8.1%}"
+        print(columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the per-document hot paths")
+    parser.add_argument("names", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare with a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown (0.10 = 10%%)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per sample")
+    parser.add_argument("--repeat", type=int, default=5, help="samples per benchmark")
+    parser.add_argument("--confirm", type=int, default=2,
+                        help="re-measure apparent regressions this many times before failing")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read baseline {args.compare}: {e}", file=sys.stderr)
+            return 2
+        if baseline.get("environment") != environment():
+            print(f"Warning: baseline recorded on {baseline.get('environment')}, running on {environment()}")
+
+    results = run_benchmarks(args.names, args.min_time, args.repeat)
+    if baseline:
+        # a noisy neighbour can slow one sample set down; keep the best of a few runs
+        for _ in range(args.confirm):
+            regressions = compare(results, baseline, args.threshold)
+            for name, *_ in regressions:
+                again = measure(name, args.min_time, args.repeat)
+                if again["per_item_ns"] < results[name]["per_item_ns"]:
+                    results[name] = again
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "recorded_at": datetime.now().isoformat(timespec="seconds"),
+                       "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:.1f} -> {after:.1f} ns/item ({change:+.1%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
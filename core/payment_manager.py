@@ -1,18 +1,34 @@
 from db.connection import db_connection
+from utils.log import get_logger
+from utils.metrics import record_error, timed
 from datetime import datetime
 
+logger = get_logger(__name__)
+
 class PaymentManager:
-    def __init__(self):
-        self.db = db_connection.get_database()
+    def __init__(self, db=None):
+        self.db = db if db is not None else db_connection.get_database()
         self.payment_methods = ["Credit Card", "Debit Card", "Cash", "Digital Wallet"]
     
+    @timed
     def process_payment(self, ride_id, amount, payment_method, user_email):
-        """Process payment for a ride"""
+        """Process payment for a ride (its rider only)"""
         try:
             # Validate payment method
             if payment_method not in self.payment_methods:
                 return False, "Invalid payment method"
             
+            # Only the rider's own completed, unpaid rides can be paid;
+            # someone else's ride reads as missing
+            ride_filter = {"ride_id": ride_id, "rider_email": user_email}
+            ride_data = self.db.rides.find_one(ride_filter, {"status": 1, "payment_status": 1, "_id": 0})
+            if not ride_data:
+                return False, "Ride not found"
+            if ride_data.get("status") != "completed":
+                return False, "Ride is not completed"
+            if ride_data.get("payment_status") == "completed":
+                return False, "Ride already paid"
+            
             # Create payment record
             payment_data = {
                 "ride_id": ride_id,
@@ -23,32 +39,41 @@ class PaymentManager:
                 "timestamp": datetime.now()
             }
             
-            # Save payment to database
-            self.db.payments.insert_one(payment_data)
+            # Save payment to database before marking the ride paid, so a paid
+            # ride always has its payment record
+            inserted = self.db.payments.insert_one(payment_data)
             
-            # Update ride payment status
-            self.db.rides.update_one(
-                {"ride_id": ride_id},
-                {"$set": {"payment_status": "completed"}}
+            # Update ride payment status unless a concurrent payment got there first
+            result = self.db.rides.update_one(
+                dict(ride_filter, status="completed", payment_status={"$ne": "completed"}),
+                {"$set": {"payment_status": "completed", "updated_at": datetime.now()}}
             )
+            if result.matched_count == 0:
+                self.db.payments.delete_one({"_id": inserted.inserted_id})
+                return False, "Ride already paid"
             
             return True, "Payment processed successfully"
             
         except Exception as e:
+            logger.warning("Payment for ride %s failed: %s", ride_id, e)
             return False, f"Payment failed: {str(e)}"
     
+    @timed
     def get_payment_history(self, user_email):
         """Get payment history for a user"""
         try:
             payments = list(self.db.payments.find({"user_email": user_email}))
             return payments
-        except Exception:
+        except Exception as e:
+            logger.warning("Error fetching payment history: %s", e)
+            record_error()
             return []
     
     def get_payment_methods(self):
         """Get available payment methods"""
         return self.payment_methods
     
+    @timed
     def get_total_earnings(self, driver_email):
         """Get total earnings for a driver"""
         try:
@@ -60,9 +85,12 @@ class PaymentManager:
             
             total = sum(ride["fare"] for ride in rides)
             return total
-        except Exception:
+        except Exception as e:
+            logger.warning("Error fetching total earnings: %s", e)
+            record_error()
             return 0.0
     
+    @timed
     def get_monthly_earnings(self, driver_email, year, month):
         """Get monthly earnings for a driver"""
         try:
@@ -77,5 +105,7 @@ class PaymentManager:
             
             total = sum(ride["fare"] for ride in rides)
             return total
-        except Exception:
+        except Exception as e:
+            logger.warning("Error fetching monthly earnings: %s", e)
+            record_error()
             return 0.0
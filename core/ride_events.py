@@ -0,0 +1,90 @@
+"""
+Ride event feed: in-process publish/subscribe, fed by a MongoDB change
+stream when the server supports one (replica sets), so subscribers also
+see changes made by other processes
+"""
+
+import itertools
+import threading
+from collections import namedtuple
+
+# ride is the ride document after the change
+RideEvent = namedtuple('RideEvent', ['ride_id', 'status', 'ride'])
+
+
+class RideEventFeed:
+    def __init__(self):
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stream = None
+
+    @property
+    def source(self):
+        """Where events come from: "change_stream" or "local" (this process only)"""
+        return "change_stream" if self._stream is not None else "local"
+
+    def subscribe(self, callback):
+        """Call callback(event) for every ride event; returns a subscription ID.
+        Callbacks may run on a background thread."""
+        with self._lock:
+            subscription_id = next(self._ids)
+            self._subscribers[subscription_id] = callback
+        return subscription_id
+
+    def unsubscribe(self, subscription_id):
+        with self._lock:
+            self._subscribers.pop(subscription_id, None)
+
+    def publish(self, event):
+        with self._lock:
+            callbacks = list(self._subscribers.values())
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                # one broken subscriber must not stop delivery to the others
+                pass
+
+    def publish_local(self, ride):
+        """Publish a change made by this process; the change stream reports it instead when running"""
+        if self._stream is None:
+            self.publish(RideEvent(ride['ride_id'], ride['status'], ride))
+
+    def start_change_stream(self, db):
+        """Deliver events from a change stream on db.rides. Returns False when
+        the backend does not support change streams (standalone MongoDB,
+        in-process storage) and the feed stays local."""
+        if self._stream is not None:
+            return True
+        if not hasattr(db.rides, 'watch'):
+            return False
+        try:
+            stream = db.rides.watch(full_document='updateLookup')
+        except Exception:
+            return False
+        self._stream = stream
+        threading.Thread(target=self._pump, args=(stream,), name='ride-change-stream', daemon=True).start()
+        return True
+
+    def _pump(self, stream):
+        try:
+            for change in stream:
+                ride = change.get('fullDocument')
+                if ride and 'ride_id' in ride:
+                    self.publish(RideEvent(ride['ride_id'], ride.get('status'), ride))
+        except Exception:
+            pass
+        finally:
+            # stream closed or lost: fall back to local events
+            self._stream = None
+
+    def stop(self):
+        """Close the change stream, if any"""
+        stream = self._stream
+        if stream is not None:
+            stream.close()
+
+
+# Global ride event feed
+ride_events = RideEventFeed()
@@ -1,172 +1,463 @@
 from db.connection import db_connection
+from db.storage import ReturnDocument, UpdateOne
+from core.ride_events import ride_events
 from models.ride import Ride
-from datetime import datetime
+from models.user import Driver, NearbyDriver
+from utils.geo_index import haversine_km, lat_lng, point, valid_lat_lng
+from utils.location_utils import LocationUtils
+from utils.log import SAMPLED, get_logger
+from utils.metrics import record_error, timed
+from datetime import datetime, timedelta
+
+logger = get_logger(__name__)
 
 class RideManager:
-    def __init__(self):
-        self.db = db_connection.get_database()
+    PAGE_SIZE = 20
+    NEAREST_DRIVERS = 5
+    DRIVER_SEARCH_KM = 10.0  # never offer a ride to drivers further away than this
+    NEARBY_RIDES_KM = 5.0
+    # positions older than this are ignored: the driver went offline or lost signal
+    LOCATION_MAX_AGE = timedelta(minutes=5)
+    
+    # Dashboard tabs: role -> bucket -> (statuses, newest first). The one-query
+    # snapshots and the per-bucket page queries share these filters, so a
+    # snapshot's continuation tokens work with get_bucket_page().
+    DASHBOARD_BUCKETS = {
+        "driver": {
+            "available": (("requested",), False),
+            "ongoing": (("accepted", "started"), True),
+            "canceled": (("cancelled",), True),
+            "completed": (("completed",), True),
+        },
+        "rider": {
+            "requested": (("requested", "accepted", "started"), True),
+            "completed": (("completed",), True),
+        },
+    }
+    
+    def __init__(self, db=None, use_transactions=None, events=None):
+        self.db = db if db is not None else db_connection.get_database()
+        if use_transactions is None:
+            use_transactions = db_connection.settings.use_transactions
+        self.use_transactions = use_transactions
+        self.events = events if events is not None else ride_events
     
+    @timed
     def request_ride(self, rider_email, pickup_location, drop_location):
         """Request a new ride"""
         try:
             ride = Ride(rider_email, pickup_location, drop_location)
-            self.db.rides.insert_one(ride.to_dict())
+            ride.pickup_point = self._geocode(pickup_location)
+            ride.drop_point = self._geocode(drop_location)
+            ride_data = ride.to_dict()
+            self.db.rides.insert_one(ride_data)
+            ride.mark_clean()
+            self.events.publish_local(ride_data)
             return True, ride.ride_id, "Ride requested successfully"
         except Exception as e:
             return False, None, f"Failed to request ride: {str(e)}"
     
-    def get_available_rides(self):
-        """Get all available rides for drivers"""
+    @staticmethod
+    def _geocode(location):
+        """GeoJSON point of a location, or None if it cannot be geocoded"""
+        coordinates = LocationUtils.geocode(location)
+        return point(*coordinates) if coordinates else None
+    
+    @staticmethod
+    def _near(lat, lng, max_km):
+        """$nearSphere condition: nearest first, within max_km"""
+        return {"$nearSphere": {"$geometry": point(lat, lng), "$maxDistance": max_km * 1000}}
+    
+    @timed
+    def update_driver_location(self, driver_email, lat, lng):
+        """Publish a driver's current position"""
         try:
-            rides = list(self.db.rides.find({"status": "requested"}))
-            print(f"DEBUG: Available rides fetched: {rides}")  # Debug log
-            return [Ride.from_dict(ride) for ride in rides]
+            if not valid_lat_lng(lat, lng):
+                return False, "Invalid coordinates"
+            result = self.db.users.update_one(
+                {"email": driver_email, "license_number": {"$exists": True}},
+                {"$set": {"location": point(lat, lng), "location_updated_at": datetime.now()}}
+            )
+            if result.matched_count == 0:
+                return False, "Driver not found"
+            return True, "Location updated successfully"
         except Exception as e:
-            print(f"DEBUG: Error fetching available rides: {e}")  # Debug log
+            return False, f"Failed to update location: {str(e)}"
+    
+    @timed
+    def get_nearest_drivers(self, lat, lng, k=NEAREST_DRIVERS, max_km=DRIVER_SEARCH_KM):
+        """Up to k available drivers with a fresh position within max_km, nearest first
+        (list of NearbyDriver)"""
+        try:
+            docs = self.db.users.find({
+                "is_available": True,
+                "location_updated_at": {"$gte": datetime.now() - self.LOCATION_MAX_AGE},
+                "location": self._near(lat, lng, max_km),
+            }, Driver.NEARBY_PROJECTION).limit(k)
+            return [NearbyDriver(doc["email"], doc.get("name"),
+                                 haversine_km(lat, lng, *lat_lng(doc["location"]))) for doc in docs]
+        except Exception as e:
+            logger.warning("Error fetching nearest drivers: %s", e)
+            record_error()
             return []
     
-    def accept_ride(self, ride_id, driver_email):
-        """Driver accepts a ride"""
+    @timed
+    def get_nearby_rides(self, lat, lng, radius_km=NEARBY_RIDES_KM, limit=PAGE_SIZE):
+        """Requested rides picking up within radius_km, nearest first.
+        Returns a list of (RideRow, distance in km)"""
         try:
-            ride_data = self.db.rides.find_one({"ride_id": ride_id})
-            if not ride_data:
-                return False, "Ride not found"
-            
-            ride = Ride.from_dict(ride_data)
-            if ride.accept_ride(driver_email):
-                # Update database
-                self.db.rides.update_one(
-                    {"ride_id": ride_id},
-                    {"$set": ride.to_dict()}
-                )
+            projection = dict(Ride.ROW_PROJECTION, pickup_point=1)
+            docs = self.db.rides.find({
+                "status": "requested",
+                "pickup_point": self._near(lat, lng, radius_km),
+            }, projection).limit(limit)
+            return [(Ride.row_from_dict(doc), haversine_km(lat, lng, *lat_lng(doc["pickup_point"])))
+                    for doc in docs]
+        except Exception as e:
+            logger.warning("Error fetching nearby rides: %s", e)
+            record_error()
+            return []
+    
+    @timed
+    def get_available_rides(self, as_rows=False):
+        """Get all available rides for drivers (read-only RideRow views if as_rows)"""
+        try:
+            projection = Ride.ROW_PROJECTION if as_rows else None
+            rides = list(self.db.rides.find({"status": "requested"}, projection))
+            logger.debug("Available rides fetched: %d", len(rides), extra=SAMPLED)
+            hydrate = Ride.row_from_dict if as_rows else Ride.from_dict
+            return [hydrate(ride) for ride in rides]
+        except Exception as e:
+            logger.warning("Error fetching available rides: %s", e)
+            record_error()
+            return []
+    
+    def _transition(self, ride_id, action, caller, session=None, **fields):
+        """Apply a ride state transition in a single conditional round trip.
+        Returns the updated ride document, or None if the ride is not in a
+        status that allows the action or caller may not apply it."""
+        return self.db.rides.find_one_and_update(
+            Ride.transition_filter(ride_id, action, caller),
+            Ride.transition_update(action, **fields),
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+    
+    def _run_action(self, action):
+        """Run action(session), inside a transaction when enabled, and publish
+        the updated ride it returns. Every action makes at most one write per collection."""
+        if not self.use_transactions:
+            ride_data = action(None)
+        else:
+            with self.db.client.start_session() as session:
+                ride_data = session.with_transaction(action)
+        if ride_data:
+            self.events.publish_local(ride_data)
+        return ride_data
+    
+    def _ride_exists(self, ride_id, caller=None, owners=()):
+        """Check whether a ride exists and, with owners, that caller is in one of those
+        fields (used to explain a failed conditional write: others' rides read as missing)"""
+        projection = dict({"_id": 1}, **{field: 1 for field in owners})
+        ride_data = self.db.rides.find_one({"ride_id": ride_id}, projection)
+        return ride_data is not None and (not owners or any(ride_data.get(field) == caller for field in owners))
+    
+    def _transition_failure(self, ride_id, action, caller, verb):
+        if not self._ride_exists(ride_id, caller, Ride.TRANSITION_OWNERS.get(action, ())):
+            return False, "Ride not found"
+        return False, f"Ride cannot be {verb}"
+    
+    @timed
+    def accept_ride(self, ride_id, driver_email):
+        """Driver accepts the ride"""
+        def accept(session):
+            # Only one driver can win: the filter stops matching once status leaves "requested"
+            ride_data = self._transition(ride_id, "accept", driver_email, session=session,
+                                         driver_email=driver_email)
+            if ride_data:
                 # Update driver availability
                 self.db.users.update_one(
                     {"email": driver_email},
-                    {"$set": {"is_available": False, "current_ride": ride_id}}
+                    {"$set": {"is_available": False, "current_ride": ride_id}},
+                    session=session
                 )
-                return True, "Ride accepted successfully"
-            else:
-                return False, "Ride cannot be accepted"
+            return ride_data
+        
+        try:
+            if not self._run_action(accept):
+                return self._transition_failure(ride_id, "accept", driver_email, "accepted")
+            return True, "Ride accepted successfully"
         except Exception as e:
             return False, f"Failed to accept ride: {str(e)}"
     
+    @timed
     def start_ride(self, ride_id, driver_email):
         """Driver starts the ride"""
         try:
-            ride_data = self.db.rides.find_one({"ride_id": ride_id})
+            ride_data = self._transition(ride_id, "start", driver_email)
             if not ride_data:
-                return False, "Ride not found"
-            
-            ride = Ride.from_dict(ride_data)
-            if ride.start_ride():
-                self.db.rides.update_one(
-                    {"ride_id": ride_id},
-                    {"$set": ride.to_dict()}
-                )
-                return True, "Ride started successfully"
-            else:
-                return False, "Ride cannot be started"
+                return self._transition_failure(ride_id, "start", driver_email, "started")
+            self.events.publish_local(ride_data)
+            return True, "Ride started successfully"
         except Exception as e:
             return False, f"Failed to start ride: {str(e)}"
     
+    @timed
     def complete_ride(self, ride_id, driver_email):
         """Driver completes the ride"""
+        def complete(session):
+            ride_data = self._transition(ride_id, "complete", driver_email, session=session)
+            if ride_data:
+                # Driver availability and both ride counts in one round trip
+                self.db.users.bulk_write([
+                    UpdateOne(
+                        {"email": driver_email},
+                        {"$set": {"is_available": True, "current_ride": None},
+                         "$inc": {"total_rides": 1}}
+                    ),
+                    UpdateOne(
+                        {"email": ride_data["rider_email"]},
+                        {"$inc": {"total_rides": 1}}
+                    )
+                ], ordered=False, session=session)
+            return ride_data
+        
         try:
-            ride_data = self.db.rides.find_one({"ride_id": ride_id})
-            if not ride_data:
-                return False, "Ride not found"
-            
-            ride = Ride.from_dict(ride_data)
-            if ride.complete_ride():
-                # Update ride
-                self.db.rides.update_one(
-                    {"ride_id": ride_id},
-                    {"$set": ride.to_dict()}
-                )
-                # Update driver availability
-                self.db.users.update_one(
-                    {"email": driver_email},
-                    {"$set": {"is_available": True, "current_ride": None}}
-                )
-                # Update user ride counts
-                self.db.users.update_one(
-                    {"email": ride.rider_email},
-                    {"$inc": {"total_rides": 1}}
-                )
-                self.db.users.update_one(
-                    {"email": driver_email},
-                    {"$inc": {"total_rides": 1}}
-                )
-                return True, "Ride completed successfully"
-            else:
-                return False, "Ride cannot be completed"
+            if not self._run_action(complete):
+                return self._transition_failure(ride_id, "complete", driver_email, "completed")
+            return True, "Ride completed successfully"
         except Exception as e:
             return False, f"Failed to complete ride: {str(e)}"
     
+    @timed
     def cancel_ride(self, ride_id, user_email):
-        """Cancel a ride"""
-        try:
-            ride_data = self.db.rides.find_one({"ride_id": ride_id})
-            if not ride_data:
-                return False, "Ride not found"
-            
-            ride = Ride.from_dict(ride_data)
-            if ride.cancel_ride():
-                self.db.rides.update_one(
-                    {"ride_id": ride_id},
-                    {"$set": ride.to_dict()}
+        """Cancel a ride (its rider or driver only)"""
+        def cancel(session):
+            ride_data = self._transition(ride_id, "cancel", user_email, session=session)
+            # If driver had accepted, make them available again
+            if ride_data and ride_data.get("driver_email"):
+                self.db.users.update_one(
+                    {"email": ride_data["driver_email"]},
+                    {"$set": {"is_available": True, "current_ride": None}},
+                    session=session
                 )
-                
-                # If driver had accepted, make them available again
-                if ride.driver_email:
-                    self.db.users.update_one(
-                        {"email": ride.driver_email},
-                        {"$set": {"is_available": True, "current_ride": None}}
-                    )
-                
-                return True, "Ride cancelled successfully"
-            else:
-                return False, "Ride cannot be cancelled"
+            return ride_data
+        
+        try:
+            if not self._run_action(cancel):
+                return self._transition_failure(ride_id, "cancel", user_email, "cancelled")
+            return True, "Ride cancelled successfully"
         except Exception as e:
             return False, f"Failed to cancel ride: {str(e)}"
     
-    def get_user_rides(self, user_email):
-        """Get all rides for a user"""
+    @timed
+    def get_user_rides(self, user_email, as_rows=False):
+        """Get all rides for a user (read-only RideRow views if as_rows)"""
         try:
+            projection = Ride.ROW_PROJECTION if as_rows else None
             rides = list(self.db.rides.find({
                 "$or": [
                     {"rider_email": user_email},
                     {"driver_email": user_email}
                 ]
-            }))
-            print(f"DEBUG: User rides fetched for {user_email}: {rides}")  # Debug log
-            return [Ride.from_dict(ride) for ride in rides]
+            }, projection))
+            logger.debug("User rides fetched: %d", len(rides), extra=SAMPLED)
+            hydrate = Ride.row_from_dict if as_rows else Ride.from_dict
+            return [hydrate(ride) for ride in rides]
         except Exception as e:
-            print(f"DEBUG: Error fetching user rides for {user_email}: {e}")  # Debug log
+            logger.warning("Error fetching user rides: %s", e)
+            record_error()
             return []
     
-    def rate_ride(self, ride_id, rating):
-        """Rate a completed ride"""
+    def _find_page(self, query, limit, after, newest_first, projection=None):
+        """Keyset page over ride_id: returns (documents, continuation token or None)"""
+        if after:
+            query = dict(query)
+            query["ride_id"] = {"$lt": after} if newest_first else {"$gt": after}
+        cursor = self.db.rides.find(query, projection)
+        cursor = cursor.sort("ride_id", -1 if newest_first else 1).limit(limit + 1)
+        docs = list(cursor)
+        if len(docs) > limit:
+            docs = docs[:limit]
+            return docs, docs[-1]["ride_id"]
+        return docs, None
+    
+    @staticmethod
+    def _user_rides_query(user_email, statuses=None):
+        query = {
+            "$or": [
+                {"rider_email": user_email},
+                {"driver_email": user_email}
+            ]
+        }
+        if statuses:
+            query["status"] = {"$in": list(statuses)}
+        return query
+    
+    @timed
+    def get_available_rides_page(self, limit=PAGE_SIZE, after=None):
+        """Get one page of available rides, oldest request first.
+        Returns (list of RideRow, token for the next page or None)"""
         try:
-            ride_data = self.db.rides.find_one({"ride_id": ride_id})
-            if not ride_data:
-                return False, "Ride not found"
+            docs, token = self._find_page({"status": "requested"}, limit, after,
+                                          newest_first=False, projection=Ride.ROW_PROJECTION)
+            return [Ride.row_from_dict(doc) for doc in docs], token
+        except Exception as e:
+            logger.warning("Error fetching available rides page: %s", e)
+            record_error()
+            return [], None
+    
+    @timed
+    def get_user_rides_page(self, user_email, limit=PAGE_SIZE, after=None, statuses=None):
+        """Get one page of a user's rides, newest first, optionally only some statuses.
+        Returns (list of RideRow, token for the next page or None)"""
+        try:
+            docs, token = self._find_page(self._user_rides_query(user_email, statuses), limit, after,
+                                          newest_first=True, projection=Ride.ROW_PROJECTION)
+            return [Ride.row_from_dict(doc) for doc in docs], token
+        except Exception as e:
+            logger.warning("Error fetching user rides page: %s", e)
+            record_error()
+            return [], None
+    
+    def iter_user_rides(self, user_email, batch_size=100, statuses=None):
+        """Lazily yield a user's rides as Ride objects, newest first, one page query per batch"""
+        query = self._user_rides_query(user_email, statuses)
+        after = None
+        while True:
+            docs, after = self._find_page(query, batch_size, after, newest_first=True)
+            for doc in docs:
+                yield Ride.from_dict(doc)
+            if after is None:
+                return
+    
+    @classmethod
+    def _bucket_filter(cls, role, bucket, email):
+        """Filter for one dashboard bucket; a driver's available rides are everyone's"""
+        statuses = cls.DASHBOARD_BUCKETS[role][bucket][0]
+        query = {"status": statuses[0] if len(statuses) == 1 else {"$in": list(statuses)}}
+        if role == "rider":
+            query["rider_email"] = email
+        elif bucket != "available":
+            query["driver_email"] = email
+        return query
+    
+    def _get_dashboard(self, role, email, limit, limits):
+        buckets = self.DASHBOARD_BUCKETS[role]
+        limits = limits or {}
+        facets = {}
+        for bucket, (statuses, newest_first) in buckets.items():
+            facets[bucket] = [
+                {"$match": self._bucket_filter(role, bucket, email)},
+                {"$sort": {"ride_id": -1 if newest_first else 1}},
+                {"$limit": limits.get(bucket, limit) + 1},
+                {"$project": Ride.ROW_PROJECTION},
+            ]
+        facets["counts"] = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        pipeline = [
+            {"$match": {"$or": [self._bucket_filter(role, bucket, email) for bucket in buckets]}},
+            {"$facet": facets},
+        ]
+        snapshot = {bucket: ([], None) for bucket in buckets}
+        snapshot["counts"] = {}
+        try:
+            result = next(iter(self.db.rides.aggregate(pipeline)), {})
+        except Exception as e:
+            logger.warning("Error fetching %s dashboard: %s", role, e)
+            record_error()
+            return snapshot
+        for bucket in buckets:
+            docs, token = result.get(bucket, []), None
+            if len(docs) > limits.get(bucket, limit):
+                docs = docs[:limits.get(bucket, limit)]
+                token = docs[-1]["ride_id"]
+            snapshot[bucket] = ([Ride.row_from_dict(doc) for doc in docs], token)
+        snapshot["counts"] = {group["_id"]: group["count"] for group in result.get("counts", [])}
+        return snapshot
+    
+    @timed
+    def get_driver_dashboard(self, driver_email, limit=PAGE_SIZE, limits=None):
+        """Every driver tab in one aggregation: {bucket: (list of RideRow, token), "counts": {status: n}}.
+        Buckets are available, ongoing, canceled and completed; limits overrides limit per bucket."""
+        return self._get_dashboard("driver", driver_email, limit, limits)
+    
+    @timed
+    def get_rider_dashboard(self, rider_email, limit=PAGE_SIZE, limits=None):
+        """Every rider tab in one aggregation: {bucket: (list of RideRow, token), "counts": {status: n}}.
+        Buckets are requested (until completed) and completed; limits overrides limit per bucket."""
+        return self._get_dashboard("rider", rider_email, limit, limits)
+    
+    @timed
+    def get_bucket_page(self, email, role, bucket, limit=PAGE_SIZE, after=None):
+        """Next page of one dashboard bucket, continuing from a snapshot or page token.
+        Returns (list of RideRow, token for the next page or None)"""
+        try:
+            newest_first = self.DASHBOARD_BUCKETS[role][bucket][1]
+            docs, token = self._find_page(self._bucket_filter(role, bucket, email), limit, after,
+                                          newest_first=newest_first, projection=Ride.ROW_PROJECTION)
+            return [Ride.row_from_dict(doc) for doc in docs], token
+        except Exception as e:
+            logger.warning("Error fetching %s page: %s", bucket, e)
+            record_error()
+            return [], None
+    
+    @timed
+    def get_change_marker(self, email, role):
+        """Cheap value that changes whenever a ride on the user's dashboard changes:
+        the latest updated_at of a rider's own rides, or for drivers the number and
+        latest updated_at of the available rides and the latest updated_at of their
+        own rides. None if the query failed."""
+        try:
+            if role == "rider":
+                return self._latest_update({"rider_email": email})
+            # a ride another driver accepts leaves the available rides without
+            # a newer updated_at among them, so their count is part of the marker
+            return (self.db.rides.count_documents({"status": "requested"}),
+                    self._latest_update({"status": "requested"}),
+                    self._latest_update({"driver_email": email}))
+        except Exception as e:
+            logger.warning("Error fetching change marker: %s", e)
+            record_error()
+            return None
+    
+    def _latest_update(self, query):
+        doc = self.db.rides.find_one(query, {"updated_at": 1, "_id": 0}, sort=[("updated_at", -1)])
+        return doc.get("updated_at") if doc else datetime.min
+    
+    @timed
+    def rate_ride(self, ride_id, rating, rider_email):
+        """Rate a completed ride (its rider only)"""
+        try:
+            if not Ride.is_valid_rating(rating):
+                return False, "Invalid rating"
             
-            ride = Ride.from_dict(ride_data)
-            if ride.status != "completed":
+            result = self.db.rides.update_one(
+                {"ride_id": ride_id, "status": Ride.RATABLE_STATUS, "rider_email": rider_email},
+                {"$set": {"rating": rating, "updated_at": datetime.now()}}
+            )
+            if result.matched_count == 0:
+                if not self._ride_exists(ride_id, rider_email, ("rider_email",)):
+                    return False, "Ride not found"
                 return False, "Can only rate completed rides"
-            
-            if ride.add_rating(rating):
-                self.db.rides.update_one(
-                    {"ride_id": ride_id},
-                    {"$set": ride.to_dict()}
-                )
-                return True, "Rating added successfully"
-            else:
-                return False, "Invalid rating"
+            return True, "Rating added successfully"
         except Exception as e:
             return False, f"Failed to add rating: {str(e)}"
     
+    @timed
+    def save_ride(self, ride):
+        """Write back only the fields changed on a loaded ride"""
+        try:
+            update = ride.get_update()
+            if update:
+                ride.updated_at = datetime.now()
+                update.setdefault("$set", {})["updated_at"] = ride.updated_at
+                self.db.rides.update_one({"ride_id": ride.ride_id}, update)
+                ride.mark_clean()
+            return True, "Ride saved successfully"
+        except Exception as e:
+            return False, f"Failed to save ride: {str(e)}"
+    
+    @timed
     def get_ride_by_id(self, ride_id):
         """Get ride by ID"""
         try:
@@ -174,5 +465,7 @@ class RideManager:
             if ride_data:
                 return Ride.from_dict(ride_data)
             return None
-        except Exception:
+        except Exception as e:
+            logger.warning("Error fetching ride %s: %s", ride_id, e)
+            record_error()
             return None
@@ -1,33 +1,151 @@
-import pymongo
-from pymongo.errors import ConnectionFailure
+import importlib.util
+import threading
+from db.monitoring import command_monitor, pymongo_listener
+from db.settings import DatabaseSettings
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# pymongo and the storage backends are imported when connecting, which
+# connect_async() does on a background thread while the UI starts
+PYMONGO_AVAILABLE = importlib.util.find_spec("pymongo") is not None
+
+
+class PendingDatabase:
+    """Stands in for the database while connect_async() is running; the first use waits for it"""
+
+    def __init__(self, connection, workload):
+        self._connection = connection
+        self._workload = workload
+        self._db = None
+
+    def _resolve(self):
+        if self._db is None:
+            if not self._connection.wait_connected():
+                raise ConnectionError("Not connected to the database")
+            self._db = self._connection.get_database(self._workload)
+        return self._db
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
 
 class DatabaseConnection:
-    def __init__(self):
+    def __init__(self, settings=None):
+        self.settings = settings or DatabaseSettings.from_env()
+        self.clients = {}
         self.client = None
         self.db = None
-    
+        self._ready = threading.Event()
+        self._ready.set()  # nothing pending until connect_async()
+
     def connect(self):
         """Connect to MongoDB"""
+        if self.settings.monitor_commands:
+            command_monitor.enabled = True
+            command_monitor.slow_query_ms = self.settings.slow_query_ms
+        if self.settings.backend != "mongo":
+            return self._connect_local()
+        if not PYMONGO_AVAILABLE:
+            logger.error("pymongo is not installed; set RIDEAPP_DB_BACKEND=memory or sqlite to run without MongoDB")
+            return False
+        from pymongo.errors import ConnectionFailure, ConfigurationError
         try:
-            self.client = pymongo.MongoClient("mongodb://localhost:27017/")
-            self.db = self.client["rideapp"]
-            # Test connection
+            self.client = self._create_client("interactive")
+            self.db = self.client[self.settings.database]
+            # Test connection; fails after serverSelectionTimeoutMS instead of hanging
             self.client.admin.command('ping')
-            print("Connected to MongoDB successfully!")
+            logger.info("Connected to MongoDB")
+            return True
+        except (ConnectionFailure, ConfigurationError) as e:
+            logger.error("Failed to connect to MongoDB: %s", e)
+            self.close()
+            return False
+
+    def _connect_local(self):
+        """Open the in-process storage backend instead of MongoDB"""
+        from db import storage
+        try:
+            self.db = storage.create_database(self.settings)
+            if self.settings.monitor_commands:
+                self.db.command_listener = command_monitor
+            logger.info("Using %s storage backend", self.settings.backend)
             return True
-        except ConnectionFailure:
-            print("Failed to connect to MongoDB")
+        except Exception as e:
+            logger.error("Failed to open %s storage: %s", self.settings.backend, e)
             return False
-    
-    def get_database(self):
+
+    def connect_async(self, on_connected=None):
+        """Connect on a background thread so the UI can come up meanwhile.
+        Until it finishes, get_database() returns stand-ins that wait for the
+        connection on first use. on_connected(db) runs on that thread after a
+        successful connect, before the stand-ins are released."""
+        self._ready.clear()
+
+        def warm_up():
+            try:
+                if self.connect() and on_connected:
+                    on_connected(self.db)
+            except Exception as e:
+                logger.exception("Database warm-up failed: %s", e)
+            finally:
+                self._ready.set()
+
+        threading.Thread(target=warm_up, name="db-warm-up", daemon=True).start()
+
+    @property
+    def connecting(self):
+        """True while connect_async() is still running"""
+        return not self._ready.is_set()
+
+    def wait_connected(self, timeout=None):
+        """Wait for connect_async() to finish; True if the database is connected"""
+        return self._ready.wait(timeout) and self.db is not None
+
+    def _create_client(self, workload):
+        """Create the pooled client for a workload"""
+        import pymongo
+        options = self.settings.for_workload(workload).client_options()
+        if self.settings.monitor_commands:
+            options["event_listeners"] = [pymongo_listener(command_monitor)]
+        client = pymongo.MongoClient(self.settings.uri, **options)
+        self.clients[workload] = client
+        return client
+
+    def get_client(self, workload="interactive"):
+        """Get the client for a workload, creating it on first use"""
+        client = self.clients.get(workload)
+        if client is None:
+            client = self._create_client(workload)
+        return client
+
+    def get_database(self, workload="interactive"):
         """Get database instance"""
-        return self.db
-    
+        if self.connecting:
+            return PendingDatabase(self, workload)
+        if workload == "interactive" or self.settings.backend != "mongo":
+            return self.db
+        if self.client is None:
+            return None
+        return self.get_client(workload)[self.settings.database]
+
     def close(self):
         """Close database connection"""
-        if self.client:
-            self.client.close()
-            print("Database connection closed")
+        if command_monitor.enabled and (self.clients or self.db is not None):
+            logger.info("%s", command_monitor.report())
+        if self.clients:
+            for client in self.clients.values():
+                client.close()
+            self.clients = {}
+            self.client = None
+            self.db = None
+            logger.info("Database connection closed")
+        elif self.db is not None and self.settings.backend != "mongo":
+            self.db.close()
+            self.db = None
 
 # Global database instance
 db_connection = DatabaseConnection()
@@ -0,0 +1,146 @@
+"""
+Index bootstrap and query-plan verification for the ride app collections
+"""
+
+import sys
+from datetime import datetime
+
+ASCENDING = 1
+DESCENDING = -1
+GEOSPHERE = "2dsphere"
+
+
+class IndexManager:
+    """Creates the indexes behind the manager queries and checks they are used"""
+
+    # (collection, keys, options)
+    INDEXES = [
+        ("users", [("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+        ("users", [("license_number", ASCENDING)],
+         {"name": "license_number_unique", "unique": True, "sparse": True}),
+        # drivers' published positions, for nearest-driver queries
+        ("users", [("location", GEOSPHERE)], {"name": "location_2dsphere"}),
+        ("rides", [("ride_id", ASCENDING)], {"name": "ride_id_unique", "unique": True}),
+        # ride IDs are time-ordered, so they double as the request-time sort key
+        ("rides", [("status", ASCENDING), ("ride_id", ASCENDING)], {"name": "status_ride_id"}),
+        ("rides", [("rider_email", ASCENDING), ("ride_id", DESCENDING)], {"name": "rider_ride_id"}),
+        ("rides", [("driver_email", ASCENDING), ("status", ASCENDING), ("completed_at", ASCENDING)],
+         {"name": "driver_status_completed_at"}),
+        ("rides", [("driver_email", ASCENDING), ("ride_id", DESCENDING)], {"name": "driver_ride_id"}),
+        # change markers: the newest updated_at is the first index entry
+        ("rides", [("rider_email", ASCENDING), ("updated_at", DESCENDING)], {"name": "rider_updated_at"}),
+        ("rides", [("driver_email", ASCENDING), ("updated_at", DESCENDING)], {"name": "driver_updated_at"}),
+        ("rides", [("status", ASCENDING), ("updated_at", DESCENDING)], {"name": "status_updated_at"}),
+        ("rides", [("pickup_point", GEOSPHERE)], {"name": "pickup_point_2dsphere"}),
+        ("payments", [("user_email", ASCENDING), ("timestamp", DESCENDING)], {"name": "user_timestamp"}),
+    ]
+
+    # Representative shapes of every manager query: (description, collection, filter, sort)
+    QUERIES = [
+        ("RideManager: ride by id", "rides", {"ride_id": "RIDE0000"}, None),
+        ("RideManager.get_available_rides", "rides", {"status": "requested"}, None),
+        ("RideManager.get_user_rides", "rides",
+         {"$or": [{"rider_email": "user@example.com"}, {"driver_email": "user@example.com"}]}, None),
+        ("RideManager.get_available_rides_page", "rides",
+         {"status": "requested", "ride_id": {"$gt": "RIDE0000"}}, [("ride_id", ASCENDING)]),
+        ("RideManager.get_user_rides_page", "rides",
+         {"$or": [{"rider_email": "user@example.com"}, {"driver_email": "user@example.com"}],
+          "ride_id": {"$lt": "RIDE9999"}}, [("ride_id", DESCENDING)]),
+        ("RideManager.get_driver_dashboard", "rides",
+         {"$or": [{"status": "requested"},
+                  {"status": {"$in": ["accepted", "started"]}, "driver_email": "driver@example.com"},
+                  {"status": "cancelled", "driver_email": "driver@example.com"},
+                  {"status": "completed", "driver_email": "driver@example.com"}]}, None),
+        ("RideManager.get_rider_dashboard", "rides",
+         {"$or": [{"status": {"$in": ["requested", "accepted", "started"]}, "rider_email": "user@example.com"},
+                  {"status": "completed", "rider_email": "user@example.com"}]}, None),
+        ("RideManager.get_bucket_page", "rides",
+         {"status": "completed", "driver_email": "driver@example.com", "ride_id": {"$lt": "RIDE9999"}},
+         [("ride_id", DESCENDING)]),
+        ("RideManager.get_change_marker (rider)", "rides",
+         {"rider_email": "user@example.com"}, [("updated_at", DESCENDING)]),
+        ("RideManager.get_change_marker (available)", "rides",
+         {"status": "requested"}, [("updated_at", DESCENDING)]),
+        ("RideManager.get_change_marker (driver)", "rides",
+         {"driver_email": "driver@example.com"}, [("updated_at", DESCENDING)]),
+        ("RideManager.get_nearby_rides", "rides",
+         {"status": "requested", "pickup_point": {"$nearSphere": {
+             "$geometry": {"type": "Point", "coordinates": [-73.98, 40.75]}, "$maxDistance": 5000}}}, None),
+        ("RideManager.get_nearest_drivers", "users",
+         {"is_available": True, "location_updated_at": {"$gte": datetime(2024, 1, 1)},
+          "location": {"$nearSphere": {
+              "$geometry": {"type": "Point", "coordinates": [-73.98, 40.75]}, "$maxDistance": 10000}}}, None),
+        ("AuthManager: user by email", "users", {"email": "user@example.com"}, None),
+        ("AuthManager: user by license", "users", {"license_number": "DL00000"}, None),
+        ("PaymentManager.get_payment_history", "payments", {"user_email": "user@example.com"}, None),
+        ("PaymentManager.get_total_earnings", "rides",
+         {"driver_email": "driver@example.com", "status": "completed"}, None),
+        ("PaymentManager.get_monthly_earnings", "rides",
+         {"driver_email": "driver@example.com", "status": "completed",
+          "completed_at": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 1)}}, None),
+    ]
+
+    def __init__(self, db):
+        self.db = db
+
+    def ensure_indexes(self):
+        """Create all indexes (no-op for indexes that already exist)"""
+        try:
+            for collection, keys, options in self.INDEXES:
+                self.db[collection].create_index(keys, **options)
+            return True, f"{len(self.INDEXES)} indexes ensured"
+        except Exception as e:
+            return False, f"Failed to create indexes: {str(e)}"
+
+    def verify_query_plans(self):
+        """Explain every manager query and report the ones that fall back to a COLLSCAN"""
+        problems = []
+        for description, collection, query, sort in self.QUERIES:
+            try:
+                cursor = self.db[collection].find(query)
+                if sort:
+                    cursor = cursor.sort(sort)
+                stages = self._plan_stages(cursor.explain()["queryPlanner"]["winningPlan"])
+            except Exception as e:
+                problems.append(f"{description}: explain failed ({str(e)})")
+                continue
+            if "COLLSCAN" in stages:
+                problems.append(f"{description}: COLLSCAN on {collection}")
+        return not problems, problems
+
+    @classmethod
+    def _plan_stages(cls, plan):
+        """Collect every stage name in a winning plan tree"""
+        stages = [plan.get("stage")]
+        # MongoDB 7+ (SBE) nests the classic plan under "queryPlan"
+        children = [plan[key] for key in ("queryPlan", "inputStage") if key in plan]
+        children.extend(plan.get("inputStages", []))
+        for child in children:
+            stages.extend(cls._plan_stages(child))
+        return stages
+
+
+def main():
+    """Create indexes and verify query plans; exit non-zero on any COLLSCAN"""
+    from db.connection import db_connection
+
+    if not db_connection.connect():
+        return 1
+    try:
+        index_manager = IndexManager(db_connection.get_database())
+        success, message = index_manager.ensure_indexes()
+        print(message)
+        if not success:
+            return 1
+        ok, problems = index_manager.verify_query_plans()
+        for problem in problems:
+            print(f"✗ {problem}")
+        if ok:
+            print(f"✓ All {len(IndexManager.QUERIES)} manager queries use an index")
+        return 0 if ok else 1
+    finally:
+        db_connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
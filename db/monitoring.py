@@ -0,0 +1,230 @@
+"""
+Database command monitoring: round trips and bytes per user-level action,
+and a slow-query log that shows filter shapes but never their values.
+
+Code that performs a user action runs inside action_scope("driver.accept")
+(also usable as a decorator); every command issued meanwhile on that thread
+is attributed to it. MongoDB commands arrive through a pymongo
+CommandListener, the in-process backends report theirs directly.
+
+Enabled with RIDEAPP_DB_MONITOR=1; RIDEAPP_SLOW_QUERY_MS sets the slow
+query threshold. The per-session summary is logged when the connection
+closes and is available from command_monitor.report().
+"""
+
+import contextlib
+import contextvars
+import threading
+import time
+from utils.log import get_logger
+from utils.metrics import metrics
+
+logger = get_logger(__name__)
+
+DB_ROUND_TRIPS_TOTAL = "rideapp_db_round_trips_total"
+DB_BYTES_TOTAL = "rideapp_db_bytes_total"
+metrics.describe(DB_ROUND_TRIPS_TOTAL, "Database commands by user action and command")
+metrics.describe(DB_BYTES_TOTAL, "Bytes sent to and received from MongoDB by user action")
+
+# command fields holding the filter, per command name
+FILTER_FIELDS = {
+    "find": "filter", "count": "query", "delete": "deletes", "update": "updates",
+    "findAndModify": "query", "aggregate": "pipeline", "distinct": "query",
+}
+UNSCOPED = "unscoped"
+
+_current = contextvars.ContextVar("rideapp_db_action", default=None)
+
+
+class _ActionScope:
+    def __init__(self, name):
+        self.name = name
+        self.round_trips = 0
+
+
+@contextlib.contextmanager
+def action_scope(name):
+    """Attribute database commands issued inside the block to a user action"""
+    scope = _ActionScope(name)
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+        command_monitor.end_action(scope)
+
+
+def current_action():
+    scope = _current.get()
+    return scope.name if scope else UNSCOPED
+
+
+def filter_shape(value):
+    """A filter (or pipeline) with every value replaced by "?": field names and operators only"""
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = filter_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+
+class _ActionStats:
+    def __init__(self):
+        self.invocations = 0
+        self.round_trips = 0
+        self.max_round_trips = 0
+        self.failures = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = 0.0
+        self.commands = {}  # command name -> count
+
+
+class CommandMonitor:
+    """Aggregates database commands per action; thread-safe"""
+
+    def __init__(self, slow_query_ms=100):
+        self.slow_query_ms = slow_query_ms
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._pending = {}  # pymongo (connection, request id) -> (action scope, command name, shape, collection)
+        self.started_at = time.time()
+
+    def _stats_for(self, action):
+        stats = self._stats.get(action)
+        if stats is None:
+            stats = self._stats[action] = _ActionStats()
+        return stats
+
+    def record_command(self, command_name, collection, filter, seconds, succeeded=True,
+                       bytes_sent=0, bytes_received=0, scope=None):
+        """Account one database round trip"""
+        scope = scope if scope is not None else _current.get()
+        action = scope.name if scope else UNSCOPED
+        if scope is not None:
+            scope.round_trips += 1
+        with self._lock:
+            stats = self._stats_for(action)
+            stats.round_trips += 1
+            stats.failures += not succeeded
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.seconds += seconds
+            stats.commands[command_name] = stats.commands.get(command_name, 0) + 1
+            if scope is None:
+                # unscoped commands have no invocation to close
+                stats.invocations = stats.round_trips
+        metrics.inc(DB_ROUND_TRIPS_TOTAL, {"action": action, "command": command_name})
+        if bytes_sent or bytes_received:
+            metrics.inc(DB_BYTES_TOTAL, {"action": action, "direction": "sent"}, bytes_sent)
+            metrics.inc(DB_BYTES_TOTAL, {"action": action, "direction": "received"}, bytes_received)
+        if seconds * 1000 >= self.slow_query_ms:
+            logger.warning("Slow %s on %s: %.1fms (action %s) filter=%s", command_name, collection,
+                           seconds * 1000, action, filter_shape(filter) if filter is not None else None)
+
+    def end_action(self, scope):
+        """Close one invocation of an action"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats_for(scope.name)
+            stats.invocations += 1
+            stats.max_round_trips = max(stats.max_round_trips, scope.round_trips)
+
+    # ---- pymongo CommandListener interface (see pymongo_listener) ----
+    def started(self, event):
+        command = event.command
+        filter_field = FILTER_FIELDS.get(event.command_name)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                _current.get(), event.command_name, command.get(filter_field) if filter_field else None,
+                command.get(event.command_name), _bson_size(command)
+            )
+
+    def succeeded(self, event):
+        self._finish(event, True, _bson_size(event.reply))
+
+    def failed(self, event):
+        self._finish(event, False, 0)
+
+    def _finish(self, event, succeeded, bytes_received):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        scope, command_name, filter, collection, bytes_sent = pending
+        self.record_command(command_name, collection, filter, event.duration_micros / 1e6, succeeded,
+                            bytes_sent, bytes_received, scope=scope or None)
+
+    # ---- reporting ----
+    def summary(self):
+        """{action: {invocations, round_trips, round_trips_per_action, max_round_trips, ...}}"""
+        with self._lock:
+            result = {}
+            for action, stats in sorted(self._stats.items()):
+                invocations = max(stats.invocations, 1)
+                result[action] = {
+                    "invocations": stats.invocations,
+                    "round_trips": stats.round_trips,
+                    "round_trips_per_action": stats.round_trips / invocations,
+                    "max_round_trips": stats.max_round_trips,
+                    "failures": stats.failures,
+                    "bytes_sent": stats.bytes_sent,
+                    "bytes_received": stats.bytes_received,
+                    "db_ms_per_action": stats.seconds * 1000 / invocations,
+                    "commands": dict(stats.commands),
+                }
+            return result
+
+    def report(self):
+        """Per-session summary as text"""
+        lines = [f"Database commands since {time.strftime('%H:%M:%S', time.localtime(self.started_at))}:"]
+        lines.append(f"{'action':<32} {'calls':>6} {'trips':>6} {'avg':>5} {'max':>4} {'KB out':>7} "
+                     f"{'KB in':>7} {'db ms':>7}")
+        for action, stats in self.summary().items():
+            lines.append(f"{action:<32} {stats['invocations']:>6} {stats['round_trips']:>6} "
+                         f"{stats['round_trips_per_action']:>5.1f} {stats['max_round_trips']:>4} "
+                         f"{stats['bytes_sent'] / 1024:>7.1f} {stats['bytes_received'] / 1024:>7.1f} "
+                         f"{stats['db_ms_per_action']:>7.2f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._pending.clear()
+            self.started_at = time.time()
+
+
+def _bson_size(document):
+    try:
+        import bson
+        return len(bson.encode(document))
+    except Exception:
+        return 0
+
+
+def pymongo_listener(monitor):
+    """A pymongo CommandListener forwarding to monitor (pymongo only accepts its own subclasses)"""
+    from pymongo import monitoring
+
+    class Listener(monitoring.CommandListener):
+        def started(self, event):
+            monitor.started(event)
+
+        def succeeded(self, event):
+            monitor.succeeded(event)
+
+        def failed(self, event):
+            monitor.failed(event)
+
+    return Listener()
+
+
+# Global command monitor
+command_monitor = CommandMonitor()
@@ -0,0 +1,124 @@
+"""
+Database settings for the ride app
+"""
+
+import copy
+import os
+
+
+class DatabaseSettings:
+    """MongoDB connection settings, overridable with RIDEAPP_* environment variables"""
+
+    # environment variable -> (attribute, parser)
+    ENV_VARS = {
+        "RIDEAPP_DB_BACKEND": ("backend", str),
+        "RIDEAPP_SQLITE_PATH": ("sqlite_path", str),
+        "RIDEAPP_MONGO_URI": ("uri", str),
+        "RIDEAPP_DB_NAME": ("database", str),
+        "RIDEAPP_DISPATCH_WORKERS": ("dispatch_workers", int),
+        "RIDEAPP_MONGO_MAX_POOL": ("max_pool_size", int),
+        "RIDEAPP_MONGO_MIN_POOL": ("min_pool_size", int),
+        "RIDEAPP_MONGO_MAX_IDLE_MS": ("max_idle_time_ms", int),
+        "RIDEAPP_MONGO_CONNECT_TIMEOUT_MS": ("connect_timeout_ms", int),
+        "RIDEAPP_MONGO_SOCKET_TIMEOUT_MS": ("socket_timeout_ms", int),
+        "RIDEAPP_MONGO_SERVER_SELECTION_TIMEOUT_MS": ("server_selection_timeout_ms", int),
+        "RIDEAPP_MONGO_WAIT_QUEUE_TIMEOUT_MS": ("wait_queue_timeout_ms", int),
+        "RIDEAPP_MONGO_RETRY_WRITES": ("retry_writes", lambda v: v.lower() in ("1", "true", "yes")),
+        "RIDEAPP_MONGO_COMPRESSORS": ("compressors", str),
+        "RIDEAPP_APP_NAME": ("app_name", str),
+        "RIDEAPP_USE_TRANSACTIONS": ("use_transactions", lambda v: v.lower() in ("1", "true", "yes")),
+        "RIDEAPP_DB_MONITOR": ("monitor_commands", lambda v: v.lower() in ("1", "true", "yes")),
+        "RIDEAPP_SLOW_QUERY_MS": ("slow_query_ms", float),
+    }
+
+    # Per-workload overrides. "interactive" serves the GUI and dispatch path and
+    # must fail fast; "analytics" runs long aggregations off the hot pool.
+    WORKLOADS = {
+        "interactive": {},
+        "analytics": {
+            "max_pool_size": 2,
+            "socket_timeout_ms": 60000,
+            "read_preference": "secondaryPreferred",
+        },
+    }
+
+    def __init__(self, uri="mongodb://localhost:27017/", database="rideapp",
+                 dispatch_workers=4, max_pool_size=None, min_pool_size=0,
+                 max_idle_time_ms=60000, connect_timeout_ms=2000,
+                 socket_timeout_ms=5000, server_selection_timeout_ms=2000,
+                 wait_queue_timeout_ms=1000, retry_writes=True,
+                 compressors="zlib", app_name="ride-app",
+                 read_preference="primary", backend="mongo",
+                 sqlite_path="rideapp.sqlite3", use_transactions=False,
+                 monitor_commands=False, slow_query_ms=100):
+        self.uri = uri
+        self.database = database
+        self.dispatch_workers = dispatch_workers
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self.max_idle_time_ms = max_idle_time_ms
+        self.connect_timeout_ms = connect_timeout_ms
+        self.socket_timeout_ms = socket_timeout_ms
+        self.server_selection_timeout_ms = server_selection_timeout_ms
+        self.wait_queue_timeout_ms = wait_queue_timeout_ms
+        self.retry_writes = retry_writes
+        self.compressors = compressors
+        self.app_name = app_name
+        self.read_preference = read_preference
+        # "mongo", or an in-process backend from db.storage ("memory", "sqlite")
+        self.backend = backend
+        self.sqlite_path = sqlite_path
+        # multi-collection ride actions in one transaction (MongoDB needs a replica set)
+        self.use_transactions = use_transactions
+        # per-action round trips and the slow-query log (db.monitoring)
+        self.monitor_commands = monitor_commands
+        self.slow_query_ms = slow_query_ms
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Create settings from environment variables"""
+        environ = os.environ if environ is None else environ
+        settings = cls()
+        for var, (attr, parse) in cls.ENV_VARS.items():
+            value = environ.get(var)
+            if value not in (None, ""):
+                try:
+                    setattr(settings, attr, parse(value))
+                except ValueError:
+                    raise ValueError(f"Invalid value for {var}: {value!r}")
+        return settings
+
+    def pool_size(self):
+        """Pool size: explicit value, or one connection per dispatch worker plus GUI headroom"""
+        if self.max_pool_size:
+            return self.max_pool_size
+        return self.dispatch_workers + 2
+
+    def for_workload(self, workload):
+        """Get a copy of these settings with the workload overrides applied"""
+        if workload not in self.WORKLOADS:
+            raise ValueError(f"Unknown database workload: {workload}")
+        settings = copy.copy(self)
+        for attr, value in self.WORKLOADS[workload].items():
+            setattr(settings, attr, value)
+        settings.app_name = f"{self.app_name}-{workload}"
+        return settings
+
+    def client_options(self):
+        """Keyword arguments for pymongo.MongoClient"""
+        options = {
+            "maxPoolSize": self.pool_size(),
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "retryWrites": self.retry_writes,
+            "retryReads": True,
+            "appname": self.app_name,
+            "readPreference": self.read_preference,
+        }
+        if self.compressors:
+            options["compressors"] = self.compressors
+        return options
@@ -0,0 +1,19 @@
+"""
+In-process storage backends implementing the subset of the pymongo
+collection API used by the managers, for running without a MongoDB server
+"""
+
+from db.storage.base import DuplicateKeyError, InsertOne, ReturnDocument, UpdateOne
+from db.storage.memory import MemoryDatabase
+from db.storage.sqlite import SQLiteDatabase
+
+BACKENDS = ("mongo", "memory", "sqlite")
+
+
+def create_database(settings):
+    """Create the in-process database selected by settings.backend"""
+    if settings.backend == "memory":
+        return MemoryDatabase(settings.database)
+    if settings.backend == "sqlite":
+        return SQLiteDatabase(settings.sqlite_path, settings.database)
+    raise ValueError(f"Not an in-process storage backend: {settings.backend}")
@@ -0,0 +1,390 @@
+"""
+Backend-independent parts of the in-process storage collections
+"""
+
+import contextlib
+import functools
+import threading
+import time
+from db.storage import geo, query as q
+
+try:
+    from pymongo import InsertOne, ReturnDocument, UpdateOne
+    from pymongo.errors import DuplicateKeyError
+except ImportError:
+    class ReturnDocument:
+        BEFORE = False
+        AFTER = True
+
+    class InsertOne:
+        def __init__(self, document):
+            self._doc = document
+
+    class UpdateOne:
+        def __init__(self, filter, update, upsert=False):
+            self._filter = filter
+            self._doc = update
+            self._upsert = upsert
+
+    class DuplicateKeyError(Exception):
+        """Raised when a write violates a unique index"""
+
+
+class InsertOneResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+        self.acknowledged = True
+
+
+class InsertManyResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+        self.acknowledged = True
+
+
+class UpdateResult:
+    def __init__(self, matched_count, modified_count, upserted_id=None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+        self.acknowledged = True
+
+
+class BulkWriteResult:
+    def __init__(self):
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.upserted_count = 0
+        self.acknowledged = True
+
+
+class DeleteResult:
+    def __init__(self, deleted_count):
+        self.deleted_count = deleted_count
+        self.acknowledged = True
+
+
+def _command(name, has_filter=True):
+    """Report each call to the database's command_listener (db.monitoring) as one round trip"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            listener = self.database.command_listener
+            if listener is None:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            succeeded = False
+            try:
+                result = method(self, *args, **kwargs)
+                succeeded = True
+                return result
+            finally:
+                filter = (args[0] if args else kwargs.get("filter", kwargs.get("pipeline"))) if has_filter else None
+                listener.record_command(name, self.name, filter, time.perf_counter() - started, succeeded)
+        return wrapper
+    return decorate
+
+
+def normalize_keys(keys, direction=1):
+    """Normalize create_index() keys to a list of (field, direction)"""
+    if isinstance(keys, str):
+        return [(keys, direction)]
+    return list(keys)
+
+
+class Cursor:
+    """Lazily evaluated find() cursor"""
+
+    def __init__(self, collection, query, projection=None):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = None
+        self._skip = 0
+        self._limit = 0
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = q.normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self._collection._plan(self._query)}}
+
+    def close(self):
+        self._results = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._results is None:
+            docs = self._collection._find_command(self._query, self._sort, self._skip, self._limit)
+            self._results = (q.project(doc, self._projection) for doc in docs)
+        return next(self._results)
+
+
+class BaseCollection:
+    """pymongo-compatible collection API on top of backend primitives.
+
+    Backends implement _candidates(query) (a superset of the matching
+    documents), _insert(doc), _replace(old_doc, new_doc), _delete(doc),
+    _create_index(name, keys, unique, sparse) and _plan(query), and may
+    override _near_docs(query, near, count) to answer $nearSphere from an index.
+    Documents handed to _replace/_delete are the ones _candidates returned.
+    """
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._lock = database._lock
+
+    # ---- reads ----
+    def _find_docs(self, query, sort=None, skip=0, limit=0):
+        near = None if sort else geo.near_condition(query or {})
+        if near is not None:
+            # $nearSphere results come nearest first, as in MongoDB
+            docs = self._near_docs(query, near, skip + limit if limit else 0)
+        else:
+            with self._lock:
+                docs = [doc for doc in self._candidates(query) if q.matches(doc, query)]
+        if sort:
+            docs = q.sort_documents(docs, sort)
+        if skip:
+            docs = docs[skip:]
+        if limit:
+            docs = docs[:limit]
+        return docs
+
+    def _near_docs(self, query, near, count):
+        """Matches of a $nearSphere query, nearest first (only the first count are needed if count)"""
+        field, _, _, max_km = near
+        radius_km = geo.NEAR_START_KM
+        # widen the search until it holds count matches, so backends that pre-filter
+        # on the radius only read the documents around the point
+        while count and (max_km is None or radius_km < max_km) and radius_km < geo.EARTH_RADIUS_KM:
+            narrowed = geo.with_max_distance(query, field, radius_km)
+            with self._lock:
+                docs = [doc for doc in self._candidates(narrowed) if q.matches(doc, narrowed)]
+            if len(docs) >= count:
+                return geo.sort_by_distance(docs, near)
+            radius_km *= 4
+        with self._lock:
+            docs = [doc for doc in self._candidates(query) if q.matches(doc, query)]
+        return geo.sort_by_distance(docs, near)
+
+    @_command("find")
+    def _find_command(self, query, sort=None, skip=0, limit=0):
+        # a cursor's first fetch
+        return self._find_docs(query, sort, skip, limit)
+
+    def find(self, filter=None, projection=None, sort=None, limit=0, session=None):
+        cursor = Cursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.limit(limit)
+
+    def find_one(self, filter=None, projection=None, sort=None, session=None):
+        for doc in self.find(filter, projection, sort=sort, limit=1):
+            return doc
+        return None
+
+    @_command("count")
+    def count_documents(self, filter, session=None):
+        return len(self._find_docs(filter))
+
+    @_command("aggregate")
+    def aggregate(self, pipeline, session=None):
+        pipeline = list(pipeline)
+        query = {}
+        if pipeline and "$match" in pipeline[0]:
+            query = pipeline.pop(0)["$match"]
+        return iter(q.run_pipeline(self._find_docs(query), pipeline))
+
+    # ---- writes ----
+    @_command("insert", has_filter=False)
+    def insert_one(self, document, session=None):
+        with self._lock:
+            self._insert(document)
+        return InsertOneResult(document["_id"])
+
+    @_command("insert", has_filter=False)
+    def insert_many(self, documents, session=None):
+        documents = list(documents)
+        with self._lock:
+            for document in documents:
+                self._insert(document)
+        return InsertManyResult([document["_id"] for document in documents])
+
+    def _update(self, query, update, upsert, many):
+        with self._lock:
+            targets = [doc for doc in self._candidates(query) if q.matches(doc, query)]
+            if not many:
+                targets = targets[:1]
+            modified = 0
+            for doc in targets:
+                new_doc = q.apply_update(doc, update)
+                if new_doc != doc:
+                    self._replace(doc, new_doc)
+                    modified += 1
+            if not targets and upsert:
+                new_doc = q.upsert_document(query, update)
+                self._insert(new_doc)
+                return UpdateResult(0, 0, new_doc["_id"])
+            return UpdateResult(len(targets), modified)
+
+    @_command("update")
+    def update_one(self, filter, update, upsert=False, session=None):
+        return self._update(filter, update, upsert, many=False)
+
+    @_command("update")
+    def update_many(self, filter, update, upsert=False, session=None):
+        return self._update(filter, update, upsert, many=True)
+
+    @_command("findAndModify")
+    def find_one_and_update(self, filter, update, projection=None, sort=None,
+                            upsert=False, return_document=ReturnDocument.BEFORE, session=None):
+        with self._lock:
+            docs = [doc for doc in self._candidates(filter) if q.matches(doc, filter)]
+            if sort:
+                docs = q.sort_documents(docs, q.normalize_sort(sort))
+            if docs:
+                before = docs[0]
+                after = q.apply_update(before, update)
+                if after != before:
+                    self._replace(before, after)
+            elif upsert:
+                before, after = None, q.upsert_document(filter, update)
+                self._insert(after)
+            else:
+                return None
+        result = after if return_document else before
+        return None if result is None else q.project(result, projection)
+
+    @_command("bulkWrite", has_filter=False)
+    def bulk_write(self, requests, ordered=True, session=None):
+        """Apply InsertOne/UpdateOne requests in one call, atomically"""
+        result = BulkWriteResult()
+        with self._lock, self.database._transaction():
+            for request in requests:
+                if isinstance(request, InsertOne):
+                    self._insert(request._doc)
+                    result.inserted_count += 1
+                elif isinstance(request, UpdateOne):
+                    update = self._update(request._filter, request._doc, request._upsert, many=False)
+                    result.matched_count += update.matched_count
+                    result.modified_count += update.modified_count
+                    result.upserted_count += update.upserted_id is not None
+                else:
+                    raise ValueError(f"Unsupported bulk write request: {type(request).__name__}")
+        return result
+
+    def _delete_matching(self, query, many):
+        with self._lock:
+            targets = [doc for doc in self._candidates(query) if q.matches(doc, query)]
+            if not many:
+                targets = targets[:1]
+            for doc in targets:
+                self._delete(doc)
+            return DeleteResult(len(targets))
+
+    @_command("delete")
+    def delete_one(self, filter, session=None):
+        return self._delete_matching(filter, many=False)
+
+    @_command("delete")
+    def delete_many(self, filter, session=None):
+        return self._delete_matching(filter, many=True)
+
+    # ---- indexes ----
+    def create_index(self, keys, unique=False, sparse=False, name=None, **kwargs):
+        keys = normalize_keys(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        with self._lock:
+            self._create_index(name, keys, unique, sparse)
+        return name
+
+
+class BaseDatabase:
+    """Database handle: collections are available as attributes or items"""
+
+    collection_class = None
+    command_listener = None  # db.monitoring.CommandMonitor when monitoring is on
+
+    def __init__(self, name="rideapp"):
+        self.name = name
+        self._lock = threading.RLock()
+        self._collections = {}
+
+    def get_collection(self, name):
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self.collection_class(self, name)
+                self._collections[name] = collection
+            return collection
+
+    def __getitem__(self, name):
+        return self.get_collection(name)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    @property
+    def client(self):
+        """Stand-in for the MongoClient, providing sessions"""
+        return LocalClient(self)
+
+    def _transaction(self):
+        """Context grouping writes into one backend transaction (none by default)"""
+        return contextlib.nullcontext()
+
+    def list_collection_names(self):
+        return list(self._collections)
+
+    def close(self):
+        pass
+
+
+class LocalSession:
+    """Session whose transactions hold the database lock for the whole callback.
+    Other threads never observe a partial transaction, and the backend's
+    _transaction() rolls back the callback's writes when it raises."""
+
+    def __init__(self, database):
+        self.database = database
+
+    def with_transaction(self, callback):
+        with self.database._lock, self.database._transaction():
+            return callback(self)
+
+    def end_session(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end_session()
+
+
+class LocalClient:
+    def __init__(self, database):
+        self.database = database
+
+    def start_session(self):
+        return LocalSession(self.database)
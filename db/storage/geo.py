@@ -0,0 +1,156 @@
+"""
+Geospatial queries for the in-process storage backends: $nearSphere (with a
+GeoJSON $geometry, distances in meters) and $geoWithin with $centerSphere,
+on fields holding GeoJSON points, plus the memory backend's 2dsphere index
+"""
+
+import math
+from db.storage import query as q
+from utils.geo_index import EARTH_RADIUS_KM, KM_PER_DEGREE, GeoGridIndex, haversine_km, lat_lng
+
+GEO_INDEX_TYPE = "2dsphere"
+GEO_OPERATORS = ("$nearSphere", "$geoWithin")
+NEAR_START_KM = 1.0  # first radius of a widening $nearSphere search
+# paths inside a GeoJSON point, for SQLite's bounding-box pre-filter (the index is on latitude)
+LONGITUDE_PATH = ".coordinates[0]"
+LATITUDE_PATH = ".coordinates[1]"
+
+
+def parse_near(argument):
+    """(lat, lng, max km or None, min km) of a $nearSphere argument"""
+    geometry = argument.get("$geometry") if isinstance(argument, dict) else None
+    center = lat_lng(geometry)
+    if center is None:
+        raise ValueError("$nearSphere needs a GeoJSON Point $geometry")
+    max_meters = argument.get("$maxDistance")
+    return center[0], center[1], None if max_meters is None else max_meters / 1000, \
+        argument.get("$minDistance", 0) / 1000
+
+
+def parse_within(argument):
+    """(lat, lng, radius km) of a $geoWithin {$centerSphere: [[lng, lat], radians]} argument"""
+    try:
+        (lng, lat), radians = argument["$centerSphere"]
+        return float(lat), float(lng), radians * EARTH_RADIUS_KM
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("$geoWithin only supports {$centerSphere: [[lng, lat], radians]}")
+
+
+def _distance_km(value, lat, lng):
+    location = lat_lng(value) if isinstance(value, dict) else None
+    return None if location is None else haversine_km(lat, lng, *location)
+
+
+def _match_near(value, argument):
+    lat, lng, max_km, min_km = parse_near(argument)
+    distance = _distance_km(value, lat, lng)
+    return distance is not None and distance >= min_km and (max_km is None or distance <= max_km)
+
+
+def _match_within(value, argument):
+    lat, lng, radius_km = parse_within(argument)
+    distance = _distance_km(value, lat, lng)
+    return distance is not None and distance <= radius_km
+
+
+q.FIELD_OPERATORS["$nearSphere"] = _match_near
+q.FIELD_OPERATORS["$geoWithin"] = _match_within
+
+
+def geo_condition(query):
+    """(field, operator, argument) of a top-level geospatial condition, or None"""
+    for field, condition in query.items():
+        if q.is_operator_dict(condition):
+            for op in GEO_OPERATORS:
+                if op in condition:
+                    return field, op, condition[op]
+    return None
+
+
+def search_circle(query):
+    """(field, lat, lng, radius km or None) of a geospatial condition, or None"""
+    condition = geo_condition(query)
+    if condition is None:
+        return None
+    field, op, argument = condition
+    if op == "$nearSphere":
+        lat, lng, max_km, _ = parse_near(argument)
+        return field, lat, lng, max_km
+    return (field,) + parse_within(argument)
+
+
+def near_condition(query):
+    """(field, lat, lng, max km) of a $nearSphere condition, whose results come nearest first"""
+    condition = geo_condition(query)
+    if condition is None or condition[1] != "$nearSphere":
+        return None
+    lat, lng, max_km, _ = parse_near(condition[2])
+    return condition[0], lat, lng, max_km
+
+
+def bounding_box(query):
+    """(field, min lat, max lat, min lng, max lng) around a geospatial condition with a
+    radius, or None; the longitude bounds are None near the poles and the antimeridian"""
+    circle = search_circle(query)
+    if circle is None or circle[3] is None:
+        return None
+    field, lat, lng, radius_km = circle
+    span = radius_km / KM_PER_DEGREE
+    edge_lat = abs(lat) + span
+    if edge_lat >= 89:
+        return field, lat - span, lat + span, None, None
+    lng_span = span / math.cos(math.radians(edge_lat))
+    if abs(lng) + lng_span > 180:
+        return field, lat - span, lat + span, None, None
+    return field, lat - span, lat + span, lng - lng_span, lng + lng_span
+
+
+def with_max_distance(query, field, max_km):
+    """Copy of a $nearSphere query on field limited to max_km"""
+    condition = dict(query[field])
+    condition["$nearSphere"] = dict(condition["$nearSphere"], **{"$maxDistance": max_km * 1000})
+    return dict(query, **{field: condition})
+
+
+def sort_by_distance(docs, near):
+    """Documents nearest first for near_condition()"""
+    field, lat, lng, _ = near
+    return sorted(docs, key=lambda doc: _distance_km(q.get_field(doc, field), lat, lng))
+
+
+def is_geo_index(keys):
+    return any(direction == GEO_INDEX_TYPE for _, direction in keys)
+
+
+class GeoIndex:
+    """2dsphere index for MemoryCollection: a grid of the documents' GeoJSON points"""
+
+    geo = True
+    unique = False
+    sparse = True
+
+    def __init__(self, name, keys, cell_km=1.0):
+        self.name = name
+        self.fields = [field for field, _ in keys]
+        self.grid = GeoGridIndex(cell_km)
+        self.ids = set()
+
+    def check(self, doc):
+        pass
+
+    def add(self, doc):
+        location = lat_lng(q.get_field(doc, self.fields[0]))
+        if location is not None:
+            self.grid.update(doc["_id"], *location)
+            self.ids.add(doc["_id"])
+
+    def remove(self, doc):
+        if doc["_id"] in self.ids:
+            self.grid.remove(doc["_id"])
+            self.ids.discard(doc["_id"])
+
+    def lookup(self, lat, lng, radius_km):
+        """Ids of the documents within radius_km (all indexed documents if None)"""
+        if radius_km is None:
+            return set(self.ids)
+        return {key for _, key in self.grid.within(lat, lng, radius_km)}
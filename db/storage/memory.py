@@ -0,0 +1,220 @@
+"""
+In-memory storage backend with hash indexes (and grid indexes for 2dsphere)
+"""
+
+import contextlib
+import itertools
+from db.storage import geo, query as q
+from db.storage.base import BaseCollection, BaseDatabase, DuplicateKeyError
+
+
+class HashIndex:
+    """Hash index on the leading field of an index spec.
+    Unique indexes also keep the full compound key of every document."""
+
+    geo = False
+
+    def __init__(self, name, keys, unique=False, sparse=False):
+        self.name = name
+        self.fields = [field for field, _ in keys]
+        self.unique = unique
+        self.sparse = sparse
+        self.buckets = {}
+        self.unique_keys = {}
+
+    def _lead_values(self, doc):
+        value = q.get_field(doc, self.fields[0])
+        if value is q.MISSING:
+            return [] if self.sparse else [None]
+        if isinstance(value, list):
+            # multikey: index every element
+            return [q.hashable(item) for item in value] or [None]
+        return [q.hashable(value)]
+
+    def _unique_key(self, doc):
+        values = [q.get_field(doc, field) for field in self.fields]
+        if self.sparse and all(value is q.MISSING for value in values):
+            return None
+        return tuple(None if value is q.MISSING else q.hashable(value) for value in values)
+
+    def check(self, doc):
+        """Raise DuplicateKeyError if adding doc would violate this index"""
+        if not self.unique:
+            return
+        key = self._unique_key(doc)
+        if key is not None and self.unique_keys.get(key, doc["_id"]) != doc["_id"]:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: {self.name} dup key: {key}")
+
+    def add(self, doc):
+        for value in self._lead_values(doc):
+            self.buckets.setdefault(value, set()).add(doc["_id"])
+        if self.unique:
+            key = self._unique_key(doc)
+            if key is not None:
+                self.unique_keys[key] = doc["_id"]
+
+    def remove(self, doc):
+        for value in self._lead_values(doc):
+            bucket = self.buckets.get(value)
+            if bucket is not None:
+                bucket.discard(doc["_id"])
+                if not bucket:
+                    del self.buckets[value]
+        if self.unique:
+            key = self._unique_key(doc)
+            if key is not None and self.unique_keys.get(key) == doc["_id"]:
+                del self.unique_keys[key]
+
+    def lookup(self, values):
+        ids = set()
+        for value in values:
+            ids.update(self.buckets.get(q.hashable(value), ()))
+        return ids
+
+
+class MemoryCollection(BaseCollection):
+    def __init__(self, database, name):
+        super().__init__(database, name)
+        self._docs = {}
+        self._indexes = {}
+        self._ids = itertools.count(1)
+
+    # ---- planning ----
+    def _index_for(self, query):
+        """Pick the most selective usable index: (plan, ids) or (None, None)"""
+        conditions = {field: [value] for field, value in q.equality_fields(query).items()}
+        for field, condition in query.items():
+            if q.is_operator_dict(condition) and "$in" in condition:
+                conditions[field] = list(condition["$in"])
+        best = (None, None)
+        for field, values in conditions.items():
+            if any(isinstance(v, (list, dict)) for v in values):
+                continue
+            if field == "_id":
+                ids = {v for v in values if v in self._docs}
+                plan = {"stage": "IDHACK"}
+            else:
+                index = next((i for i in self._indexes.values() if i.fields[0] == field and not i.geo
+                              and not (i.sparse and None in values)), None)
+                if index is None:
+                    continue
+                ids = index.lookup(values)
+                plan = {"stage": "IXSCAN", "indexName": index.name, "keyPattern": index.fields}
+            if best[1] is None or len(ids) < len(best[1]):
+                best = (plan, ids)
+        circle = geo.search_circle(query)
+        index = circle and self._geo_index(circle[0])
+        if index is not None:
+            ids = index.lookup(*circle[1:])
+            if best[1] is None or len(ids) < len(best[1]):
+                stage = "GEO_NEAR_2DSPHERE" if geo.near_condition(query) else "IXSCAN"
+                best = ({"stage": stage, "indexName": index.name, "keyPattern": index.fields}, ids)
+        if best[1] is None and "$or" in query:
+            plans, ids = [], set()
+            for branch in query["$or"]:
+                plan, branch_ids = self._index_for(branch)
+                if plan is None:
+                    return None, None
+                plans.append(plan)
+                ids |= branch_ids
+            best = ({"stage": "OR", "inputStages": plans}, ids)
+        return best
+
+    def _geo_index(self, field):
+        return next((i for i in self._indexes.values() if i.geo and i.fields[0] == field), None)
+
+    def _plan(self, query):
+        with self._lock:
+            plan, _ = self._index_for(query or {})
+        return {"stage": "FETCH", "inputStage": plan} if plan else {"stage": "COLLSCAN"}
+
+    def _candidates(self, query):
+        plan, ids = self._index_for(query or {})
+        if plan is None:
+            return list(self._docs.values())
+        # _ids are increasing, so sorting keeps natural (insertion) order
+        return [self._docs[i] for i in sorted(ids)]
+
+    def _near_docs(self, query, near, count):
+        field, lat, lng, max_km = near
+        index = self._geo_index(field)
+        if index is None or not count:
+            # without the grid every widening step would scan the whole collection
+            return super()._near_docs(query, near, 0)
+        with self._lock:
+            found = index.grid.nearest(lat, lng, count, max_km,
+                                       accept=lambda key: q.matches(self._docs[key], query))
+            return [self._docs[key] for _, key in found]
+
+    # ---- writes ----
+    def _insert(self, doc):
+        if "_id" not in doc:
+            doc["_id"] = next(self._ids)
+        if doc["_id"] in self._docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error index: _id_ dup key: {doc['_id']}")
+        stored = dict(doc)
+        for index in self._indexes.values():
+            index.check(stored)
+        for index in self._indexes.values():
+            index.add(stored)
+        self._docs[stored["_id"]] = stored
+        self.database._log_undo(lambda: self._delete(stored))
+
+    def _replace(self, old_doc, new_doc):
+        for index in self._indexes.values():
+            index.check(new_doc)
+        for index in self._indexes.values():
+            index.remove(old_doc)
+            index.add(new_doc)
+        self._docs[new_doc["_id"]] = new_doc
+        self.database._log_undo(lambda: self._replace(new_doc, old_doc))
+
+    def _delete(self, doc):
+        for index in self._indexes.values():
+            index.remove(doc)
+        del self._docs[doc["_id"]]
+        self.database._log_undo(lambda: self._insert(doc))
+
+    def _create_index(self, name, keys, unique, sparse):
+        if name in self._indexes:
+            return
+        if geo.is_geo_index(keys):
+            index = geo.GeoIndex(name, keys)
+        else:
+            index = HashIndex(name, keys, unique, sparse)
+        for doc in self._docs.values():
+            index.check(doc)
+            index.add(doc)
+        self._indexes[name] = index
+
+
+class MemoryDatabase(BaseDatabase):
+    """Process-local database; data is lost when the process exits"""
+
+    collection_class = MemoryCollection
+
+    def __init__(self, name="rideapp"):
+        super().__init__(name)
+        self._undo = None  # inverse of every write in the open transaction, oldest first
+
+    def _log_undo(self, undo):
+        if self._undo is not None:
+            self._undo.append(undo)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Undo the writes made so far when the block fails (joins an open
+        transaction); callers hold the database lock"""
+        if self._undo is not None:
+            yield
+            return
+        self._undo = []
+        try:
+            yield
+        except Exception:
+            undo, self._undo = self._undo, None
+            for step in reversed(undo):
+                step()
+            raise
+        finally:
+            self._undo = None
@@ -0,0 +1,380 @@
+"""
+Query, update and aggregation evaluation shared by the in-process storage backends.
+Implements the subset of MongoDB semantics the managers rely on.
+"""
+
+from datetime import datetime
+
+
+class _Missing:
+    """Marker for a field that is not present in a document"""
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+def get_field(doc, path):
+    """Get a (dotted) field from a document, or MISSING"""
+    if "." not in path:
+        return doc.get(path, MISSING)
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return MISSING
+        value = value.get(part, MISSING)
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def _set_field(doc, path, value):
+    """Set a (dotted) field, copying nested documents along the path"""
+    parts = path.split(".")
+    for part in parts[:-1]:
+        child = doc.get(part)
+        child = dict(child) if isinstance(child, dict) else {}
+        doc[part] = child
+        doc = child
+    doc[parts[-1]] = value
+
+
+def _unset_field(doc, path):
+    """Remove a (dotted) field, copying nested documents along the path"""
+    parts = path.split(".")
+    for part in parts[:-1]:
+        child = doc.get(part)
+        if not isinstance(child, dict):
+            return
+        child = dict(child)
+        doc[part] = child
+        doc = child
+    doc.pop(parts[-1], None)
+
+
+# =============================
+# Matching
+# =============================
+def _equals(value, expected):
+    if expected is None:
+        return value is None or value is MISSING
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+
+def _compare(value, expected, op):
+    candidates = value if isinstance(value, list) else [value]
+    for candidate in candidates:
+        if candidate is MISSING or candidate is None:
+            continue
+        try:
+            if op(candidate, expected):
+                return True
+        except TypeError:
+            # MongoDB only compares values of the same type
+            continue
+    return False
+
+
+COMPARISONS = {
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+}
+
+# Extra field operators registered by the backends: name -> fn(value, argument)
+FIELD_OPERATORS = {}
+
+
+def _match_operator(value, op, argument):
+    if op == "$eq":
+        return _equals(value, argument)
+    if op == "$ne":
+        return not _equals(value, argument)
+    if op in COMPARISONS:
+        return _compare(value, argument, COMPARISONS[op])
+    if op == "$in":
+        return any(_equals(value, item) for item in argument)
+    if op == "$nin":
+        return not any(_equals(value, item) for item in argument)
+    if op == "$exists":
+        return (value is not MISSING) == bool(argument)
+    if op == "$not":
+        return not _match_condition(value, argument)
+    if op in FIELD_OPERATORS:
+        return FIELD_OPERATORS[op](value, argument)
+    raise ValueError(f"Unsupported query operator: {op}")
+
+
+def is_operator_dict(condition):
+    return isinstance(condition, dict) and condition and next(iter(condition)).startswith("$")
+
+
+def _match_condition(value, condition):
+    if is_operator_dict(condition):
+        return all(_match_operator(value, op, arg) for op, arg in condition.items())
+    return _equals(value, condition)
+
+
+def matches(doc, query):
+    """Check whether a document matches a query filter"""
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, branch) for branch in condition):
+                return False
+        elif key == "$nor":
+            if any(matches(doc, branch) for branch in condition):
+                return False
+        elif not _match_condition(get_field(doc, key), condition):
+            return False
+    return True
+
+
+def equality_fields(query):
+    """Top-level field -> value for the plain equality conditions of a filter"""
+    fields = {}
+    for key, condition in query.items():
+        if key.startswith("$"):
+            continue
+        if is_operator_dict(condition):
+            if "$eq" in condition:
+                fields[key] = condition["$eq"]
+        else:
+            fields[key] = condition
+    return fields
+
+
+# =============================
+# Updates
+# =============================
+def apply_update(doc, update, is_insert=False):
+    """Return a new document with update operators applied"""
+    new_doc = dict(doc)
+    for op, fields in update.items():
+        if op == "$set":
+            for path, value in fields.items():
+                _set_field(new_doc, path, value)
+        elif op == "$setOnInsert":
+            if is_insert:
+                for path, value in fields.items():
+                    _set_field(new_doc, path, value)
+        elif op == "$unset":
+            for path in fields:
+                _unset_field(new_doc, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                current = get_field(new_doc, path)
+                _set_field(new_doc, path, (0 if current is MISSING else current) + amount)
+        elif op == "$push":
+            for path, value in fields.items():
+                current = get_field(new_doc, path)
+                _set_field(new_doc, path, ([] if current is MISSING else list(current)) + [value])
+        else:
+            raise ValueError(f"Unsupported update operator: {op}")
+    return new_doc
+
+
+def upsert_document(query, update):
+    """Build the document inserted by an upsert"""
+    doc = {}
+    for path, value in equality_fields(query).items():
+        _set_field(doc, path, value)
+    return apply_update(doc, update, is_insert=True)
+
+
+# =============================
+# Projection & sorting
+# =============================
+def project(doc, projection):
+    """Apply a find() projection to a document"""
+    if not projection:
+        return dict(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(fields.values()):
+        result = {}
+        for path in fields:
+            value = get_field(doc, path)
+            if value is not MISSING:
+                _set_field(result, path, value)
+    else:
+        result = dict(doc)
+        for path in fields:
+            _unset_field(result, path)
+    if include_id and "_id" in doc:
+        result["_id"] = doc["_id"]
+    elif not include_id:
+        result.pop("_id", None)
+    return result
+
+
+def _type_rank(value):
+    if value is MISSING or value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def sort_key(value):
+    """Key ordering values like MongoDB's BSON comparison order"""
+    rank = _type_rank(value)
+    if rank == 1:
+        return (rank, 0)
+    if rank in (4, 5, 10):
+        return (rank, repr(value))
+    return (rank, value)
+
+
+def normalize_sort(key_or_list, direction=None):
+    """Normalize sort() arguments to a list of (field, direction)"""
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def sort_documents(docs, sort_spec):
+    """Sort documents by a list of (field, direction)"""
+    docs = list(docs)
+    for field, direction in reversed(sort_spec):
+        docs.sort(key=lambda d: sort_key(get_field(d, field)), reverse=direction < 0)
+    return docs
+
+
+# =============================
+# Aggregation
+# =============================
+DATE_OPERATORS = {
+    "$year": lambda d: d.year,
+    "$month": lambda d: d.month,
+    "$dayOfMonth": lambda d: d.day,
+    "$hour": lambda d: d.hour,
+}
+
+
+def evaluate(expression, doc):
+    """Evaluate an aggregation expression against a document"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = get_field(doc, expression[1:])
+        return None if value is MISSING else value
+    if isinstance(expression, dict):
+        if is_operator_dict(expression):
+            op, argument = next(iter(expression.items()))
+            if op in DATE_OPERATORS:
+                value = evaluate(argument, doc)
+                return DATE_OPERATORS[op](value) if isinstance(value, datetime) else None
+            if op == "$ifNull":
+                value = evaluate(argument[0], doc)
+                return evaluate(argument[1], doc) if value is None else value
+            if op == "$size":
+                return len(evaluate(argument, doc) or [])
+            raise ValueError(f"Unsupported expression operator: {op}")
+        return {key: evaluate(value, doc) for key, value in expression.items()}
+    return expression
+
+
+def hashable(value):
+    if isinstance(value, dict):
+        return tuple((k, hashable(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(hashable(v) for v in value)
+    return value
+
+
+def _accumulate(op, values):
+    if op == "$sum":
+        return sum(v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool))
+    if op == "$avg":
+        numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+        return sum(numbers) / len(numbers) if numbers else None
+    if op == "$min":
+        present = [v for v in values if v is not None]
+        return min(present, key=sort_key) if present else None
+    if op == "$max":
+        present = [v for v in values if v is not None]
+        return max(present, key=sort_key) if present else None
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    if op == "$push":
+        return list(values)
+    raise ValueError(f"Unsupported accumulator: {op}")
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        group_id = evaluate(spec["_id"], doc)
+        key = hashable(group_id)
+        if key not in groups:
+            groups[key] = (group_id, [])
+        groups[key][1].append(doc)
+    results = []
+    for group_id, members in groups.values():
+        result = {"_id": group_id}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            op, expression = next(iter(accumulator.items()))
+            result[field] = _accumulate(op, [evaluate(expression, doc) for doc in members])
+        results.append(result)
+    return results
+
+
+def _project_stage(docs, spec):
+    computed = {k: v for k, v in spec.items() if not isinstance(v, (int, bool))}
+    plain = {k: v for k, v in spec.items() if k not in computed}
+    results = []
+    for doc in docs:
+        result = project(doc, plain) if plain else dict(doc)
+        for field, expression in computed.items():
+            _set_field(result, field, evaluate(expression, doc))
+        results.append(result)
+    return results
+
+
+def run_pipeline(docs, pipeline):
+    """Run an aggregation pipeline over a list of documents"""
+    for stage in pipeline:
+        name, spec = next(iter(stage.items()))
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$sort":
+            docs = sort_documents(docs, normalize_sort(spec))
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$project":
+            docs = _project_stage(docs, spec)
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == "$facet":
+            docs = [{field: run_pipeline(list(docs), sub) for field, sub in spec.items()}]
+        else:
+            raise ValueError(f"Unsupported aggregation stage: {name}")
+    return docs
@@ -0,0 +1,191 @@
+"""
+SQLite storage backend: one table of JSON documents per collection,
+with expression indexes on the indexed fields
+"""
+
+import contextlib
+import json
+import sqlite3
+from datetime import datetime
+from db.storage import geo, query as q
+from db.storage.base import BaseCollection, BaseDatabase, DuplicateKeyError
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+def encode(doc):
+    return json.dumps(doc, default=_encode_value, separators=(",", ":"))
+
+
+def decode(text):
+    return json.loads(text, object_hook=_decode_object)
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _field_expr(field):
+    """json_extract() expression for a field; literal paths so expression indexes match"""
+    return "json_extract(doc, '$." + field.replace("'", "''") + "')"
+
+
+def _pushable(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+class SQLiteCollection(BaseCollection):
+    def __init__(self, database, name):
+        super().__init__(database, name)
+        self._table = _quote(name)
+        with self._lock:
+            database._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL)"
+            )
+            database._conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(name + '__id_')} "
+                f"ON {self._table} ({_field_expr('_id')})"
+            )
+
+    # ---- planning ----
+    def _where(self, query):
+        """SQL pre-filter for the equality conditions of a query and the bounding box of a
+        geospatial one (a superset of the matches)"""
+        clauses, params = [], []
+        conditions = {field: [value] for field, value in q.equality_fields(query).items()}
+        for field, condition in query.items():
+            if q.is_operator_dict(condition) and "$in" in condition:
+                conditions[field] = list(condition["$in"])
+        for field, values in conditions.items():
+            if values and all(_pushable(v) for v in values):
+                clauses.append(f"{_field_expr(field)} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+        box = geo.bounding_box(query)
+        if box is not None:
+            field, min_lat, max_lat, min_lng, max_lng = box
+            clauses.append(f"{_field_expr(field + geo.LATITUDE_PATH)} BETWEEN ? AND ?")
+            params.extend((min_lat, max_lat))
+            if min_lng is not None:
+                clauses.append(f"{_field_expr(field + geo.LONGITUDE_PATH)} BETWEEN ? AND ?")
+                params.extend((min_lng, max_lng))
+        if "$or" in query:
+            branches = [self._where(branch) for branch in query["$or"]]
+            if all(sql for sql, _ in branches):
+                clauses.append("(" + " OR ".join(f"({sql})" for sql, _ in branches) + ")")
+                for _, branch_params in branches:
+                    params.extend(branch_params)
+        return " AND ".join(clauses), params
+
+    def _select_sql(self, query):
+        where, params = self._where(query or {})
+        sql = f"SELECT doc FROM {self._table}"
+        if where:
+            sql += f" WHERE {where}"
+        return sql + " ORDER BY id", params
+
+    def _plan(self, query):
+        sql, params = self._select_sql(query)
+        with self._lock:
+            rows = self.database._conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        stages = []
+        for row in rows:
+            detail = row[-1]
+            if "USING" in detail and "INDEX" in detail and "TEMP B-TREE" not in detail:
+                stages.append({"stage": "IXSCAN", "detail": detail})
+            elif detail.startswith("SCAN"):
+                stages.append({"stage": "COLLSCAN", "detail": detail})
+        return {"stage": "FETCH", "inputStages": stages}
+
+    def _candidates(self, query):
+        sql, params = self._select_sql(query)
+        return [decode(row[0]) for row in self.database._conn.execute(sql, params)]
+
+    # ---- writes ----
+    def _insert(self, doc):
+        conn = self.database._conn
+        assign_id = "_id" not in doc
+        try:
+            with self.database._transaction():
+                cursor = conn.execute(f"INSERT INTO {self._table} (doc) VALUES (?)", (encode(doc),))
+                if assign_id:
+                    conn.execute(f"UPDATE {self._table} SET doc = json_set(doc, '$._id', id) WHERE id = ?",
+                                 (cursor.lastrowid,))
+                    doc["_id"] = cursor.lastrowid
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {e}")
+
+    def _replace(self, old_doc, new_doc):
+        try:
+            self.database._conn.execute(
+                f"UPDATE {self._table} SET doc = ? WHERE {_field_expr('_id')} = ?",
+                (encode(new_doc), old_doc["_id"])
+            )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {e}")
+
+    def _delete(self, doc):
+        self.database._conn.execute(
+            f"DELETE FROM {self._table} WHERE {_field_expr('_id')} = ?", (doc["_id"],)
+        )
+
+    def _create_index(self, name, keys, unique, sparse):
+        # a 2dsphere key indexes the point's latitude, for the _where() bounding box
+        columns = ", ".join(_field_expr(field + geo.LATITUDE_PATH if direction == geo.GEO_INDEX_TYPE else field)
+                            for field, direction in keys)
+        sql = (f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS "
+               f"{_quote(self.name + '_' + name)} ON {self._table} ({columns})")
+        if sparse:
+            sql += f" WHERE {_field_expr(keys[0][0])} IS NOT NULL"
+        try:
+            self.database._conn.execute(sql)
+        except sqlite3.IntegrityError as e:
+            raise DuplicateKeyError(f"E11000 duplicate key error: {e}")
+
+
+class SQLiteDatabase(BaseDatabase):
+    """Database stored in a single SQLite file (or ':memory:')"""
+
+    collection_class = SQLiteCollection
+
+    def __init__(self, path=":memory:", name="rideapp"):
+        super().__init__(name)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        tables = self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'sqlite_sequence'"
+        ).fetchall()
+        for (table,) in tables:
+            self.get_collection(table)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Group statements into one SQLite transaction (joins an open one)"""
+        if self._conn.in_transaction:
+            yield
+            return
+        self._conn.execute("BEGIN")
+        try:
+            yield
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def close(self):
+        self._conn.close()
@@ -38,8 +38,8 @@ class LoginWindow(BaseWindow):
         password_frame.pack(fill=tk.X, pady=10)
         
         # Login button
-        login_button = self.create_button("Login", self.login, parent=form_frame)
-        login_button.pack(fill=tk.X, pady=20)
+        self.login_button = self.create_button("Login", self.login, parent=form_frame)
+        self.login_button.pack(fill=tk.X, pady=20)
         
         # Register link
         register_label = tk.Label(form_frame, text="Don't have an account? Register here", 
@@ -60,10 +60,15 @@ class LoginWindow(BaseWindow):
             self.show_error("Please enter a valid email")
             return
         
-        success, message = self.auth_manager.login_user(email, password)
+        self.run_in_background(lambda: self.auth_manager.login_user(email, password),
+                               self.on_login_done, widgets=[self.login_button], action="auth.login")
+    
+    def on_login_done(self, result):
+        """Handle the login result"""
+        success, message = result
         if success:
             self.show_success(message)
-            self.root.destroy()
+            self.close()
             # Launch dashboard after successful login
             from gui.dashboard import Dashboard
             dashboard = Dashboard(self.auth_manager)
@@ -73,7 +78,7 @@ class LoginWindow(BaseWindow):
     
     def show_register(self):
         """Show registration window"""
-        self.root.destroy()
+        self.close()
         register_window = RegisterWindow(self.auth_manager)
         register_window.run()
 
@@ -155,8 +160,8 @@ class RegisterWindow(BaseWindow):
             self.license_entry.config(state='disabled')
         
         # Register button
-        register_button = self.create_button("Register", self.register, parent=form_frame)
-        register_button.pack(fill=tk.X, pady=20)
+        self.register_button = self.create_button("Register", self.register, parent=form_frame)
+        self.register_button.pack(fill=tk.X, pady=20)
         
         # Login link
         login_label = tk.Label(form_frame, text="Already have an account? Login here", 
@@ -213,10 +218,14 @@ class RegisterWindow(BaseWindow):
             return
         
         # Register user
-        success, message = self.auth_manager.register_user(
-            email, password, name, phone, user_type, license_number
+        self.run_in_background(
+            lambda: self.auth_manager.register_user(email, password, name, phone, user_type, license_number),
+            self.on_register_done, widgets=[self.register_button], action="auth.register"
         )
-        
+    
+    def on_register_done(self, result):
+        """Handle the registration result"""
+        success, message = result
         if success:
             self.show_success("Registration successful! Redirecting to login...")
             # Wait a moment for the success message to be seen
@@ -226,6 +235,6 @@ class RegisterWindow(BaseWindow):
     
     def show_login(self):
         """Show login window"""
-        self.root.destroy()
+        self.close()
         login_window = LoginWindow(self.auth_manager, show_welcome=True)
         login_window.run()
@@ -0,0 +1,90 @@
+"""
+Adaptive auto-refresh: polls a cheap change marker and only triggers a
+full refresh when it moves
+"""
+
+
+class AdaptivePoller:
+    """Polls fetch_marker() on the background runner and calls on_change() when the value changes.
+
+    The interval starts at base_ms and doubles with every poll that finds no
+    change, up to max_ms. It drops to fast_ms while is_busy() (the user has a
+    ride in flight), is multiplied by UNFOCUSED_FACTOR while is_focused() is
+    false, and is max_ms while is_pushed() (another source such as a change
+    stream delivers updates). Failed polls back off the same way.
+    """
+
+    UNFOCUSED_FACTOR = 4
+
+    def __init__(self, root, runner, fetch_marker, on_change, base_ms=3000, fast_ms=1000, max_ms=30000,
+                 is_busy=None, is_focused=None, is_pushed=None):
+        self.root = root
+        self.runner = runner
+        self.fetch_marker = fetch_marker
+        self.on_change = on_change
+        self.base_ms = base_ms
+        self.fast_ms = fast_ms
+        self.max_ms = max_ms
+        self.is_busy = is_busy or (lambda: False)
+        self.is_focused = is_focused or (lambda: True)
+        self.is_pushed = is_pushed or (lambda: False)
+        self.marker = None
+        self.idle_polls = 0
+        self._after_id = None
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._schedule(0)
+
+    def stop(self):
+        self._running = False
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def reset_backoff(self):
+        """Poll at the base rate again (the user just did something)"""
+        self.idle_polls = 0
+
+    def next_delay(self):
+        """Milliseconds until the next poll"""
+        if self.is_pushed():
+            return self.max_ms
+        if self.is_busy():
+            delay = self.fast_ms
+        else:
+            delay = self.base_ms * 2 ** min(self.idle_polls, 16)
+        if not self.is_focused():
+            delay *= self.UNFOCUSED_FACTOR
+        return min(delay, self.max_ms)
+
+    def _schedule(self, delay):
+        if self._running:
+            self._after_id = self.root.after(delay, self._poll)
+
+    def _poll(self):
+        self._after_id = None
+        # a newer poll supersedes a slow one still in flight
+        self.runner.submit("change_marker", self.fetch_marker, self._on_marker, self._on_error)
+
+    def _on_marker(self, marker):
+        if marker is None:
+            self._on_error(None)
+            return
+        if marker == self.marker:
+            self.idle_polls += 1
+        else:
+            changed = self.marker is not None  # the first poll only records where we are
+            self.marker = marker
+            self.idle_polls = 0
+            if changed:
+                self.on_change()
+        self._schedule(self.next_delay())
+
+    def _on_error(self, error):
+        self.idle_polls += 1
+        self._schedule(self.next_delay())
@@ -0,0 +1,87 @@
+"""
+Runs blocking calls (database access) on a bounded worker pool and hands
+the results back to the Tk main thread
+"""
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundRunner:
+    POLL_MS = 30  # how often finished calls are collected while any are pending
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-worker")
+        self._done = queue.Queue()
+        self._generations = {}
+        self._futures = {}
+        self._pending = 0
+        self._poll_id = None
+        self._closed = False
+
+    def submit(self, key, fn, on_success=None, on_error=None):
+        """Run fn() on a worker, then on_success(result) or on_error(exception) on the Tk thread.
+        Submitting again with the same key makes the earlier call stale: it is
+        cancelled if it has not started and its result is dropped. Use key=None
+        for calls that must never be superseded (user actions)."""
+        if self._closed:
+            return
+        generation = None
+        if key is not None:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            previous = self._futures.get(key)
+            if previous is not None:
+                previous.cancel()
+        future = self._executor.submit(fn)
+        if key is not None:
+            self._futures[key] = future
+        self._pending += 1
+        # add_done_callback runs on the worker thread: only hand over through the queue
+        future.add_done_callback(lambda f: self._done.put((key, generation, f, on_success, on_error)))
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.POLL_MS, self._poll)
+
+    def cancel(self, key):
+        """Make the in-flight call for key stale"""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        future = self._futures.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def _poll(self):
+        self._poll_id = None
+        try:
+            while True:
+                try:
+                    key, generation, future, on_success, on_error = self._done.get_nowait()
+                except queue.Empty:
+                    break
+                self._pending -= 1
+                if key is not None:
+                    if self._generations.get(key) != generation:
+                        continue
+                    self._futures.pop(key, None)
+                if self._closed or future.cancelled():
+                    continue
+                error = future.exception()
+                if error is None:
+                    if on_success:
+                        on_success(future.result())
+                elif on_error:
+                    on_error(error)
+        finally:
+            if self._pending and not self._closed:
+                self._poll_id = self.root.after(self.POLL_MS, self._poll)
+
+    def shutdown(self):
+        """Drop pending results and stop the workers (running calls finish in the background)"""
+        self._closed = True
+        if self._poll_id is not None:
+            try:
+                self.root.after_cancel(self._poll_id)
+            except Exception:
+                pass
+            self._poll_id = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
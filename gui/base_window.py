@@ -1,5 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from db.connection import db_connection
+from db.monitoring import action_scope
+from gui.background import BackgroundRunner
 
 class BaseWindow:
     def __init__(self, title="Ride App", width=800, height=600):
@@ -8,6 +11,9 @@ class BaseWindow:
         self.root.geometry(f"{width}x{height}")
         self.root.configure(bg='#f0f0f0')
         
+        # Database calls run here so a slow server never freezes the window
+        self.runner = BackgroundRunner(self.root, db_connection.settings.dispatch_workers)
+        
         # Center the window
         self.center_window()
         
@@ -127,6 +133,29 @@ class BaseWindow:
         """Show success message"""
         self.show_message("Success", message, "info")
     
+    def set_widgets_state(self, widgets, state):
+        """Enable (tk.NORMAL) or disable (tk.DISABLED) widgets that still exist"""
+        for widget in widgets:
+            if widget.winfo_exists():
+                widget.configure(state=state)
+    
+    def run_in_background(self, fn, on_done, widgets=(), key=None, action=None):
+        """Run fn() on a worker thread with widgets disabled, then on_done(result) on the Tk thread.
+        action names the user action its database commands are counted under."""
+        self.set_widgets_state(widgets, tk.DISABLED)
+        if action:
+            fn = action_scope(action)(fn)
+        
+        def finish(result):
+            self.set_widgets_state(widgets, tk.NORMAL)
+            on_done(result)
+        
+        def fail(error):
+            self.set_widgets_state(widgets, tk.NORMAL)
+            self.show_error(f"Request failed: {error}")
+        
+        self.runner.submit(key, fn, finish, fail)
+    
     def clear_widgets(self, parent=None):
         """Clear all widgets from a parent"""
         if parent is None:
@@ -141,4 +170,5 @@ class BaseWindow:
     
     def close(self):
         """Close the window"""
+        self.runner.shutdown()
         self.root.destroy()
@@ -1,6 +1,13 @@
+import queue
 import tkinter as tk
 from tkinter import ttk, messagebox
 from gui.base_window import BaseWindow
+from gui.ride_list import RideListView
+from gui.virtual_list import VirtualRideList
+from core.ride_events import ride_events
+from gui.auto_refresh import AdaptivePoller
+from gui.tab_cache import TabCache
+from db.monitoring import action_scope
 from core.ride_manager import RideManager
 from core.payment_manager import PaymentManager
 from utils.validators import Validators
@@ -11,6 +18,12 @@ class Dashboard(BaseWindow):
 
     # --- config ---
     AUTO_REFRESH_MS = 3000  # periodic refresh to reflect server-side changes
+    AUTO_REFRESH_FAST_MS = 1000  # while the user has a ride in flight
+    AUTO_REFRESH_MAX_MS = 30000  # idle / unfocused / change streams active
+    EVENT_POLL_MS = 200  # how often queued ride events are applied on the Tk thread
+    TAB_CACHE_TTL = 15  # seconds a loaded tab is shown again without a reload
+    # bucket whose rides decide the driver status chip / fast polling
+    STATUS_BUCKETS = {"driver": "ongoing", "rider": "requested"}
 
     def __init__(self, auth_manager):
         super().__init__("Dashboard - Ride App", width=1100, height=720)
@@ -23,12 +36,28 @@ class Dashboard(BaseWindow):
         self._mousewheel_bound_canvases = set()
         self.status_var = tk.StringVar(value="Online")
         self.notebook = None
+        self._has_active_ride = False
+        self.role = "driver" if hasattr(self.current_user, 'license_number') else "rider"
+        self._buckets = {}  # bucket -> (tab, list view)
+        self.tab_cache = TabCache(self.TAB_CACHE_TTL)
+        self._snapshot_pending = False
 
+        # ride events may arrive on any thread; Tk widgets are only touched from _drain_events
+        self._events = queue.Queue()
+        self._event_subscription = ride_events.subscribe(self._events.put)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         self.setup_styles()
         self.setup_ui()
         # start periodic refresh loop (reflect accept/complete/cancel made by others)
-        # self.root.after(self.AUTO_REFRESH_MS, self._auto_refresh)
+        self.poller = AdaptivePoller(
+            self.root, self.runner, action_scope("dashboard.poll")(self._fetch_change_marker), self._auto_refresh,
+            base_ms=self.AUTO_REFRESH_MS, fast_ms=self.AUTO_REFRESH_FAST_MS, max_ms=self.AUTO_REFRESH_MAX_MS,
+            is_busy=lambda: self._has_active_ride, is_focused=self._is_focused,
+            is_pushed=lambda: ride_events.source == "change_stream"
+        )
+        self.poller.start()
+        self.root.after(self.EVENT_POLL_MS, self._drain_events)
 
     # =============================
     # Styling
@@ -151,44 +180,131 @@ class Dashboard(BaseWindow):
             if delta:
                 canvas.yview_scroll(delta, "units")
 
-        canvas.bind_all("<MouseWheel>", _on_mouse_wheel)
-        canvas.bind_all("<Button-4>", _on_mouse_wheel)
-        canvas.bind_all("<Button-5>", _on_mouse_wheel)
-
-    def ride_card(self, parent, ride, actions):
-        """Reusable ride card. actions: list[(label, callback, style_tag)]"""
-        card = ttk.Frame(parent, style="Card.TFrame")
-        card.pack(fill=tk.X, padx=8, pady=6)
-
-        body = tk.Frame(card, bg="white")
-        body.pack(fill=tk.X, padx=12, pady=12)
-
-        # left info
-        info = tk.Frame(body, bg="white")
-        info.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        # the wheel scrolls whichever list is under the pointer
+        def _on_enter(event):
+            canvas.bind_all("<MouseWheel>", _on_mouse_wheel)
+            canvas.bind_all("<Button-4>", _on_mouse_wheel)
+            canvas.bind_all("<Button-5>", _on_mouse_wheel)
+
+        canvas.bind("<Enter>", _on_enter)
+
+    def ride_list(self, tab, empty_text, fetch_page, describe=None):
+        """Keyed, scrollable list of ride cards filling a tab, with a "Load more" button paged from RideManager"""
+        return RideListView(self.make_scrollable(tab), empty_text, describe, self.runner, fetch_page)
+
+    def virtual_ride_list(self, tab, empty_text, fetch_page, describe=None):
+        """Virtualized list for tabs that can hold thousands of rides, paged from RideManager"""
+        view = VirtualRideList(tab, empty_text, self.runner, fetch_page, describe)
+        self._bind_mousewheel(view.canvas)
+        return view
+
+    def _bucket_pager(self, role, bucket):
+        """fetch_page for a list showing one dashboard bucket (runs on a worker thread)"""
+        email = self.current_user.email
+        return action_scope("dashboard.scroll")(
+            lambda limit, after: self.ride_manager.get_bucket_page(email, role, bucket, limit, after))
+
+    def _show_counts(self, counts):
+        """Append each bucket's total ride count to its tab title"""
+        for bucket, (tab, view) in self._buckets.items():
+            statuses = RideManager.DASHBOARD_BUCKETS[self.role][bucket][0]
+            self._set_tab_count(tab, sum(counts.get(status, 0) for status in statuses))
+
+    def _set_tab_count(self, tab, total):
+        title = self.notebook.tab(tab, "text").split(" (")[0]
+        self.notebook.tab(tab, text=f"{title} ({total})")
+
+    @staticmethod
+    def _rider_footer(ride):
+        # Show rider id as requested if available
+        return f"Rider: {getattr(ride, 'rider_email', getattr(ride, 'user_email', 'N/A'))}"
+
+    def _run_ride_action(self, fn, buckets, on_success=None, action=None):
+        """Run a RideManager action returning (success, ..., message) on a worker thread.
+        The buckets the action touches are reloaded afterwards either way: a
+        failed action usually means the ride changed under us."""
+        def done(result):
+            if result[0]:
+                self.show_success(result[-1])
+                if on_success:
+                    on_success(result)
+            else:
+                self.show_error(result[-1])
+            self.reload_buckets(*buckets)
+        self.run_in_background(fn, done, action=action)
 
-        tk.Label(info, text=f"Ride ID: {getattr(ride, 'ride_id', '')}",
-                 bg="white", font=("Segoe UI", 10, "bold")).pack(anchor='w')
-        tk.Label(info, text=f"From: {getattr(ride, 'pickup_location', '')}", bg="white").pack(anchor='w')
-        tk.Label(info, text=f"To: {getattr(ride, 'drop_location', '')}", bg="white").pack(anchor='w')
-        fare = getattr(ride, 'fare', 0)
-        try:
-            fare_text = Validators.format_currency(fare)
-        except Exception:
-            fare_text = str(fare)
-        tk.Label(info, text=f"Fare: {fare_text}", bg="white").pack(anchor='w')
-        tk.Label(info, text=f"Status: {getattr(ride, 'status', '').title()}", bg="white").pack(anchor='w')
-
-        # right actions
-        act = tk.Frame(body, bg="white")
-        act.pack(side=tk.RIGHT)
-        for (label, cb, style_tag) in actions:
-            btn = tk.Button(
-                act, text=label, command=cb,
-                bg=style_tag.get('bg', '#0d6efd'), fg=style_tag.get('fg', 'white'),
-                relief=tk.FLAT, padx=12, pady=6
-            )
-            btn.pack(side=tk.LEFT, padx=6)
+    # =============================
+    # Tab loading: a full snapshot on open / Refresh, otherwise one bucket at a time
+    # =============================
+    def _add_bucket(self, bucket, tab, view):
+        self._buckets[bucket] = (tab, view)
+
+    def refresh_all_tabs(self):
+        """Load every tab with one dashboard query"""
+        self._discard_pending_events()
+        email = self.current_user.email
+        # reload as many rows as the lists hold so nobody loses their scroll position
+        limits = {bucket: view.loaded_count() for bucket, (tab, view) in self._buckets.items()}
+        versions = {bucket: self.tab_cache.version(bucket) for bucket in self._buckets}
+        if self.role == "driver":
+            fetch = lambda: self.ride_manager.get_driver_dashboard(email, limits=limits)
+        else:
+            fetch = lambda: self.ride_manager.get_rider_dashboard(email, limits=limits)
+        # a newer refresh supersedes one still in flight
+        self._snapshot_pending = True
+        self.runner.submit("all_tabs", action_scope("dashboard.refresh")(fetch), lambda snapshot: self._render_snapshot(snapshot, versions),
+                           self._on_snapshot_error)
+
+    def _on_snapshot_error(self, error):
+        self._snapshot_pending = False
+        self._on_refresh_error(error)
+
+    def _render_snapshot(self, snapshot, versions):
+        self._snapshot_pending = False
+        for bucket in self._buckets:
+            self._show_bucket(bucket, snapshot[bucket], versions[bucket], count=False)
+        self._show_counts(snapshot['counts'])
+        # buckets invalidated while the snapshot was in flight are still stale
+        self.load_visible_tab()
+
+    def load_visible_tab(self):
+        """Load the selected tab (and the status bucket) unless their cached rows are still fresh"""
+        if self.notebook is None or self._snapshot_pending:
+            # the snapshot on its way loads every tab
+            return
+        selected = self.notebook.select()
+        for bucket, (tab, view) in self._buckets.items():
+            if str(tab) == selected or bucket == self.STATUS_BUCKETS[self.role]:
+                if not self.tab_cache.is_fresh(bucket):
+                    self._load_bucket(bucket)
+
+    def reload_buckets(self, *buckets):
+        """Drop cached rows (all buckets if none given) and reload what is visible"""
+        self.tab_cache.invalidate(*(buckets or self._buckets))
+        self.load_visible_tab()
+
+    def _load_bucket(self, bucket):
+        tab, view = self._buckets[bucket]
+        email, role, limit = self.current_user.email, self.role, view.loaded_count()
+        version = self.tab_cache.version(bucket)
+        self.runner.submit(("bucket", bucket),
+                           action_scope("dashboard.tab")(
+                               lambda: self.ride_manager.get_bucket_page(email, role, bucket, limit)),
+                           lambda page: self._show_bucket(bucket, page, version),
+                           self._on_refresh_error)
+
+    def _show_bucket(self, bucket, page, version, count=True):
+        tab, view = self._buckets[bucket]
+        rows, token = page
+        view.set_rides(rows, token)
+        self.tab_cache.mark_loaded(bucket, version)
+        if bucket == self.STATUS_BUCKETS[self.role]:
+            self._has_active_ride = bool(rows)
+            if self.role == "driver":
+                self.update_driver_status(bool(rows))
+        if count and token is None:
+            # the whole bucket is loaded, so its size is known without the counts query
+            self._set_tab_count(tab, len(rows))
 
     # =============================
     # Rider Dashboard
@@ -215,7 +331,15 @@ class Dashboard(BaseWindow):
         self.tab_completed = tk.Frame(self.notebook, bg="#f7f7f7")
         self.notebook.add(self.tab_completed, text="Completed Rides")
 
-        self.refresh_rider_tabs()
+        # requested, accepted and started show here until completed
+        self.requested_list = self.ride_list(self.tab_requested, "No requested rides yet.",
+                                             self._bucket_pager("rider", "requested"), self._rider_card_actions)
+        self.completed_list = self.virtual_ride_list(self.tab_completed, "No completed rides yet.",
+                                                     self._bucket_pager("rider", "completed"))
+        self._add_bucket("requested", self.tab_requested, self.requested_list)
+        self._add_bucket("completed", self.tab_completed, self.completed_list)
+
+        self.refresh_all_tabs()
 
     def _build_rider_request_tab(self, parent):
         section = tk.Frame(parent, bg="#f7f7f7")
@@ -228,61 +352,20 @@ class Dashboard(BaseWindow):
         row2, self.drop_entry = self.create_entry_field("Drop Location", section)
         row2.pack(fill=tk.X, pady=6)
 
-        req_btn = tk.Button(section, text="Request Ride", bg="#0d6efd", fg="white", relief=tk.FLAT,
-                            padx=12, pady=8, command=self.request_ride)
-        req_btn.pack(anchor='e', pady=(8, 0))
-
-    def refresh_rider_tabs(self):
-        # Requested tab
-        for w in self.tab_requested.winfo_children():
-            w.destroy()
-        requested_wrap = self.make_scrollable(self.tab_requested)
-
-        rides = self.ride_manager.get_user_rides(self.current_user.email)
-        # requested & accepted show here until completed
-        filtered = [r for r in rides if getattr(r, 'status', '') in ("requested", "accepted", "ongoing")]
-
-        if not filtered:
-            tk.Label(requested_wrap, text="No requested rides yet.", bg="#f7f7f7",
-                     fg="#666").pack(pady=24)
-        else:
-            for r in filtered:
-                actions = []
-                if getattr(r, 'status', '') in ("accepted", "ongoing"):
-                    actions.append((
-                        "Complete Ride",
-                        lambda rid=r.ride_id: self.complete_ride_rider(rid),
-                        {"bg": "#198754"}
-                    ))
-                if getattr(r, 'status', '') in ("requested", "accepted", "ongoing"):
-                    actions.append((
-                        "Cancel Ride",
-                        lambda rid=r.ride_id: self.cancel_ride(rid),
-                        {"bg": "#dc3545"}
-                    ))
-                self.ride_card(requested_wrap, r, actions)
-
-        # Completed tab
-        for w in self.tab_completed.winfo_children():
-            w.destroy()
-        completed_wrap = self.make_scrollable(self.tab_completed)
-
-        completed = [r for r in rides if getattr(r, 'status', '') == 'completed']
-        if not completed:
-            tk.Label(completed_wrap, text="No completed rides yet.", bg="#f7f7f7",
-                     fg="#666").pack(pady=24)
-        else:
-            for r in completed:
-                self.ride_card(completed_wrap, r, actions=[])
-
-    # rider action helpers that also refresh
-    def complete_ride_rider(self, ride_id):
-        success, message = self.ride_manager.complete_ride(ride_id, self.current_user.email)
-        if success:
-            self.show_success(message)
-            self.refresh_rider_tabs()
-        else:
-            self.show_error(message)
+        self.request_button = tk.Button(section, text="Request Ride", bg="#0d6efd", fg="white", relief=tk.FLAT,
+                                        padx=12, pady=8, command=self.request_ride)
+        self.request_button.pack(anchor='e', pady=(8, 0))
+
+    def _rider_card_actions(self, r):
+        actions = []
+        # only the driver completes a ride
+        if getattr(r, 'status', '') in ("requested", "accepted", "ongoing"):
+            actions.append((
+                "Cancel Ride",
+                lambda rid=r.ride_id: self.cancel_ride(rid),
+                {"bg": "#dc3545"}
+            ))
+        return actions, None
 
     # =============================
     # Driver Dashboard
@@ -306,12 +389,33 @@ class Dashboard(BaseWindow):
         self.tab_available = tk.Frame(self.notebook, bg="#f7f7f7")
         self.tab_ongoing = tk.Frame(self.notebook, bg="#f7f7f7")
         self.tab_canceled = tk.Frame(self.notebook, bg="#f7f7f7")
+        self.tab_completed = tk.Frame(self.notebook, bg="#f7f7f7")
 
         self.notebook.add(self.tab_available, text="Available Rides")
         self.notebook.add(self.tab_ongoing, text="Ongoing Rides")
         self.notebook.add(self.tab_canceled, text="Canceled Rides")
+        self.notebook.add(self.tab_completed, text="Completed Rides")
+
+        self.available_list = self.virtual_ride_list(
+            self.tab_available, "No rides available at the moment.",
+            self._bucket_pager("driver", "available"), self._available_card_actions
+        )
+        self.ongoing_list = self.ride_list(self.tab_ongoing, "No ongoing rides.",
+                                           self._bucket_pager("driver", "ongoing"), self._ongoing_card_actions)
+        self.canceled_list = self.virtual_ride_list(
+            self.tab_canceled, "No canceled rides.",
+            self._bucket_pager("driver", "canceled"), lambda r: ([], self._rider_footer(r))
+        )
+        self.completed_list = self.virtual_ride_list(
+            self.tab_completed, "No completed rides yet.",
+            self._bucket_pager("driver", "completed"), lambda r: ([], self._rider_footer(r))
+        )
+        self._add_bucket("available", self.tab_available, self.available_list)
+        self._add_bucket("ongoing", self.tab_ongoing, self.ongoing_list)
+        self._add_bucket("canceled", self.tab_canceled, self.canceled_list)
+        self._add_bucket("completed", self.tab_completed, self.completed_list)
 
-        self.refresh_driver_tabs()
+        self.refresh_all_tabs()
 
     def _build_vehicle_registration(self, parent):
         container = tk.Frame(parent, bg="#f7f7f7")
@@ -326,127 +430,29 @@ class Dashboard(BaseWindow):
         row3, self.model_entry = self.create_entry_field("Vehicle Model", container)
         row3.pack(fill=tk.X, pady=6)
 
-        btn = tk.Button(container, text="Register Vehicle", bg="#198754", fg="white",
-                        relief=tk.FLAT, padx=12, pady=8, command=self.register_vehicle)
-        btn.pack(anchor='e', pady=(8, 0))
-
-    def refresh_driver_tabs(self):
-        # update status chip
-        self.update_driver_status()
-
-        # Available
-        for w in self.tab_available.winfo_children():
-            w.destroy()
-        avail_wrap = self.make_scrollable(self.tab_available)
-
-        available = self.ride_manager.get_available_rides()
-        if not available:
-            tk.Label(avail_wrap, text="No rides available at the moment.", bg="#f7f7f7",
-                     fg="#666").pack(pady=24)
-        else:
-            for r in available:
-                actions = []
-                actions.append((
-                    "Accept Ride",
-                    lambda rid=r.ride_id: self.accept_ride_driver(rid),
-                    {"bg": "#198754"}
-                ))
-                self.ride_card(avail_wrap, r, actions)
-
-        # Ongoing
-        for w in self.tab_ongoing.winfo_children():
-            w.destroy()
-        ongoing_wrap = self.make_scrollable(self.tab_ongoing)
-
-        try:
-            rides = self.ride_manager.get_user_rides(self.current_user.email)
-            ongoing_rides = [
-                r for r in rides
-                if getattr(r, 'status', '') in ("accepted", "ongoing", "started")
-                and getattr(r, 'driver_email', None) == self.current_user.email
-            ]
-        except Exception:
-            ongoing_rides = []
-
-        if not ongoing_rides:
-            tk.Label(ongoing_wrap, text="No ongoing rides.", bg="#f7f7f7", fg="#666").pack(pady=24)
-        else:
-            for r in ongoing_rides:
-                actions = []
-                if getattr(r, 'status', '') == 'accepted':
-                    actions.append(("Start Ride", lambda rid=r.ride_id: self.start_ride_driver(rid), {"bg": "#0d6efd"}))
-                if getattr(r, 'status', '') in ('ongoing', 'started'):
-                    actions.append(("Complete Ride", lambda rid=r.ride_id: self.complete_ride_driver(rid), {"bg": "#198754"}))
-                actions.append(("Cancel Ride", lambda rid=r.ride_id: self.cancel_ride_driver(rid), {"bg": "#dc3545"}))
-                self.ride_card(ongoing_wrap, r, actions)
-
-        # Canceled
-        for w in self.tab_canceled.winfo_children():
-            w.destroy()
-        canceled_wrap = self.make_scrollable(self.tab_canceled)
-
-        # We'll try to fetch canceled rides that have this driver or all with rider id, depending on backend capabilities.
-        # If RideManager exposes a dedicated method, swap here; otherwise, show a generic message.
-        try:
-            # Heuristic: reuse user rides for rider list; for drivers, RideManager may expose get_canceled_rides.
-            canceled = []
-            if hasattr(self.ride_manager, 'get_canceled_rides'):
-                canceled = self.ride_manager.get_canceled_rides(driver_email=self.current_user.email)
-        except Exception:
-            canceled = []
-
-        if not canceled:
-            tk.Label(canceled_wrap, text="No canceled rides.", bg="#f7f7f7", fg="#666").pack(pady=24)
-        else:
-            for r in canceled:
-                # Show rider id as requested if available
-                rider_id = getattr(r, 'rider_email', getattr(r, 'user_email', 'N/A'))
-                extra_parent = tk.Frame(canceled_wrap, bg="#f7f7f7")
-                extra_parent.pack(fill=tk.X)
-                self.ride_card(extra_parent, r, actions=[])
-                tk.Label(extra_parent, text=f"Rider: {rider_id}", bg="#f7f7f7", fg="#555").pack(anchor='w', padx=16)
-
-     # ---------------- Completed ----------------
-        if not hasattr(self, 'tab_completed'):
-            # Create tab once
-            self.tab_completed = tk.Frame(self.notebook, bg="#f7f7f7")
-            self.notebook.add(self.tab_completed, text="Completed Rides")
-
-        for w in self.tab_completed.winfo_children():
-            w.destroy()
-        completed_wrap = self.make_scrollable(self.tab_completed)
-
-        try:
-            rides = self.ride_manager.get_user_rides(self.current_user.email)
-            completed_rides = [
-                r for r in rides
-                if getattr(r, 'status', '') == "completed"
-                and getattr(r, 'driver_email', None) == self.current_user.email
-            ]
-        except Exception:
-            completed_rides = []
-
-        if not completed_rides:
-            tk.Label(completed_wrap, text="No completed rides yet.", bg="#f7f7f7", fg="#666").pack(pady=24)
-        else:
-            for r in completed_rides:
-                extra_parent = tk.Frame(completed_wrap, bg="#f7f7f7")
-                extra_parent.pack(fill=tk.X)
-                self.ride_card(extra_parent, r, actions=[])
-                rider_id = getattr(r, 'rider_email', getattr(r, 'user_email', 'N/A'))
-                tk.Label(extra_parent, text=f"Rider: {rider_id}", bg="#f7f7f7", fg="#555").pack(anchor='w', padx=16)
-
-    def update_driver_status(self):
-        # Online if no current ride; Ongoing Ride if an accepted/ongoing ride exists
-        status = "Online"
-        try:
-            rid = getattr(self.current_user, 'current_ride', None)
-            if rid:
-                r = self.ride_manager.get_ride_by_id(rid)
-                if r and getattr(r, 'status', '') in ("accepted", "ongoing"):
-                    status = "Ongoing Ride"
-        except Exception:
-            pass
+        self.register_vehicle_button = tk.Button(container, text="Register Vehicle", bg="#198754", fg="white",
+                                                 relief=tk.FLAT, padx=12, pady=8, command=self.register_vehicle)
+        self.register_vehicle_button.pack(anchor='e', pady=(8, 0))
+
+    def _available_card_actions(self, r):
+        return [(
+            "Accept Ride",
+            lambda rid=r.ride_id: self.accept_ride_driver(rid),
+            {"bg": "#198754"}
+        )], None
+
+    def _ongoing_card_actions(self, r):
+        actions = []
+        if getattr(r, 'status', '') == 'accepted':
+            actions.append(("Start Ride", lambda rid=r.ride_id: self.start_ride_driver(rid), {"bg": "#0d6efd"}))
+        if getattr(r, 'status', '') in ('ongoing', 'started'):
+            actions.append(("Complete Ride", lambda rid=r.ride_id: self.complete_ride_driver(rid), {"bg": "#198754"}))
+        actions.append(("Cancel Ride", lambda rid=r.ride_id: self.cancel_ride_driver(rid), {"bg": "#dc3545"}))
+        return actions, None
+
+    def update_driver_status(self, has_ongoing=False):
+        # Online if no current ride; Ongoing Ride if an accepted/started ride exists
+        status = "Ongoing Ride" if has_ongoing else "Online"
         self.status_var.set(status)
         if hasattr(self, 'status_badge'):
             self.status_badge.configure(bg="#198754" if status != "Offline" else "#6c757d")
@@ -460,86 +466,84 @@ class Dashboard(BaseWindow):
         if not pickup or not drop:
             self.show_error("Please enter pickup and drop locations")
             return
-        success, ride_id, message = self.ride_manager.request_ride(self.current_user.email, pickup, drop)
+        email = self.current_user.email
+        self.run_in_background(lambda: self.ride_manager.request_ride(email, pickup, drop),
+                               self._on_ride_requested, widgets=[self.request_button], action="rider.request")
+
+    def _on_ride_requested(self, result):
+        success, ride_id, message = result
         if success:
             self.show_success(f"Ride requested! Ride ID: {ride_id}")
             self.pickup_entry.delete(0, tk.END)
             self.drop_entry.delete(0, tk.END)
-            self.refresh_rider_tabs()
             # switch to Requested tab for immediate feedback
-            try:
-                idx = self.notebook.tabs().index(self.notebook.select())  # ensure notebook exists
-            except Exception:
-                pass
             self.notebook.select(self.tab_requested)
+            self.reload_buckets("requested")
         else:
             self.show_error(message)
 
     # Rider cancel (already in base)
     def cancel_ride(self, ride_id):
-        success, message = self.ride_manager.cancel_ride(ride_id, self.current_user.email)
-        if success:
-            self.show_success(message)
-            if hasattr(self.current_user, 'license_number'):
-                self.refresh_driver_tabs()
-            else:
-                self.refresh_rider_tabs()
-        else:
-            self.show_error(message)
+        email = self.current_user.email
+        self._run_ride_action(lambda: self.ride_manager.cancel_ride(ride_id, email), ("requested",),
+                              action="rider.cancel")
 
     # --- Driver actions enforcing single ongoing ride constraint ---
-    def _has_ongoing(self):
+    def _has_ongoing(self, current_ride):
+        """Runs on a worker thread"""
         try:
-            rid = getattr(self.current_user, 'current_ride', None)
-            if not rid:
+            if not current_ride:
                 return False
-            r = self.ride_manager.get_ride_by_id(rid)
+            r = self.ride_manager.get_ride_by_id(current_ride)
             return bool(r and getattr(r, 'status', '') in ("accepted", "ongoing"))
         except Exception:
             return False
 
     def accept_ride_driver(self, ride_id):
-        # constraint: only if no ongoing ride
-        if self._has_ongoing():
-            messagebox.showwarning("Action blocked", "You already have an ongoing ride. Complete it before accepting a new one.")
-            return
-        success, message = self.ride_manager.accept_ride(ride_id, self.current_user.email)
-        if success:
-            self.current_user.current_ride = ride_id  # ✅ set ongoing ride
-            self.show_success(message)
-            self.refresh_driver_tabs()
+        email = self.current_user.email
+        current_ride = getattr(self.current_user, 'current_ride', None)
+
+        def accept():
+            # constraint: only if no ongoing ride
+            if self._has_ongoing(current_ride):
+                return None
+            return self.ride_manager.accept_ride(ride_id, email)
+
+        def done(result):
+            if result is None:
+                messagebox.showwarning("Action blocked", "You already have an ongoing ride. Complete it before accepting a new one.")
+                self.reload_buckets("ongoing")
+                return
+            success, message = result
+            if success:
+                self.current_user.current_ride = ride_id  # ✅ set ongoing ride
+                self.show_success(message)
+            else:
+                self.show_error(message)
+            self.reload_buckets("available", "ongoing")
 
-        else:
-            self.show_error(message)
+        self.run_in_background(accept, done, action="driver.accept")
 
     def start_ride_driver(self, ride_id):
-        success, message = self.ride_manager.start_ride(ride_id, self.current_user.email)
-        if success:
+        def started(result):
             self.current_user.current_ride = ride_id  # ✅ ensure current ride is tracked
-            self.show_success(message)
-            self.refresh_driver_tabs()
-        else:
-            self.show_error(message)
+        email = self.current_user.email
+        self._run_ride_action(lambda: self.ride_manager.start_ride(ride_id, email), ("ongoing",), started,
+                              action="driver.start")
 
     def complete_ride_driver(self, ride_id):
-        success, message = self.ride_manager.complete_ride(ride_id, self.current_user.email)
-        if success:
-            self.show_success(message)
+        def completed(result):
             self.current_user.current_ride = None  # ✅ clear ongoing ride
-            self.refresh_driver_tabs()
-
-        else:
-            self.show_error(message)
+        email = self.current_user.email
+        self._run_ride_action(lambda: self.ride_manager.complete_ride(ride_id, email),
+                              ("ongoing", "completed"), completed, action="driver.complete")
 
     def cancel_ride_driver(self, ride_id):
-        success, message = self.ride_manager.cancel_ride(ride_id, self.current_user.email)
-        if success:
-            self.show_success(message)
+        def cancelled(result):
             self.current_user.current_ride = None  # ✅ clear ongoing ride
-            self.refresh_driver_tabs()
-
-        else:
-            self.show_error(message)
+        email = self.current_user.email
+        self._run_ride_action(lambda: self.ride_manager.cancel_ride(ride_id, email),
+                              ("ongoing", "canceled"), cancelled, action="driver.cancel")
 
     # =============================
     # Vehicle Registration (driver)
@@ -557,30 +561,74 @@ class Dashboard(BaseWindow):
             self.show_error("Please enter a valid license plate")
             return
 
-        # Add to current_user
+        # Add to current_user; only the changed vehicle field is written back
         self.current_user.add_vehicle(plate, vehicle_type, model)
-        try:
-            from db.connection import db_connection
-            db = db_connection.get_database()
-            db.users.update_one({"email": self.current_user.email}, {"$set": {"vehicle": self.current_user.vehicle}})
-        except Exception:
-            pass
+        self.run_in_background(lambda: self.auth_manager.save_user(self.current_user),
+                               self._on_vehicle_registered, widgets=[self.register_vehicle_button],
+                               action="driver.register_vehicle")
 
+    def _on_vehicle_registered(self, saved):
+        if not saved:
+            self.show_error("Failed to save vehicle, please try again")
+            return
         self.show_success("Vehicle registered successfully!")
         self.build_driver_tabs()
 
+    # =============================
+    # Ride events (push updates)
+    # =============================
+    def _is_relevant(self, event):
+        """Whether a ride event changes anything this dashboard shows"""
+        ride, email = event.ride, self.current_user.email
+        if self.role == "driver":
+            # new or vanished available rides, or one of this driver's rides
+            return (event.status == "requested" or event.ride_id in self.available_list
+                    or ride.get('driver_email') == email)
+        return ride.get('rider_email') == email
+
+    def _discard_pending_events(self):
+        """Drop queued events: a refresh that is about to run reflects them already"""
+        try:
+            while True:
+                self._events.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _drain_events(self):
+        """Apply queued ride events: one reload of the visible tab for any burst of relevant changes"""
+        try:
+            if self.notebook is None:
+                # no ride tabs yet (driver still registering a vehicle)
+                self._discard_pending_events()
+                return
+            relevant = False
+            try:
+                while True:
+                    relevant = self._is_relevant(self._events.get_nowait()) or relevant
+            except queue.Empty:
+                pass
+            if relevant:
+                self.poller.reset_backoff()
+                self.reload_buckets()
+        finally:
+            self.root.after(self.EVENT_POLL_MS, self._drain_events)
+
     # =============================
     # Periodic auto-refresh
     # =============================
-    # def _auto_refresh(self):
-    #     try:
-    #         if hasattr(self.current_user, 'license_number'):
-    #             self.refresh_driver_tabs()
-    #         else:
-    #             self.refresh_rider_tabs()
-    #     finally:
-    #         # re-arm timer
-    #         self.root.after(self.AUTO_REFRESH_MS, self._auto_refresh)
+    def _fetch_change_marker(self):
+        """Runs on a worker thread"""
+        return self.ride_manager.get_change_marker(self.current_user.email, self.role)
+
+    def _is_focused(self):
+        try:
+            return self.root.focus_displayof() is not None
+        except Exception:
+            return True
+
+    def _auto_refresh(self):
+        """Called by the poller when a ride on this dashboard changed"""
+        self.reload_buckets()
 
     # =============================
     # BaseWindow overrides
@@ -590,25 +638,29 @@ class Dashboard(BaseWindow):
         if hasattr(self, 'status_badge'):
             self.status_badge.configure(bg="#6c757d")
         self.auth_manager.logout_user()
-        self.root.destroy()
+        self.close()
         from gui.auth_windows import LoginWindow
         login_window = LoginWindow(self.auth_manager, show_welcome=False)
         login_window.run()
 
+    def close(self):
+        """Stop receiving ride events and close the window"""
+        ride_events.unsubscribe(self._event_subscription)
+        self.poller.stop()
+        super().close()
+
+    def _on_refresh_error(self, error):
+        """Keep showing the last loaded rides; flag the connection problem in the header"""
+        self.status_var.set("Offline")
+        if hasattr(self, 'status_badge'):
+            self.status_badge.configure(bg="#6c757d")
+
     def refresh_page(self):
-        """Refresh current dashboard based on user type."""
-        if hasattr(self.current_user, 'license_number'):
-            self.refresh_driver_tabs()
-        else:
-            self.refresh_rider_tabs()
+        """Reload every tab (Refresh button)"""
+        self.poller.reset_backoff()  # activity: poll at the base rate again
+        if self.notebook is not None:
+            self.refresh_all_tabs()
 
     def on_tab_changed(self, event):
-        """Refresh page when switching tabs"""
-        tab = event.widget.tab(event.widget.select(), "text")
-
-        if hasattr(self.current_user, 'license_number'):
-            # Driver dashboard
-            self.refresh_driver_tabs()
-        else:
-            # Rider dashboard
-            self.refresh_rider_tabs()
\ No newline at end of file
+        """Load the newly selected tab if its cached rows are stale"""
+        self.load_visible_tab()
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Ride cards keyed by ride ID: a refresh creates, updates or destroys only
+the cards whose ride changed
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from utils.validators import Validators
+
+
+def plan_refresh(shown_ids, order, ids):
+    """What a refresh to ids (in order) does to cards shown_ids currently laid out as order:
+    (ids whose cards are destroyed, ids that need a new card, whether to re-pack)"""
+    keep = set(ids)
+    removed = [ride_id for ride_id in shown_ids if ride_id not in keep]
+    created = [ride_id for ride_id in ids if ride_id not in shown_ids]
+    return removed, created, list(ids) != list(order)
+
+
+def append_page(rides, rows):
+    """rides followed by the rows of the next page that are not already shown
+    (a ride can move into the bucket between pages)"""
+    shown = {ride.ride_id for ride in rides}
+    return list(rides) + [row for row in rows if row.ride_id not in shown]
+
+
+def buttons_changed(previous, state):
+    """Whether a card going from state previous to state needs new action buttons.
+    States are (ride, action labels, footer); previous is None for a new card."""
+    return previous is None or previous[1] != state[1] or previous[0].ride_id != state[0].ride_id
+
+
+class RideCard:
+    """One ride card. actions: list[(label, callback, style_tag)]; footer: optional text under the card"""
+
+    def __init__(self, parent):
+        self.frame = tk.Frame(parent, bg="#f7f7f7")
+        card = ttk.Frame(self.frame, style="Card.TFrame")
+        card.pack(fill=tk.X, padx=8, pady=6)
+
+        body = tk.Frame(card, bg="white")
+        body.pack(fill=tk.X, padx=12, pady=12)
+
+        # left info
+        info = tk.Frame(body, bg="white")
+        info.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.labels = {}
+        for field in ("ride_id", "pickup_location", "drop_location", "fare", "status"):
+            font = ("Segoe UI", 10, "bold") if field == "ride_id" else None
+            self.labels[field] = tk.Label(info, bg="white", font=font)
+            self.labels[field].pack(anchor='w')
+
+        # right actions
+        self.actions_frame = tk.Frame(body, bg="white")
+        self.actions_frame.pack(side=tk.RIGHT)
+        self.buttons = []
+
+        self.footer = tk.Label(self.frame, bg="#f7f7f7", fg="#555")
+        self._state = None
+
+    def update(self, ride, actions, footer=None):
+        """Show ride; widgets are only touched when something visible changed"""
+        state = (ride, [label for label, _, _ in actions], footer)
+        if state == self._state:
+            # same card: just re-enable buttons a finished action left disabled
+            self.set_enabled(True)
+            return
+        previous, self._state = self._state, state
+
+        fare = getattr(ride, 'fare', 0)
+        try:
+            fare_text = Validators.format_currency(fare)
+        except Exception:
+            fare_text = str(fare)
+        texts = {
+            "ride_id": f"Ride ID: {getattr(ride, 'ride_id', '')}",
+            "pickup_location": f"From: {getattr(ride, 'pickup_location', '')}",
+            "drop_location": f"To: {getattr(ride, 'drop_location', '')}",
+            "fare": f"Fare: {fare_text}",
+            "status": f"Status: {getattr(ride, 'status', '').title()}",
+        }
+        for field, text in texts.items():
+            if self.labels[field].cget("text") != text:
+                self.labels[field].configure(text=text)
+
+        if buttons_changed(previous, state):
+            for button in self.buttons:
+                button.destroy()
+            self.buttons = []
+            for (label, cb, style_tag) in actions:
+                btn = tk.Button(
+                    self.actions_frame, text=label, command=lambda cb=cb: self._on_click(cb),
+                    bg=style_tag.get('bg', '#0d6efd'), fg=style_tag.get('fg', 'white'),
+                    relief=tk.FLAT, padx=12, pady=6
+                )
+                btn.pack(side=tk.LEFT, padx=6)
+                self.buttons.append(btn)
+        else:
+            self.set_enabled(True)
+
+        if footer:
+            self.footer.configure(text=footer)
+            self.footer.pack(anchor='w', padx=16)
+        else:
+            self.footer.pack_forget()
+
+    def set_enabled(self, enabled):
+        state = tk.NORMAL if enabled else tk.DISABLED
+        for button in self.buttons:
+            if button.cget("state") != state:
+                button.configure(state=state)
+
+    def _on_click(self, callback):
+        # disabled until the refresh that follows every action
+        self.set_enabled(False)
+        callback()
+
+    def destroy(self):
+        self.frame.destroy()
+
+
+class RideListView:
+    """Cards for a short list of rides inside a (scrollable) container.
+    describe(ride) -> (actions, footer) for each card; with a runner,
+    fetch_page(limit, after) -> (rows, token) loads further pages on a worker
+    thread when the user asks for more."""
+
+    PAGE_SIZE = 20
+
+    def __init__(self, container, empty_text, describe=None, runner=None, fetch_page=None):
+        self.container = container
+        self.empty_text = empty_text
+        self.describe = describe or (lambda ride: ([], None))
+        self.runner = runner
+        self.fetch_page = fetch_page
+        self.cards = {}
+        self.rides = []
+        self.token = None
+        self._order = []
+        self._loading = False
+        self.placeholder = tk.Label(container, text="Loading...", bg="#f7f7f7", fg="#666")
+        self.placeholder.pack(pady=24)
+        self.cards_frame = tk.Frame(container, bg="#f7f7f7")
+        self.cards_frame.pack(fill=tk.X)
+        self.more_button = ttk.Button(container, text="Load more", command=self._load_more)
+
+    def __contains__(self, ride_id):
+        return ride_id in self.cards
+
+    def loaded_count(self):
+        return max(self.PAGE_SIZE, len(self.cards))
+
+    def set_rides(self, rides, token=None):
+        """Replace the rides shown (a refresh); token continues after the last one"""
+        if self.runner is not None:
+            self.runner.cancel(self)  # a page requested for the old rides is stale
+        self._loading = False
+        self._show(rides, token)
+
+    def _load_more(self):
+        if self._loading or self.token is None or self.fetch_page is None:
+            return
+        self._loading = True
+        self.more_button.configure(state=tk.DISABLED)
+        limit, after = self.PAGE_SIZE, self.token
+        self.runner.submit(self, lambda: self.fetch_page(limit, after), self._append_page, self._on_page_error)
+
+    def _append_page(self, page):
+        rows, token = page
+        self._loading = False
+        self._show(append_page(self.rides, rows), token)
+
+    def _on_page_error(self, error):
+        # the button retries
+        self._loading = False
+        self.more_button.configure(state=tk.NORMAL)
+
+    def _show(self, rides, token):
+        """Show rides in order"""
+        self.rides = list(rides)
+        self.token = token
+        ids = [ride.ride_id for ride in rides]
+        removed, created, reorder = plan_refresh(self.cards, self._order, ids)
+        for ride_id in removed:
+            self.cards.pop(ride_id).destroy()
+        for ride_id in created:
+            self.cards[ride_id] = RideCard(self.cards_frame)
+
+        for ride in rides:
+            actions, footer = self.describe(ride)
+            self.cards[ride.ride_id].update(ride, actions, footer)
+
+        if reorder:
+            # re-pack only when the order changed; new cards are packed here too
+            for ride_id in ids:
+                self.cards[ride_id].frame.pack_forget()
+            for ride_id in ids:
+                self.cards[ride_id].frame.pack(fill=tk.X)
+            self._order = ids
+
+        if ids:
+            self.placeholder.pack_forget()
+        else:
+            self.placeholder.configure(text=self.empty_text)
+            self.placeholder.pack(pady=24, before=self.cards_frame)
+
+        if token is not None and self.fetch_page is not None:
+            self.more_button.configure(state=tk.NORMAL)
+            self.more_button.pack(pady=(4, 12))
+        else:
+            self.more_button.pack_forget()
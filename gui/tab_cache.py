@@ -0,0 +1,33 @@
+"""
+Short-lived record of which dashboard tabs hold fresh data
+"""
+
+import time
+
+
+class TabCache:
+    """Remembers when each tab was loaded; a load counts as fresh for ttl seconds.
+    A load that was in flight while its tab got invalidated never marks it fresh."""
+
+    def __init__(self, ttl=15):
+        self.ttl = ttl
+        self._loaded_at = {}
+        self._versions = {}
+
+    def version(self, key):
+        """Take before starting a load; hand back to mark_loaded()"""
+        return self._versions.get(key, 0)
+
+    def mark_loaded(self, key, version):
+        if self._versions.get(key, 0) == version:
+            self._loaded_at[key] = time.monotonic()
+
+    def is_fresh(self, key):
+        loaded_at = self._loaded_at.get(key)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl
+
+    def invalidate(self, *keys):
+        """Mark tabs (all tabs if none given) as needing a reload"""
+        for key in keys or list(set(self._loaded_at) | set(self._versions)):
+            self._loaded_at.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
@@ -0,0 +1,151 @@
+"""
+Virtualized ride list: only the rows in view (plus a small buffer) have
+card widgets, cards are recycled while scrolling, and further pages are
+fetched from RideManager when the end of the loaded rows comes into view
+"""
+
+import tkinter as tk
+from tkinter import ttk
+from gui.ride_list import RideCard
+
+
+def visible_rows(top, view_height, row_count, row_height, buffer_rows):
+    """[first, last) row indexes to bind cards to when the viewport starts at pixel top"""
+    view_height = max(view_height, row_height)
+    first = max(0, int(top // row_height) - buffer_rows)
+    last = min(row_count, int((top + view_height) // row_height) + 1 + buffer_rows)
+    return first, last
+
+
+def needs_more_rows(last, row_count, buffer_rows):
+    """Whether the bound rows reach close enough to the end to fetch the next page"""
+    return last >= row_count - buffer_rows
+
+
+class VirtualRideList:
+    ROW_HEIGHT = 170  # fixed card height in pixels
+    BUFFER_ROWS = 3  # cards kept ready above and below the viewport
+    PAGE_SIZE = 20
+
+    def __init__(self, parent, empty_text, runner, fetch_page, describe=None):
+        """fetch_page(limit, after) -> (rows, token) runs on a worker thread;
+        describe(ride) -> (actions, footer) for each card."""
+        self.runner = runner
+        self.fetch_page = fetch_page
+        self.describe = describe or (lambda ride: ([], None))
+        self.empty_text = empty_text
+        self.rides = []
+        self._ids = set()
+        self.token = None
+        self._loading = False
+        self._visible = {}  # row index -> (card, canvas window id)
+        self._pool = []  # (card, canvas window id) not showing any row
+
+        container = tk.Frame(parent, bg="#f7f7f7")
+        container.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(container, bg="#f7f7f7", highlightthickness=0, yscrollincrement=20)
+        self.scrollbar = ttk.Scrollbar(container, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.bind("<Configure>", self._on_resize)
+
+        self.placeholder = self.canvas.create_text(
+            20, 24, text="Loading...", anchor="nw", fill="#666666"
+        )
+
+    def __contains__(self, ride_id):
+        return ride_id in self._ids
+
+    def loaded_count(self):
+        """How many rows a refresh should reload to keep the current scroll depth"""
+        return max(self.PAGE_SIZE, len(self.rides))
+
+    def set_rides(self, rides, token):
+        """Replace all rows (a refresh); token continues after the last one"""
+        self.runner.cancel(self)  # a page requested for the old rows is stale
+        self._loading = False
+        self.rides = list(rides)
+        self._ids = {ride.ride_id for ride in self.rides}
+        self.token = token
+        # rows may have shifted: rebind every visible card
+        self._update_region(rebind=True)
+
+    def _append_page(self, page):
+        rows, token = page
+        self._loading = False
+        self.rides.extend(rows)
+        self._ids.update(ride.ride_id for ride in rows)
+        self.token = token
+        self._update_region()
+
+    def _load_more(self):
+        if self._loading or self.token is None:
+            return
+        self._loading = True
+        limit, after = self.PAGE_SIZE, self.token
+        self.runner.submit(self, lambda: self.fetch_page(limit, after), self._append_page, self._on_page_error)
+
+    def _on_page_error(self, error):
+        # scrolling to the end again retries
+        self._loading = False
+
+    # ---- layout ----
+    def _on_resize(self, event):
+        for card, window_id in list(self._visible.values()) + self._pool:
+            self.canvas.itemconfigure(window_id, width=event.width)
+        self._update_region()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._layout()
+
+    def _update_region(self, rebind=False):
+        height = len(self.rides) * self.ROW_HEIGHT
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), height))
+        if self.rides:
+            self.canvas.itemconfigure(self.placeholder, state="hidden")
+        else:
+            self.canvas.itemconfigure(self.placeholder, text=self.empty_text, state="normal")
+        self._layout(rebind)
+
+    def _release(self, index):
+        card, window_id = self._visible.pop(index)
+        # above the scroll region, so never in view
+        self.canvas.coords(window_id, 0, -2 * self.ROW_HEIGHT)
+        self.canvas.itemconfigure(window_id, state="hidden")
+        self._pool.append((card, window_id))
+
+    def _acquire(self):
+        if self._pool:
+            return self._pool.pop()
+        card = RideCard(self.canvas)
+        window_id = self.canvas.create_window(
+            0, 0, window=card.frame, anchor="nw",
+            width=self.canvas.winfo_width(), height=self.ROW_HEIGHT
+        )
+        return card, window_id
+
+    def _layout(self, rebind=False):
+        """Bind cards to the rows in (or near) the viewport and release the rest.
+        Cards that stay on their row are left alone unless rebind is set."""
+        first, last = visible_rows(self.canvas.canvasy(0), self.canvas.winfo_height(), len(self.rides),
+                                   self.ROW_HEIGHT, self.BUFFER_ROWS)
+
+        for index in [index for index in self._visible if not first <= index < last]:
+            self._release(index)
+        for index in range(first, last):
+            if index in self._visible:
+                if not rebind:
+                    continue
+                card, window_id = self._visible[index]
+            else:
+                card, window_id = self._visible[index] = self._acquire()
+                self.canvas.coords(window_id, 0, index * self.ROW_HEIGHT)
+                self.canvas.itemconfigure(window_id, state="normal")
+            ride = self.rides[index]
+            actions, footer = self.describe(ride)
+            card.update(ride, actions, footer)
+
+        if needs_more_rows(last, len(self.rides), self.BUFFER_ROWS):
+            self._load_more()
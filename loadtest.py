@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Synthetic load for the full ride lifecycle.
+
+N riders request rides as a Poisson arrival process and may cancel while
+they wait; M drivers poll the available rides, race each other to accept
+one, then start, complete and get paid and rated. Every manager call is
+timed and at most --concurrency calls run at once.
+
+    python loadtest.py --backend memory --riders 200 --drivers 50 --rates 10,20,40,80
+
+runs one stage per arrival rate (rides per second) and reports throughput,
+latency percentiles, contention (accepts that lost the race) and
+double-accepts (a ride accepted by two drivers, which must never happen)
+per stage, to show where the system tips over. Against MongoDB use a
+scratch database (--db-name); the users and rides it creates are left there.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core.payment_manager import PaymentManager
+from core.ride_events import RideEventFeed
+from core.ride_manager import RideManager
+from db.connection import DatabaseConnection
+from db.indexes import IndexManager
+from db.settings import DatabaseSettings
+from models.user import Driver, Rider
+from utils.trace import start_tracing, stop_tracing
+
+OPERATIONS = ("request_ride", "available_rides", "accept_ride", "start_ride", "complete_ride",
+              "cancel_ride", "rate_ride", "process_payment")
+CONTENDED = "Ride cannot be accepted"
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class StageStats:
+    """Counts and latencies for one arrival-rate stage"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.started = time.perf_counter()
+        self.ended = None
+        self.latencies = {op: [] for op in OPERATIONS}
+        self.failures = {op: {} for op in OPERATIONS}  # op -> message -> count
+        self.errors = 0
+        self.contention = 0
+        self.skipped_arrivals = 0  # every rider already had a ride in flight
+        self.completed_rides = 0
+        self.cancelled_rides = 0
+
+    def report(self):
+        elapsed = (self.ended or time.perf_counter()) - self.started
+        operations = {}
+        for op, latencies in self.latencies.items():
+            if not latencies:
+                continue
+            latencies = sorted(latencies)
+            operations[op] = {
+                "count": len(latencies),
+                "failed": sum(self.failures[op].values()),
+                "per_second": len(latencies) / elapsed,
+                "p50_ms": percentile(latencies, 0.5) * 1000,
+                "p95_ms": percentile(latencies, 0.95) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000,
+                "max_ms": latencies[-1] * 1000,
+                "failures": dict(self.failures[op]),
+            }
+        return {
+            "rate": self.rate,
+            "seconds": elapsed,
+            "operations": operations,
+            "rides_completed_per_second": self.completed_rides / elapsed,
+            "completed_rides": self.completed_rides,
+            "cancelled_rides": self.cancelled_rides,
+            "contention": self.contention,
+            "errors": self.errors,
+            "skipped_arrivals": self.skipped_arrivals,
+        }
+
+
+class Scheduler:
+    """Runs callbacks at given times on an executor (arrivals, rider cancels)"""
+
+    def __init__(self, executor):
+        self.executor = executor
+        self._heap = []
+        self._counter = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="loadtest-scheduler", daemon=True)
+        self._thread.start()
+
+    def at(self, when, fn):
+        with self._condition:
+            self._counter += 1
+            heapq.heappush(self._heap, (when, self._counter, fn))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.perf_counter()):
+                    timeout = self._heap[0][0] - time.perf_counter() if self._heap else None
+                    self._condition.wait(timeout)
+                if self._stopped:
+                    return
+                _, _, fn = heapq.heappop(self._heap)
+            self.executor.submit(fn)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+
+class LoadTest:
+    def __init__(self, db, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        # a private event feed: nothing in this process subscribes to ride events
+        self.ride_manager = RideManager(db, events=RideEventFeed())
+        self.payment_manager = PaymentManager(db)
+        run = uuid.uuid4().hex[:6]
+        self.riders = [f"lt{run}-rider{i}@load.test" for i in range(args.riders)]
+        self.drivers = [f"lt{run}-driver{i}@load.test" for i in range(args.drivers)]
+        db.users.insert_many([Rider(email, "loadtest", f"Rider {i}", "555-0100").to_dict()
+                              for i, email in enumerate(self.riders)])
+        db.users.insert_many([Driver(email, "loadtest", f"Driver {i}", "555-0100", f"LT{i:06d}").to_dict()
+                              for i, email in enumerate(self.drivers)])
+        self._lock = threading.Lock()
+        self._idle_riders = list(self.riders)
+        self._ride_riders = {}  # open ride id -> rider email
+        self._winners = {}  # ride id -> drivers whose accept succeeded
+        self._slots = threading.BoundedSemaphore(args.concurrency)
+        self._stop = threading.Event()
+        self.stages = []
+
+    @property
+    def stage(self):
+        return self.stages[-1]
+
+    def call(self, op, fn, *args):
+        """Run one manager call within the concurrency limit and record it; None on an exception"""
+        with self._slots:
+            started = time.perf_counter()
+            try:
+                result = fn(*args)
+            except Exception:
+                result = None
+            elapsed = time.perf_counter() - started
+        stage = self.stage
+        with self._lock:
+            stage.latencies[op].append(elapsed)
+            if result is None:
+                stage.errors += 1
+            elif isinstance(result, tuple) and result[0] is False:
+                message = result[-1]
+                stage.failures[op][message] = stage.failures[op].get(message, 0) + 1
+                if op == "accept_ride" and message == CONTENDED:
+                    stage.contention += 1
+        return result
+
+    # ---- riders ----
+    def arrive(self):
+        with self._lock:
+            if not self._idle_riders:
+                self.stage.skipped_arrivals += 1
+                return
+            rider = self._idle_riders.pop(self.random.randrange(len(self._idle_riders)))
+        result = self.call("request_ride", self.ride_manager.request_ride, rider, "Central Park", "Times Square")
+        if not result or not result[0]:
+            self._release_rider(rider)
+            return
+        ride_id = result[1]
+        with self._lock:
+            self._ride_riders[ride_id] = rider
+        if self.random.random() < self.args.cancel_probability:
+            delay = self.random.uniform(0, self.args.patience)
+            self.scheduler.at(time.perf_counter() + delay, lambda: self.rider_cancel(ride_id, rider))
+
+    def rider_cancel(self, ride_id, rider):
+        if self._stop.is_set():
+            return
+        result = self.call("cancel_ride", self.ride_manager.cancel_ride, ride_id, rider)
+        if result and result[0]:
+            self._end_ride(ride_id, cancelled=True)
+
+    def _release_rider(self, rider):
+        with self._lock:
+            self._idle_riders.append(rider)
+
+    def _end_ride(self, ride_id, cancelled=False):
+        with self._lock:
+            rider = self._ride_riders.pop(ride_id, None)
+            if rider is None:
+                return
+            self._idle_riders.append(rider)
+            if cancelled:
+                self.stage.cancelled_rides += 1
+            else:
+                self.stage.completed_rides += 1
+
+    # ---- drivers ----
+    def drive(self, driver):
+        rng = random.Random(f"{self.args.seed}-{driver}")
+        while not self._stop.is_set():
+            result = self.call("available_rides", self.ride_manager.get_available_rides_page, self.args.pick_from)
+            rows = result[0] if result else []
+            if not rows:
+                self._stop.wait(self.args.poll_seconds)
+                continue
+            ride_id = rng.choice(rows).ride_id
+            result = self.call("accept_ride", self.ride_manager.accept_ride, ride_id, driver)
+            if not result or not result[0]:
+                continue
+            with self._lock:
+                winners = self._winners.setdefault(ride_id, [])
+                winners.append(driver)
+            self._stop.wait(self.args.pickup_seconds)
+            result = self.call("start_ride", self.ride_manager.start_ride, ride_id, driver)
+            if not result or not result[0]:
+                # the rider cancelled meanwhile
+                continue
+            self._stop.wait(self.args.trip_seconds)
+            result = self.call("complete_ride", self.ride_manager.complete_ride, ride_id, driver)
+            if not result or not result[0]:
+                continue
+            rider = self._ride_riders.get(ride_id)
+            if rider:
+                self.call("process_payment", self.payment_manager.process_payment, ride_id,
+                          round(rng.uniform(8, 60), 2), "Credit Card", rider)
+                self.call("rate_ride", self.ride_manager.rate_ride, ride_id, rng.randint(1, 5), rider)
+            self._end_ride(ride_id)
+
+    # ---- run ----
+    def run(self):
+        args = self.args
+        executor = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="loadtest-rider")
+        self.scheduler = Scheduler(executor)
+        self.stages.append(StageStats(args.rates[0]))
+        drivers = [threading.Thread(target=self.drive, args=(driver,), name=f"loadtest-driver-{i}", daemon=True)
+                   for i, driver in enumerate(self.drivers)]
+        for thread in drivers:
+            thread.start()
+        try:
+            for index, rate in enumerate(args.rates):
+                if index:
+                    self.stage.ended = time.perf_counter()
+                    self.stages.append(StageStats(rate))
+                self._run_stage(rate, args.stage_seconds)
+        finally:
+            self.stage.ended = time.perf_counter()
+            self._stop.set()
+            self.scheduler.stop()
+            for thread in drivers:
+                thread.join()
+            executor.shutdown(wait=True)
+
+    def _run_stage(self, rate, seconds):
+        """Schedule Poisson arrivals at rate per second for seconds"""
+        now = time.perf_counter()
+        end = now + seconds
+        when = now + self.random.expovariate(rate)
+        while when < end:
+            self.scheduler.at(when, self.arrive)
+            when += self.random.expovariate(rate)
+        time.sleep(max(0.0, end - time.perf_counter()))
+
+    def double_accepts(self):
+        """Rides more than one driver believes they won"""
+        return {ride_id: drivers for ride_id, drivers in self._winners.items() if len(drivers) > 1}
+
+    def report(self):
+        return {
+            "backend": self.args.backend,
+            "riders": self.args.riders,
+            "drivers": self.args.drivers,
+            "concurrency": self.args.concurrency,
+            "stages": [stage.report() for stage in self.stages],
+            "double_accepts": self.double_accepts(),
+        }
+
+
+def print_report(report):
+    print(f"Backend {report['backend']}: {report['riders']} riders, {report['drivers']} drivers, "
+          f"concurrency {report['concurrency']}")
+    for stage in report["stages"]:
+        print(f"\n== {stage['rate']:g} rides/s for {stage['seconds']:.1f}s: "
+              f"{stage['rides_completed_per_second']:.1f} rides completed/s, "
+              f"{stage['cancelled_rides']} cancelled, {stage['contention']} lost accept races, "
+              f"{stage['errors']} errors, {stage['skipped_arrivals']} arrivals with no idle rider")
+        print(f"{'operation':<16} {'count':>7} {'failed':>7} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'max ms':>8}")
+        for op, stats in stage["operations"].items():
+            print(f"{op:<16} {stats['count']:>7} {stats['failed']:>7} {stats['per_second']:>8.1f} "
+                  f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+    doubles = report["double_accepts"]
+    print(f"\nDouble-accepts: {len(doubles)}")
+    for ride_id, drivers in doubles.items():
+        print(f"  {ride_id}: {', '.join(drivers)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic ride lifecycle load")
+    parser.add_argument("--backend", default="memory", choices=("mongo", "memory", "sqlite"))
+    parser.add_argument("--db-name", default="rideapp_loadtest", help="database name (use a scratch database)")
+    parser.add_argument("--sqlite-path", default="loadtest.sqlite3")
+    parser.add_argument("--riders", type=int, default=100)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--rates", default="5,10,20", help="comma-separated ride arrival rates (per second), one stage each")
+    parser.add_argument("--stage-seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=16, help="manager calls in flight at most")
+    parser.add_argument("--cancel-probability", type=float, default=0.1)
+    parser.add_argument("--patience", type=float, default=2.0, help="seconds a cancelling rider waits at most")
+    parser.add_argument("--pick-from", type=int, default=5, help="drivers pick a random ride among the oldest N")
+    parser.add_argument("--poll-seconds", type=float, default=0.2, help="driver wait when no ride is available")
+    parser.add_argument("--pickup-seconds", type=float, default=0.05)
+    parser.add_argument("--trip-seconds", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--trace", metavar="PATH", help="record the manager calls for replay.py")
+    args = parser.parse_args(argv)
+    try:
+        args.rates = [float(rate) for rate in args.rates.split(",")]
+    except ValueError:
+        parser.error("--rates must be comma-separated numbers")
+    if args.riders < 1 or args.drivers < 1 or args.concurrency < 1 or min(args.rates) <= 0:
+        parser.error("riders, drivers, concurrency and rates must be positive")
+
+    settings = DatabaseSettings.from_env()
+    settings.backend, settings.database, settings.sqlite_path = args.backend, args.db_name, args.sqlite_path
+    settings.dispatch_workers = max(settings.dispatch_workers, args.concurrency)
+    connection = DatabaseConnection(settings)
+    if not connection.connect():
+        print("Could not connect to the database", file=sys.stderr)
+        return 1
+    try:
+        # measure the database the app runs against, with its indexes
+        success, message = IndexManager(connection.get_database()).ensure_indexes()
+        if not success:
+            print(message, file=sys.stderr)
+        load = LoadTest(connection.get_database(), args)
+        if args.trace:
+            start_tracing(args.trace)
+        load.run()
+        report = load.report()
+    finally:
+        if args.trace:
+            stop_tracing()
+        connection.close()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 1 if report["double_accepts"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
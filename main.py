@@ -2,6 +2,10 @@
 """
 IBM Ride Hailing App
 Main application entry point
+
+    python main.py                    run the app
+    python main.py --profile-startup  open the login window, print import
+                                      times and time-to-first-window, exit
 """
 
 import sys
@@ -10,37 +14,103 @@ import os
 # Add project root to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from db.connection import db_connection
-from auth.auth_manager import AuthManager
-from gui.auth_windows import LoginWindow
+from utils.log import configure_logging, get_logger
+
+logger = get_logger(__name__)
 
-def main():
+CONNECTION_POLL_MS = 100  # how often the login window checks on the background connect
+
+def prepare_database(db):
+    """Runs on the connection warm-up thread once the database is reachable"""
+    from db.indexes import IndexManager
+    from core.ride_events import ride_events
+    
+    # Make sure the lookups behind every dashboard refresh are indexed
+    success, message = IndexManager(db).ensure_indexes()
+    if not success:
+        logger.warning(message)
+    
+    # Push other terminals' ride changes to the dashboards when the server supports change streams
+    if not ride_events.start_change_stream(db):
+        logger.info("Change streams unavailable; dashboards see this terminal's ride updates only")
+
+def watch_connection(window, on_connected=None):
+    """Close the login window if the background connect fails"""
+    from db.connection import db_connection
+    
+    if db_connection.connecting:
+        window.root.after(CONNECTION_POLL_MS, watch_connection, window, on_connected)
+    elif not db_connection.wait_connected(0):
+        window.show_error("Failed to connect to database. Please make sure MongoDB is running.")
+        window.close()
+    elif on_connected:
+        on_connected()
+
+def main(argv=None):
     """Main application function"""
-    print("Starting IBM Ride Hailing App...")
+    argv = sys.argv[1:] if argv is None else argv
+    profiler = None
+    if "--profile-startup" in argv:
+        from utils.startup_profiler import StartupProfiler
+        profiler = StartupProfiler()
+        profiler.install()
     
-    # Connect to database
-    if not db_connection.connect():
-        print("Failed to connect to database. Please make sure MongoDB is running.")
-        input("Press Enter to exit...")
-        return
+    configure_logging()
+    # RIDEAPP_METRICS_PORT / RIDEAPP_METRICS_FILE export per-action latency metrics
+    from utils.metrics import start_exporters
+    start_exporters()
+    # RIDEAPP_TRACE_FILE records manager calls for replay.py
+    from utils.trace import start_from_env
+    start_from_env()
+    logger.info("Starting IBM Ride Hailing App...")
+    
+    # Connect in the background: the server is reached (and pymongo imported)
+    # while the GUI modules load and the login window comes up
+    from db.connection import db_connection
+    
+    def on_connected(db):
+        if profiler:
+            profiler.mark("database connected")
+        prepare_database(db)
+        if profiler:
+            profiler.mark("database ready")
+    
+    db_connection.connect_async(on_connected)
     
     try:
-        # Initialize auth manager
+        from auth.auth_manager import AuthManager
+        from gui.auth_windows import LoginWindow
+        if profiler:
+            profiler.mark("modules imported")
+        
+        # Initialize auth manager; its first query waits for the connection
         auth_manager = AuthManager()
         
         # Start with login window
-        print("Starting login window...")
+        logger.info("Starting login window...")
         login_window = LoginWindow(auth_manager, show_welcome=False)
+        if profiler:
+            # close (and report) once the window is up and the connection settled
+            profiler.watch_first_window(login_window.root,
+                                        lambda: watch_connection(login_window, login_window.close))
+        else:
+            watch_connection(login_window)
         login_window.run()
         
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.exception("An error occurred: %s", e)
         input("Press Enter to exit...")
     
     finally:
         # Close database connection
+        from core.ride_events import ride_events
+        ride_events.stop()
+        db_connection.wait_connected()
         db_connection.close()
-        print("Application closed.")
+        if profiler:
+            profiler.uninstall()
+            print(profiler.report())
+        logger.info("Application closed.")
 
 if __name__ == "__main__":
     main()
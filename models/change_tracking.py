@@ -0,0 +1,37 @@
+class ChangeTracking:
+    """Mixin that records which attributes changed since the object was loaded,
+    so only those fields are written back to the database"""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        changed = getattr(self, "_changed", None)
+        if changed is not None and name != "_changed":
+            # private attributes (_email) are stored without the underscore
+            changed.add(name.lstrip("_"))
+
+    def mark_clean(self):
+        """Start tracking changes from the current state"""
+        self._changed = set()
+
+    def changed_fields(self):
+        """Fields changed since mark_clean(), or None for an object that was never saved"""
+        changed = getattr(self, "_changed", None)
+        return None if changed is None else set(changed)
+
+    def get_update(self):
+        """Update document with $set/$unset for the changed fields only"""
+        data = self.to_dict()
+        changed = self.changed_fields()
+        if changed is None:
+            return {"$set": data}
+        update = {}
+        for field in changed:
+            if field not in data:
+                continue
+            if data[field] is None:
+                update.setdefault("$unset", {})[field] = ""
+            else:
+                update.setdefault("$set", {})[field] = data[field]
+        return update
@@ -1,7 +1,43 @@
+from collections import namedtuple
 from datetime import datetime
 import random
+from models.change_tracking import ChangeTracking
+from utils.id_generator import IdGenerator
 
-class Ride:
+# Lightweight read-only view of a ride for listings
+RideRow = namedtuple('RideRow', [
+    'ride_id', 'rider_email', 'driver_email', 'pickup_location',
+    'drop_location', 'status', 'fare', 'requested_at'
+])
+
+class Ride(ChangeTracking):
+    __slots__ = (
+        'ride_id', 'rider_email', 'driver_email', 'pickup_location',
+        'drop_location', 'status', 'requested_at', 'accepted_at',
+        'started_at', 'completed_at', 'updated_at', 'fare', 'rating',
+        'payment_status', 'pickup_point', 'drop_point', '_changed'
+    )
+    
+    # Ride state machine: action -> (allowed current statuses, new status, timestamp field)
+    TRANSITIONS = {
+        "accept": (("requested",), "accepted", "accepted_at"),
+        "start": (("accepted",), "started", "started_at"),
+        "complete": (("started",), "completed", "completed_at"),
+        "cancel": (("requested", "accepted"), "cancelled", None),
+    }
+    # Who may apply a transition: the caller must be in one of these fields (anyone if absent)
+    TRANSITION_OWNERS = {
+        "start": ("driver_email",),
+        "complete": ("driver_email",),
+        "cancel": ("rider_email", "driver_email"),
+    }
+    RATABLE_STATUS = "completed"
+    ID_PREFIX = "RIDE"
+    _id_generator = IdGenerator()
+    TIMESTAMP_FIELDS = ('requested_at', 'accepted_at', 'started_at', 'completed_at', 'updated_at')
+    # find() projection for RideRow listings
+    ROW_PROJECTION = {field: 1 for field in RideRow._fields}
+    
     def __init__(self, rider_email, pickup_location, drop_location):
         self.ride_id = self._generate_ride_id()
         self.rider_email = rider_email
@@ -13,13 +49,23 @@ class Ride:
         self.accepted_at = None
         self.started_at = None
         self.completed_at = None
+        self.updated_at = self.requested_at  # bumped by every write; drives dashboard change detection
         self.fare = self._calculate_fare()
         self.rating = None
         self.payment_status = "pending"
+        # GeoJSON points of the geocoded locations (None when unknown)
+        self.pickup_point = None
+        self.drop_point = None
     
     def _generate_ride_id(self):
-        """Generate a unique ride ID"""
-        return f"RIDE{random.randint(1000, 9999)}"
+        """Generate a unique, time-ordered ride ID"""
+        # zero-padded so string order matches generation order
+        return f"{self.ID_PREFIX}{self._id_generator.next_id():019d}"
+    
+    @classmethod
+    def ride_id_at(cls, when):
+        """Lowest ride ID generated at or after a datetime, for ride_id range scans"""
+        return f"{cls.ID_PREFIX}{IdGenerator.min_id_at(int(when.timestamp() * 1000)):019d}"
     
     def _calculate_fare(self):
         """Calculate fare based on distance (simplified)"""
@@ -28,45 +74,71 @@ class Ride:
         distance_multiplier = random.uniform(1.0, 3.0)
         return round(base_fare * distance_multiplier, 2)
     
+    def _apply_transition(self, action):
+        """Apply a state machine transition in memory"""
+        allowed, status, timestamp_field = self.TRANSITIONS[action]
+        if self.status not in allowed:
+            return False
+        self.status = status
+        if timestamp_field:
+            setattr(self, timestamp_field, datetime.now())
+        return True
+    
     def accept_ride(self, driver_email):
         """Driver accepts the ride"""
-        if self.status == "requested":
+        if self.status in self.TRANSITIONS["accept"][0]:
             self.driver_email = driver_email
-            self.status = "accepted"
-            self.accepted_at = datetime.now()
-            return True
+            return self._apply_transition("accept")
         return False
     
     def start_ride(self):
         """Driver starts the ride"""
-        if self.status == "accepted":
-            self.status = "started"
-            self.started_at = datetime.now()
-            return True
-        return False
+        return self._apply_transition("start")
     
     def complete_ride(self):
         """Driver completes the ride"""
-        if self.status == "started":
-            self.status = "completed"
-            self.completed_at = datetime.now()
-            return True
-        return False
+        return self._apply_transition("complete")
     
     def cancel_ride(self):
         """Cancel the ride"""
-        if self.status in ["requested", "accepted"]:
-            self.status = "cancelled"
-            return True
-        return False
+        return self._apply_transition("cancel")
+    
+    @staticmethod
+    def is_valid_rating(rating):
+        """Check a rating is between 1 and 5"""
+        return 1 <= rating <= 5
     
     def add_rating(self, rating):
         """Add rating to the ride"""
-        if 1 <= rating <= 5:
+        if self.is_valid_rating(rating):
             self.rating = rating
             return True
         return False
     
+    @classmethod
+    def transition_filter(cls, ride_id, action, caller=None):
+        """Query that only matches the ride while the transition is allowed for caller"""
+        allowed = cls.TRANSITIONS[action][0]
+        status = allowed[0] if len(allowed) == 1 else {"$in": list(allowed)}
+        query = {"ride_id": ride_id, "status": status}
+        owners = cls.TRANSITION_OWNERS.get(action, ())
+        if len(owners) == 1:
+            query[owners[0]] = caller
+        elif owners:
+            query["$or"] = [{field: caller} for field in owners]
+        return query
+    
+    @classmethod
+    def transition_update(cls, action, **fields):
+        """Update document applying a transition (plus any extra fields)"""
+        _, status, timestamp_field = cls.TRANSITIONS[action]
+        now = datetime.now()
+        changes = {"status": status, "updated_at": now}
+        if timestamp_field:
+            changes[timestamp_field] = now
+        changes.update(fields)
+        return {"$set": changes}
+    
     def get_duration(self):
         """Get ride duration if completed"""
         if self.started_at and self.completed_at:
@@ -87,34 +159,52 @@ class Ride:
             'accepted_at': self.accepted_at,
             'started_at': self.started_at,
             'completed_at': self.completed_at,
+            'updated_at': self.updated_at,
             'fare': self.fare,
             'rating': self.rating,
-            'payment_status': self.payment_status
+            'payment_status': self.payment_status,
+            'pickup_point': self.pickup_point,
+            'drop_point': self.drop_point
         }
     
     @classmethod
     def from_dict(cls, data):
-        """Create ride from dictionary"""
-        ride = cls(data['rider_email'], data['pickup_location'], data['drop_location'])
-        ride.ride_id = data['ride_id']
-        ride.driver_email = data.get('driver_email')
-        ride.status = data['status']
+        """Create ride from dictionary (skips __init__, so no ID or fare is generated)"""
+        ride = cls.__new__(cls)
+        set_field = object.__setattr__  # hydrating is not a change
+        get = data.get
+        set_field(ride, 'ride_id', data['ride_id'])
+        set_field(ride, 'rider_email', data['rider_email'])
+        set_field(ride, 'driver_email', get('driver_email'))
+        set_field(ride, 'pickup_location', data['pickup_location'])
+        set_field(ride, 'drop_location', data['drop_location'])
+        set_field(ride, 'status', data['status'])
 
         # Convert ISODate fields to Python datetime
-        ride.requested_at = cls._convert_to_datetime(data.get('requested_at'))
-        ride.accepted_at = cls._convert_to_datetime(data.get('accepted_at'))
-        ride.started_at = cls._convert_to_datetime(data.get('started_at'))
-        ride.completed_at = cls._convert_to_datetime(data.get('completed_at'))
+        for field in cls.TIMESTAMP_FIELDS:
+            set_field(ride, field, cls._convert_to_datetime(get(field)))
 
-        ride.fare = data['fare']
-        ride.rating = data.get('rating')
-        ride.payment_status = data.get('payment_status', 'pending')
+        set_field(ride, 'fare', data['fare'])
+        set_field(ride, 'rating', get('rating'))
+        set_field(ride, 'payment_status', get('payment_status', 'pending'))
+        set_field(ride, 'pickup_point', get('pickup_point'))
+        set_field(ride, 'drop_point', get('drop_point'))
+        set_field(ride, '_changed', set())
         return ride
 
+    @classmethod
+    def row_from_dict(cls, data):
+        """Create a read-only RideRow from a (projected) ride document"""
+        get = data.get
+        return RideRow(
+            data['ride_id'], get('rider_email'), get('driver_email'),
+            get('pickup_location'), get('drop_location'), get('status'),
+            get('fare'), cls._convert_to_datetime(get('requested_at'))
+        )
+
     @staticmethod
     def _convert_to_datetime(value):
         """Convert MongoDB ISODate to Python datetime"""
-        if value and isinstance(value, str):
-            from datetime import datetime
+        if value.__class__ is str and value:
             return datetime.fromisoformat(value.replace('Z', '+00:00'))
         return value
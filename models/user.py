@@ -1,7 +1,14 @@
-from typing import final
+from collections import namedtuple
 from datetime import datetime
+from models.change_tracking import ChangeTracking
 
-class User:
+# Read-only view of a driver found by a nearest-driver query
+NearbyDriver = namedtuple('NearbyDriver', ['email', 'name', 'distance_km'])
+
+class User(ChangeTracking):
+    __slots__ = ('_email', '_password', 'name', 'phone', 'created_at',
+                 'rating', 'total_rides', '_changed')
+    
     def __init__(self, email, password, name, phone):
         self._email = email
         self._password = password
@@ -49,20 +56,40 @@ class User:
     
     @classmethod
     def from_dict(cls, data):
-        """Create user from dictionary data"""
-        user = cls(data['email'], data['password'], data['name'], data['phone'])
-        user.created_at = data.get('created_at', datetime.now())
-        user.rating = data.get('rating', 0.0)
-        user.total_rides = data.get('total_rides', 0)
+        """Create user from dictionary data (skips __init__ side effects)"""
+        user = cls.__new__(cls)
+        user._hydrate(data)
+        object.__setattr__(user, '_changed', set())
         return user
+    
+    def _hydrate(self, data):
+        """Set fields from a stored document without tracking them as changes"""
+        set_field = object.__setattr__
+        get = data.get
+        set_field(self, '_email', data['email'])
+        set_field(self, '_password', data['password'])
+        set_field(self, 'name', data['name'])
+        set_field(self, 'phone', data['phone'])
+        created_at = get('created_at')
+        set_field(self, 'created_at', created_at if created_at is not None else datetime.now())
+        set_field(self, 'rating', get('rating', 0.0))
+        set_field(self, 'total_rides', get('total_rides', 0))
 
 class Driver(User):
+    # find() projection for NearbyDriver results
+    NEARBY_PROJECTION = {'email': 1, 'name': 1, 'location': 1, '_id': 0}
+    
+    __slots__ = ('license_number', 'vehicle', 'is_available', 'current_ride',
+                 'location', 'location_updated_at')
+    
     def __init__(self, email, password, name, phone, license_number):
         super().__init__(email, password, name, phone)
         self.license_number = license_number
         self.vehicle = None
         self.is_available = True
         self.current_ride = None
+        self.location = None  # GeoJSON point of the last published position
+        self.location_updated_at = None
     
     def add_vehicle(self, plate_number, vehicle_type, model):
         """Add vehicle information"""
@@ -79,25 +106,27 @@ class Driver(User):
             'license_number': self.license_number,
             'vehicle': self.vehicle,
             'is_available': self.is_available,
-            'current_ride': self.current_ride
+            'current_ride': self.current_ride,
+            'location': self.location,
+            'location_updated_at': self.location_updated_at
         })
         return data
     
-    @classmethod
-    def from_dict(cls, data):
-        """Create driver from dictionary"""
-        driver = cls(data['email'], data['password'], data['name'], 
-                    data['phone'], data['license_number'])
-        driver.vehicle = data.get('vehicle')
-        driver.is_available = data.get('is_available', True)
-        driver.current_ride = data.get('current_ride')
-        driver.created_at = data.get('created_at', datetime.now())
-        driver.rating = data.get('rating', 0.0)
-        driver.total_rides = data.get('total_rides', 0)
-        return driver
+    def _hydrate(self, data):
+        """Set driver fields from a stored document"""
+        super()._hydrate(data)
+        set_field = object.__setattr__
+        get = data.get
+        set_field(self, 'license_number', data['license_number'])
+        set_field(self, 'vehicle', get('vehicle'))
+        set_field(self, 'is_available', get('is_available', True))
+        set_field(self, 'current_ride', get('current_ride'))
+        set_field(self, 'location', get('location'))
+        set_field(self, 'location_updated_at', get('location_updated_at'))
 
-@final
 class Rider(User):
+    __slots__ = ('payment_methods', 'current_ride')
+    
     def __init__(self, email, password, name, phone):
         super().__init__(email, password, name, phone)
         self.payment_methods = []
@@ -106,7 +135,8 @@ class Rider(User):
     def add_payment_method(self, method):
         """Add a payment method"""
         if method not in self.payment_methods:
-            self.payment_methods.append(method)
+            # reassign rather than append so the change is tracked
+            self.payment_methods = self.payment_methods + [method]
     
     def to_dict(self):
         """Convert rider to dictionary"""
@@ -117,13 +147,9 @@ class Rider(User):
         })
         return data
     
-    @classmethod
-    def from_dict(cls, data):
-        """Create rider from dictionary"""
-        rider = cls(data['email'], data['password'], data['name'], data['phone'])
-        rider.payment_methods = data.get('payment_methods', [])
-        rider.current_ride = data.get('current_ride')
-        rider.created_at = data.get('created_at', datetime.now())
-        rider.rating = data.get('rating', 0.0)
-        rider.total_rides = data.get('total_rides', 0)
-        return rider
+    def _hydrate(self, data):
+        """Set rider fields from a stored document"""
+        super()._hydrate(data)
+        set_field = object.__setattr__
+        set_field(self, 'payment_methods', data.get('payment_methods', []))
+        set_field(self, 'current_ride', data.get('current_ride'))
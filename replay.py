@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Replay recorded manager-call traces (utils/trace.py) against a fresh backend.
+
+    RIDEAPP_TRACE_FILE=trace-{pid}.jsonl python main.py     # record
+    python replay.py trace-*.jsonl --speed 10 --backend memory
+
+Every recorded thread gets a replay thread that issues its calls in order
+at the recorded offsets divided by --speed (0 replays as fast as possible,
+keeping only the per-thread order), so the original concurrency is kept.
+Ride ids returned by replayed request_ride calls stand in for the recorded
+ones in later calls; a call naming a ride that another thread has not
+created yet waits for it briefly.
+
+The report compares each call's outcome and result summary with the
+recording (divergence) and recorded with replayed latency per operation.
+Calls made with arguments that cannot be recorded (model objects) are
+skipped. Users that existed before recording started are not in the fresh
+backend, so their logins diverge.
+
+The replay collections are emptied and indexed before the first call, so
+each run starts from the same state and latencies compare with the
+recording; SQLite defaults to an in-memory database.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+# Add project root to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from auth.auth_manager import AuthManager
+from core.payment_manager import PaymentManager
+from core.ride_events import RideEventFeed
+from core.ride_manager import RideManager
+from db.connection import DatabaseConnection
+from db.indexes import IndexManager
+from db.settings import DatabaseSettings
+from utils.metrics import outcome_of
+from utils.trace import RIDE_ID_PREFIX, TRACE_VERSION, summarize
+
+RIDE_ID_ARGUMENTS = ("ride_id", "after")
+RIDE_WAIT_SECONDS = 5.0
+MAX_EXAMPLES = 10
+REPLAY_COLLECTIONS = ("users", "rides", "payments")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def load_traces(paths):
+    """Per-thread call lists ({(file, thread): [entry, ...]}) on one timeline"""
+    traces = []
+    for path in paths:
+        with open(path) as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("trace") != TRACE_VERSION:
+                raise ValueError(f"{path} is not a version {TRACE_VERSION} trace")
+            traces.append((header["started"], [json.loads(line) for line in f if line.strip()]))
+    first = min((started for started, _ in traces), default=0)
+    threads = {}
+    for index, (started, entries) in enumerate(traces):
+        for entry in entries:
+            entry["t"] += started - first
+            threads.setdefault((index, entry["th"]), []).append(entry)
+    # the replay starts with the first recorded call
+    offset = min((entry["t"] for entries in threads.values() for entry in entries), default=0)
+    for entries in threads.values():
+        for entry in entries:
+            entry["t"] -= offset
+    for entries in threads.values():
+        entries.sort(key=lambda entry: entry["t"])
+    return threads
+
+
+class RideIdMap:
+    """Recorded ride id -> ride id created by the replay"""
+
+    def __init__(self):
+        self._ids = {}
+        self._condition = threading.Condition()
+
+    def learn(self, recorded, replayed):
+        with self._condition:
+            self._ids[recorded] = replayed
+            self._condition.notify_all()
+
+    def resolve(self, recorded, timeout=RIDE_WAIT_SECONDS):
+        """The replay's id, or the recorded one if the ride was never replayed"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: recorded in self._ids, timeout):
+                # created before recording started: don't wait for it again
+                self._ids[recorded] = recorded
+            return self._ids[recorded]
+
+    def known(self, recorded):
+        with self._condition:
+            return self._ids.get(recorded, recorded)
+
+    def map_summary(self, summary):
+        """A recorded result summary with its ride ids translated"""
+        if isinstance(summary, str) and summary.startswith(RIDE_ID_PREFIX):
+            return self.known(summary)
+        if isinstance(summary, list):
+            return [self.map_summary(item) for item in summary]
+        return summary
+
+
+class Replay:
+    def __init__(self, db, threads, speed):
+        self.db = db
+        self.threads = threads
+        self.speed = speed
+        self.ride_ids = RideIdMap()
+        self.events = RideEventFeed()  # nothing subscribes during a replay
+        self._lock = threading.Lock()
+        self.results = []  # (entry, outcome, summary, seconds, lag)
+        self.skipped = {}
+
+    def _managers(self):
+        # one set per replay thread: AuthManager keeps the logged-in user on the instance
+        return {"RideManager": RideManager(self.db, events=self.events),
+                "PaymentManager": PaymentManager(self.db),
+                "AuthManager": AuthManager(self.db)}
+
+    def _skip(self, entry, reason):
+        with self._lock:
+            key = f"{entry['op']}: {reason}"
+            self.skipped[key] = self.skipped.get(key, 0) + 1
+
+    def _arguments(self, entry):
+        arguments = dict(entry["args"])
+        for name in RIDE_ID_ARGUMENTS:
+            if isinstance(arguments.get(name), str):
+                arguments[name] = self.ride_ids.resolve(arguments[name])
+        return arguments
+
+    def _run_thread(self, entries, started):
+        managers = self._managers()
+        for entry in entries:
+            manager_name, _, method = entry["op"].partition(".")
+            manager = managers.get(manager_name)
+            if manager is None or not hasattr(manager, method):
+                self._skip(entry, "unknown operation")
+                continue
+            if any(isinstance(value, dict) and "$type" in value for value in entry["args"].values()):
+                self._skip(entry, "arguments not recorded")
+                continue
+            if self.speed:
+                delay = started + entry["t"] / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            lag = max(0.0, time.perf_counter() - started - entry["t"] / self.speed) if self.speed else 0.0
+            arguments = self._arguments(entry)
+            call_started = time.perf_counter()
+            try:
+                result = getattr(manager, method)(**arguments)
+                outcome = outcome_of(result)
+            except Exception:
+                result, outcome = None, "error"
+            seconds = time.perf_counter() - call_started
+            recorded = entry["res"]
+            if (method == "request_ride" and isinstance(recorded, list) and len(recorded) == 3
+                    and recorded[0] and isinstance(result, tuple) and result[0]):
+                self.ride_ids.learn(recorded[1], result[1])
+            with self._lock:
+                self.results.append((entry, outcome, summarize(result), seconds, lag))
+
+    def run(self):
+        started = time.perf_counter()
+        workers = [threading.Thread(target=self._run_thread, args=(entries, started), name=f"replay-{i}")
+                   for i, entries in enumerate(self.threads.values())]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - started
+
+    def report(self):
+        operations = {}
+        divergences = []
+        for entry, outcome, summary, seconds, lag in self.results:
+            stats = operations.setdefault(entry["op"], {"count": 0, "diverged": 0, "recorded": [], "replayed": [],
+                                                        "lag": []})
+            stats["count"] += 1
+            stats["recorded"].append(entry["ms"])
+            stats["replayed"].append(seconds * 1000)
+            stats["lag"].append(lag * 1000)
+            expected = self.ride_ids.map_summary(entry["res"])
+            if outcome != entry["out"] or summary != expected:
+                stats["diverged"] += 1
+                if len(divergences) < MAX_EXAMPLES:
+                    divergences.append({"op": entry["op"], "t": entry["t"], "recorded": [entry["out"], expected],
+                                        "replayed": [outcome, summary]})
+        for stats in operations.values():
+            for key in ("recorded", "replayed", "lag"):
+                values = sorted(stats.pop(key))
+                stats[f"{key}_p50_ms"] = percentile(values, 0.5)
+                stats[f"{key}_p99_ms"] = percentile(values, 0.99)
+        recorded_span = max((entries[-1]["t"] for entries in self.threads.values() if entries), default=0)
+        return {
+            "speed": self.speed or "max",
+            "threads": len(self.threads),
+            "calls": len(self.results),
+            "diverged": sum(stats["diverged"] for stats in operations.values()),
+            "skipped": self.skipped,
+            "recorded_seconds": recorded_span,
+            "replay_seconds": self.elapsed,
+            "operations": operations,
+            "divergence_examples": divergences,
+        }
+
+
+def prepare_backend(db):
+    """Empty the collections replayed calls write and build the app's indexes;
+    returns ensure_indexes()'s (success, message)"""
+    for name in REPLAY_COLLECTIONS:
+        db[name].delete_many({})
+    return IndexManager(db).ensure_indexes()
+
+
+def print_report(report):
+    print(f"Replayed {report['calls']} calls on {report['threads']} threads at speed {report['speed']}: "
+          f"{report['replay_seconds']:.2f}s (recorded span {report['recorded_seconds']:.2f}s), "
+          f"{report['diverged']} diverged")
+    print(f"{'operation':<36} {'calls':>6} {'diverged':>8} {'rec p50':>8} {'rep p50':>8} {'rec p99':>8} "
+          f"{'rep p99':>8} {'lag p99':>8}")
+    for op, stats in sorted(report["operations"].items()):
+        print(f"{op:<36} {stats['count']:>6} {stats['diverged']:>8} {stats['recorded_p50_ms']:>8.2f} "
+              f"{stats['replayed_p50_ms']:>8.2f} {stats['recorded_p99_ms']:>8.2f} {stats['replayed_p99_ms']:>8.2f} "
+              f"{stats['lag_p99_ms']:>8.2f}")
+    for reason, count in report["skipped"].items():
+        print(f"Skipped {count}x {reason}")
+    for example in report["divergence_examples"]:
+        print(f"Diverged at {example['t']:.3f}s {example['op']}: recorded {example['recorded']}, "
+              f"replayed {example['replayed']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay manager-call traces against a fresh backend")
+    parser.add_argument("traces", nargs="+", help="JSONL trace files (one per recording process)")
+    parser.add_argument("--speed", type=float, default=1.0, help="time scale: 1, 10, ... or 0 for as fast as possible")
+    parser.add_argument("--backend", default="memory", choices=("mongo", "memory", "sqlite"))
+    parser.add_argument("--db-name", default="rideapp_replay",
+                        help="database name (use a scratch database: its ride app collections are emptied)")
+    parser.add_argument("--sqlite-path", default=":memory:")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    if args.speed < 0:
+        parser.error("--speed must not be negative")
+    try:
+        threads = load_traces(args.traces)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cannot read trace: {e}", file=sys.stderr)
+        return 2
+
+    settings = DatabaseSettings.from_env()
+    settings.backend, settings.database, settings.sqlite_path = args.backend, args.db_name, args.sqlite_path
+    settings.dispatch_workers = max(settings.dispatch_workers, len(threads))
+    connection = DatabaseConnection(settings)
+    if not connection.connect():
+        print("Could not connect to the database", file=sys.stderr)
+        return 1
+    try:
+        success, message = prepare_backend(connection.get_database())
+        if not success:
+            print(message, file=sys.stderr)
+        replay = Replay(connection.get_database(), threads, args.speed)
+        replay.run()
+        report = replay.report()
+    finally:
+        connection.close()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -100,6 +100,1252 @@ def test_location_utils():
         print(f"✗ Location utilities test failed: {e}")
         return False
 
+def test_storage_backends():
+    """Test the ride lifecycle against the in-process storage backends"""
+    print("\nTesting storage backends...")
+    
+    try:
+        from db.storage import MemoryDatabase, SQLiteDatabase
+        from db.indexes import IndexManager
+        from auth.auth_manager import AuthManager
+        from core.ride_manager import RideManager
+        from core.payment_manager import PaymentManager
+        
+        for db in (MemoryDatabase(), SQLiteDatabase()):
+            name = type(db).__name__
+            index_manager = IndexManager(db)
+            assert index_manager.ensure_indexes()[0] == True
+            
+            # Unique indexes and manager checks
+            auth_manager = AuthManager(db)
+            assert auth_manager.register_user("rider@example.com", "password123", "Rider", "1234567890", "rider")[0] == True
+            assert auth_manager.register_user("driver@example.com", "password123", "Driver", "1234567890", "driver", "DL12345")[0] == True
+            assert auth_manager.register_user("rider@example.com", "password123", "Rider", "1234567890", "rider")[0] == False
+            assert auth_manager.login_user("driver@example.com", "password123")[0] == True
+            
+            # Ride lifecycle
+            ride_manager = RideManager(db)
+            success, ride_id, message = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")
+            assert success == True
+            assert [r.ride_id for r in ride_manager.get_available_rides()] == [ride_id]
+            assert ride_manager.accept_ride(ride_id, "driver@example.com")[0] == True
+            assert ride_manager.accept_ride(ride_id, "other@example.com")[0] == False
+            assert ride_manager.start_ride(ride_id, "driver@example.com")[0] == True
+            assert ride_manager.complete_ride(ride_id, "driver@example.com")[0] == True
+            assert ride_manager.rate_ride(ride_id, 5, "rider@example.com")[0] == True
+            assert db.users.find_one({"email": "driver@example.com"})["total_rides"] == 1
+            
+            payment_manager = PaymentManager(db)
+            open_ride = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+            assert payment_manager.process_payment(open_ride, 20.0, "Cash", "rider@example.com") == \
+                (False, "Ride is not completed")
+            
+            def fail(*args, **kwargs):
+                raise RuntimeError("write failed")
+            db.payments.insert_one = fail
+            try:
+                assert payment_manager.process_payment(ride_id, 20.0, "Cash", "rider@example.com")[0] == False
+            finally:
+                del db.payments.insert_one
+            assert ride_manager.get_ride_by_id(ride_id).payment_status == "pending"
+            assert payment_manager.process_payment(ride_id, 20.0, "Cash", "rider@example.com")[0] == True
+            assert payment_manager.process_payment(ride_id, 20.0, "Cash", "rider@example.com") == \
+                (False, "Ride already paid")
+            assert len(payment_manager.get_payment_history("rider@example.com")) == 1
+            assert payment_manager.get_total_earnings("driver@example.com") == ride_manager.get_ride_by_id(ride_id).fare
+            
+            # Every manager query is served by an index
+            ok, problems = index_manager.verify_query_plans()
+            assert ok == True, problems
+            print(f"✓ {name} working")
+        
+        print("✓ All storage backends working correctly!")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Storage backend test failed: {e}")
+        return False
+
+def test_concurrent_accept():
+    """Test that only one driver can accept a ride under contention"""
+    print("\nTesting concurrent ride acceptance...")
+    
+    try:
+        import threading
+        from db.storage import MemoryDatabase
+        from core.ride_manager import RideManager
+        
+        ride_manager = RideManager(MemoryDatabase())
+        success, ride_id, message = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")
+        
+        results = []
+        def accept(driver_email):
+            results.append(ride_manager.accept_ride(ride_id, driver_email)[0])
+        
+        threads = [threading.Thread(target=accept, args=(f"driver{i}@example.com",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert results.count(True) == 1
+        assert ride_manager.get_ride_by_id(ride_id).status == "accepted"
+        print("✓ Exactly one of 8 drivers accepted the ride")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Concurrent accept test failed: {e}")
+        return False
+
+def test_change_tracking():
+    """Test that loaded models only write back changed fields"""
+    print("\nTesting change tracking...")
+    
+    try:
+        from models.user import Driver
+        from models.ride import Ride
+        
+        ride = Ride.from_dict(Ride("rider@example.com", "Central Park", "Times Square").to_dict())
+        assert ride.get_update() == {}
+        ride.accept_ride("driver@example.com")
+        update = ride.get_update()
+        assert set(update["$set"]) == {"driver_email", "status", "accepted_at"}
+        print("✓ Ride tracks changed fields")
+        
+        driver = Driver("driver@example.com", "password123", "Test Driver", "1234567890", "DL12345")
+        assert "$set" in driver.get_update()  # never saved: full document
+        driver = Driver.from_dict(driver.to_dict())
+        driver.add_vehicle("ABC123", "Sedan", "Toyota Camry")
+        driver.current_ride = None
+        assert driver.get_update() == {"$set": {"vehicle": driver.vehicle}, "$unset": {"current_ride": ""}}
+        print("✓ Driver emits $set/$unset for changed fields only")
+        
+        return True
+        
+    except Exception as e:
+        print(f"✗ Change tracking test failed: {e}")
+        return False
+
+def test_ride_ids():
+    """Test ride IDs are unique and time-ordered across threads"""
+    print("\nTesting ride ID generation...")
+    
+    try:
+        import threading
+        from datetime import datetime
+        from models.ride import Ride
+        
+        start = Ride.ride_id_at(datetime.now())
+        ids = []
+        def generate():
+            ids.extend(Ride("rider@example.com", "Central Park", "Times Square").ride_id for _ in range(2000))
+        
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(set(ids)) == len(ids)
+        assert all(ride_id >= start for ride_id in ids)
+        sequential = [Ride("rider@example.com", "Central Park", "Times Square").ride_id for _ in range(100)]
+        assert sequential == sorted(sequential)
+        print(f"✓ {len(ids)} unique, time-ordered ride IDs")
+        
+        import logging
+        from utils import id_generator
+        from utils.id_generator import IdGenerator
+        
+        assert IdGenerator.node_ids(4, {"RIDEAPP_NODE_ID": "8"}) == [8, 9, 10, 11]
+        assert IdGenerator.node_ids(2, {}) == [0, 1]
+        for environ in ({"RIDEAPP_NODE_ID": "1023"}, {"RIDEAPP_NODE_ID": "-1"}):
+            try:
+                IdGenerator.node_ids(2, environ)
+                assert False, f"node IDs past the range accepted: {environ}"
+            except ValueError:
+                pass
+        assert IdGenerator.default_node_id({"RIDEAPP_NODE_ID": "7"}) == 7
+        try:
+            IdGenerator.default_node_id({"RIDEAPP_NODE_ID": "1024"})
+            assert False, "out-of-range RIDEAPP_NODE_ID accepted"
+        except ValueError:
+            pass
+        warnings = []
+        handler = logging.Handler()
+        handler.emit = warnings.append
+        id_generator.logger.addHandler(handler)
+        try:
+            IdGenerator.default_node_id({})
+        finally:
+            id_generator.logger.removeHandler(handler)
+        assert warnings and "RIDEAPP_NODE_ID is not set" in warnings[0].getMessage()
+        print("✓ Worker node IDs are distinct and the hash fallback warns")
+        
+        # two processes writing in the same millisecond only differ by node ID
+        first, second = IdGenerator(0), IdGenerator(1)
+        first._now_ms = second._now_ms = lambda: IdGenerator.EPOCH_MS + 1000
+        assert first.next_id() != second.next_id()
+        return True
+        
+    except Exception as e:
+        print(f"✗ Ride ID test failed: {e}")
+        return False
+
+def test_pagination():
+    """Test keyset pagination of ride listings"""
+    print("\nTesting ride pagination...")
+    
+    try:
+        from db.storage import MemoryDatabase
+        from core.ride_manager import RideManager
+        
+        ride_manager = RideManager(MemoryDatabase())
+        ride_ids = [ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+                    for _ in range(25)]
+        
+        # Available rides: oldest first, pages of 10
+        seen, token = [], None
+        while True:
+            page, token = ride_manager.get_available_rides_page(limit=10, after=token)
+            seen.extend(row.ride_id for row in page)
+            if token is None:
+                break
+        assert seen == ride_ids
+        
+        # User rides: newest first, filtered by status
+        ride_manager.cancel_ride(ride_ids[0], "rider@example.com")
+        page, token = ride_manager.get_user_rides_page("rider@example.com", limit=5, statuses=["cancelled"])
+        assert [row.ride_id for row in page] == [ride_ids[0]] and token is None
+        
+        rides = list(ride_manager.iter_user_rides("rider@example.com", batch_size=7))
+        assert [r.ride_id for r in rides] == ride_ids[::-1]
+        print("✓ Pages and lazy iteration return every ride exactly once")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Pagination test failed: {e}")
+        return False
+
+def test_ride_events():
+    """Test the ride event feed"""
+    print("\nTesting ride events...")
+    
+    try:
+        from db.storage import MemoryDatabase
+        from core.ride_events import RideEventFeed
+        from core.ride_manager import RideManager
+        
+        db = MemoryDatabase()
+        feed = RideEventFeed()
+        events = []
+        subscription = feed.subscribe(events.append)
+        ride_manager = RideManager(db, events=feed)
+        
+        ride_id = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+        ride_manager.accept_ride(ride_id, "driver@example.com")
+        ride_manager.accept_ride(ride_id, "other@example.com")  # rejected: no event
+        ride_manager.cancel_ride(ride_id, "rider@example.com")
+        assert [(e.ride_id, e.status) for e in events] == [
+            (ride_id, "requested"), (ride_id, "accepted"), (ride_id, "cancelled")
+        ]
+        assert events[1].ride["driver_email"] == "driver@example.com"
+        
+        feed.unsubscribe(subscription)
+        ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")
+        assert len(events) == 3
+        
+        # In-process storage has no change streams: the feed stays local
+        assert not feed.start_change_stream(db) and feed.source == "local"
+        print("✓ Ride changes are published to subscribers")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Ride events test failed: {e}")
+        return False
+
+def test_background_runner():
+    """Test the GUI background runner"""
+    print("\nTesting background runner...")
+    
+    try:
+        import threading
+        from gui.background import BackgroundRunner
+        
+        class FakeRoot:
+            """Stands in for Tk: after() callbacks run when pump() is called"""
+            def __init__(self):
+                self.callbacks = []
+            def after(self, ms, callback):
+                self.callbacks.append(callback)
+                return len(self.callbacks)
+            def after_cancel(self, after_id):
+                pass
+            def pump(self):
+                while self.callbacks:
+                    self.callbacks.pop(0)()
+        
+        root = FakeRoot()
+        runner = BackgroundRunner(root, max_workers=2)
+        release = threading.Event()
+        results, errors, threads = [], [], []
+        
+        # The first refresh is superseded while still running: only the second is delivered
+        runner.submit("refresh", lambda: release.wait() and "stale", results.append)
+        runner.submit("refresh", lambda: threads.append(threading.current_thread()) or "fresh", results.append)
+        runner.submit(None, lambda: 1 / 0, results.append, errors.append)
+        release.set()
+        root.pump()
+        
+        assert results == ["fresh"], results
+        assert len(errors) == 1 and isinstance(errors[0], ZeroDivisionError)
+        assert threads[0] is not threading.current_thread()
+        runner.shutdown()
+        print("✓ Results reach the main thread and stale ones are dropped")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Background runner test failed: {e}")
+        return False
+
+def test_dashboard_snapshot():
+    """Test the one-query dashboard snapshots"""
+    print("\nTesting dashboard snapshots...")
+    
+    try:
+        from db.storage import MemoryDatabase
+        from core.ride_manager import RideManager
+        
+        ride_manager = RideManager(MemoryDatabase())
+        ride_ids = [ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+                    for _ in range(6)]
+        ride_manager.accept_ride(ride_ids[0], "driver@example.com")
+        ride_manager.start_ride(ride_ids[0], "driver@example.com")
+        ride_manager.accept_ride(ride_ids[1], "driver@example.com")
+        ride_manager.cancel_ride(ride_ids[1], "driver@example.com")
+        
+        driver = ride_manager.get_driver_dashboard("driver@example.com", limit=3)
+        rows, token = driver["available"]
+        assert [r.ride_id for r in rows] == ride_ids[2:5] and token == ride_ids[4]
+        assert [r.ride_id for r in driver["ongoing"][0]] == [ride_ids[0]]
+        assert [r.ride_id for r in driver["canceled"][0]] == [ride_ids[1]]
+        assert driver["completed"] == ([], None)
+        assert driver["counts"] == {"requested": 4, "started": 1, "cancelled": 1}
+        
+        # Snapshot tokens continue with the bucket page query
+        rows, token = ride_manager.get_bucket_page("driver@example.com", "driver", "available", after=token)
+        assert [r.ride_id for r in rows] == [ride_ids[5]] and token is None
+        
+        rider = ride_manager.get_rider_dashboard("rider@example.com")
+        # in-progress rides, newest first, include started ones
+        assert [r.ride_id for r in rider["requested"][0]] == ride_ids[2:][::-1] + ride_ids[:1]
+        print("✓ All dashboard buckets come from one aggregation")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Dashboard snapshot test failed: {e}")
+        return False
+
+def test_change_marker():
+    """Test change markers and the adaptive poller"""
+    print("\nTesting change markers...")
+    
+    try:
+        from db.storage import MemoryDatabase
+        from core.ride_manager import RideManager
+        from gui.auto_refresh import AdaptivePoller
+        
+        ride_manager = RideManager(MemoryDatabase())
+        ride_id = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+        rider_marker = ride_manager.get_change_marker("rider@example.com", "rider")
+        driver_marker = ride_manager.get_change_marker("driver@example.com", "driver")
+        other_ride = ride_manager.request_ride("other@example.com", "Central Park", "Times Square")[1]
+        assert ride_manager.get_change_marker("rider@example.com", "rider") == rider_marker
+        assert ride_manager.get_change_marker("driver@example.com", "driver") != driver_marker
+        ride_manager.accept_ride(ride_id, "driver@example.com")
+        assert ride_manager.get_change_marker("rider@example.com", "rider") != rider_marker
+        driver_marker = ride_manager.get_change_marker("driver@example.com", "driver")
+        ride_manager.accept_ride(other_ride, "other.driver@example.com")
+        assert ride_manager.get_change_marker("driver@example.com", "driver") != driver_marker
+        driver_marker = ride_manager.get_change_marker("driver@example.com", "driver")
+        ride_manager.start_ride(other_ride, "other.driver@example.com")
+        ride_manager.complete_ride(other_ride, "other.driver@example.com")
+        assert ride_manager.get_ride_by_id(other_ride).status == "completed"
+        assert ride_manager.get_change_marker("driver@example.com", "driver") == driver_marker
+        print("✓ Markers move only with the rides a dashboard shows")
+        
+        busy, focused = [False], [True]
+        poller = AdaptivePoller(None, None, None, None, base_ms=1000, fast_ms=500, max_ms=8000,
+                                is_busy=lambda: busy[0], is_focused=lambda: focused[0])
+        assert poller.next_delay() == 1000
+        poller.idle_polls = 2
+        assert poller.next_delay() == 4000
+        focused[0] = False
+        assert poller.next_delay() == 8000
+        busy[0], focused[0] = True, True
+        assert poller.next_delay() == 500
+        print("✓ Poller backs off when idle or unfocused and speeds up for active rides")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Change marker test failed: {e}")
+        return False
+
+def test_tab_cache():
+    """Test the per-tab cache behind lazy dashboard loading"""
+    print("\nTesting tab cache...")
+    
+    try:
+        from gui.tab_cache import TabCache
+        
+        cache = TabCache(ttl=60)
+        assert not cache.is_fresh("available")
+        version = cache.version("available")
+        cache.mark_loaded("available", version)
+        assert cache.is_fresh("available")
+        cache.invalidate("available")
+        assert not cache.is_fresh("available")
+        print("✓ Loaded tabs stay fresh until invalidated")
+        
+        # a load that was in flight when its tab was invalidated must not count
+        version = cache.version("ongoing")
+        cache.invalidate("ongoing")
+        cache.mark_loaded("ongoing", version)
+        assert not cache.is_fresh("ongoing")
+        cache.mark_loaded("ongoing", cache.version("ongoing"))
+        cache.mark_loaded("completed", cache.version("completed"))
+        cache.invalidate()
+        assert not cache.is_fresh("ongoing") and not cache.is_fresh("completed")
+        
+        expired = TabCache(ttl=0)
+        expired.mark_loaded("available", expired.version("available"))
+        assert not expired.is_fresh("available")
+        print("✓ Stale loads and expired entries are reloaded")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Tab cache test failed: {e}")
+        return False
+
+def test_startup():
+    """Test lazy startup imports and the background connection warm-up"""
+    print("\nTesting startup...")
+    
+    try:
+        import subprocess
+        import sys
+        import time
+        from db.connection import DatabaseConnection, PendingDatabase
+        from db.settings import DatabaseSettings
+        
+        # the entry point must not pull in the GUI or the database drivers before connecting
+        probe = ("import sys, main; "
+                 "print(','.join(m for m in ('tkinter', 'pymongo', 'db.storage', 'matplotlib') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, timeout=60)
+        assert result.returncode == 0 and result.stdout.strip() == "", result.stdout + result.stderr
+        print("✓ Heavy modules are not imported by main at startup")
+        
+        connection = DatabaseConnection(DatabaseSettings(backend="memory"))
+        connection.connect_async(lambda db: time.sleep(0.1))
+        db = connection.get_database()
+        assert isinstance(db, PendingDatabase) and connection.connecting
+        assert db.users.count_documents({}) == 0
+        assert not connection.connecting and connection.wait_connected(0)
+        assert connection.get_database() is connection.db
+        connection.close()
+        print("✓ Queries wait for the background connection")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Startup test failed: {e}")
+        return False
+
+def test_api_server():
+    """Test the HTTP/JSON API over one kept-alive connection"""
+    print("\nTesting API server...")
+    
+    try:
+        import asyncio
+        import http.client
+        import json
+        import threading
+        from api.routes import RideApi
+        from api.server import ApiServer
+        from api.settings import ApiSettings
+        from api.tokens import TokenSigner
+        from db.connection import DatabaseConnection
+        from db.settings import DatabaseSettings
+        
+        connection = DatabaseConnection(DatabaseSettings(backend="memory"))
+        connection.connect()
+        server = ApiServer(RideApi(connection, TokenSigner()), ApiSettings(port=0), worker_threads=2)
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        
+        def run():
+            loop.run_until_complete(server.start())
+            started.set()
+            loop.run_until_complete(server.serve())
+        
+        thread = threading.Thread(target=run)
+        thread.start()
+        started.wait(5)
+        client = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        
+        def call(method, path, body=None, token=None):
+            headers = {"Content-Type": "application/json"}
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+            client.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = client.getresponse()
+            return response.status, json.loads(response.read())
+        
+        for email, extra in (("rider@example.com", {}),
+                             ("driver@example.com", {"user_type": "driver", "license_number": "DL12345678"})):
+            status, _ = call("POST", "/auth/register", dict(email=email, password="Passw0rd!", name="Test",
+                                                            phone="1234567890", **extra))
+            assert status == 201
+        rider = call("POST", "/auth/login", {"email": "rider@example.com", "password": "Passw0rd!"})[1]["token"]
+        driver = call("POST", "/auth/login", {"email": "driver@example.com", "password": "Passw0rd!"})[1]["token"]
+        sock = client.sock
+        
+        status, body = call("POST", "/rides", {"pickup_location": "Central Park", "drop_location": "Times Square"}, rider)
+        assert status == 201
+        ride_id = body["ride_id"]
+        assert call("POST", f"/rides/{ride_id}/accept", token=driver)[0] == 200
+        assert call("POST", f"/rides/{ride_id}/accept", token=driver)[0] == 409
+        assert call("POST", f"/rides/{ride_id}/accept", token=rider)[0] == 403
+        assert call("GET", "/dashboard")[0] == 401
+        status, dashboard = call("GET", "/dashboard", token=driver)
+        assert status == 200 and dashboard["ongoing"]["rides"][0][0] == ride_id
+        assert client.sock is sock, "connection was not kept alive"
+        print("✓ Ride lifecycle over one kept-alive connection")
+        
+        for email, extra in (("other.rider@example.com", {}),
+                             ("other.driver@example.com", {"user_type": "driver", "license_number": "DL87654321"})):
+            call("POST", "/auth/register", dict(email=email, password="Passw0rd!", name="Other",
+                                                phone="1234567890", **extra))
+        other_rider = call("POST", "/auth/login",
+                           {"email": "other.rider@example.com", "password": "Passw0rd!"})[1]["token"]
+        other_driver = call("POST", "/auth/login",
+                            {"email": "other.driver@example.com", "password": "Passw0rd!"})[1]["token"]
+        assert call("POST", f"/rides/{ride_id}/start", token=other_driver)[0] == 404
+        assert call("POST", f"/rides/{ride_id}/start", token=driver)[0] == 200
+        assert call("POST", f"/rides/{ride_id}/complete", token=rider)[0] == 403
+        assert call("POST", f"/rides/{ride_id}/complete", token=other_driver)[0] == 404
+        assert call("POST", f"/rides/{ride_id}/complete", token=driver)[0] == 200
+        assert call("POST", f"/rides/{ride_id}/rating", {"rating": True}, rider)[0] == 400
+        assert call("POST", f"/rides/{ride_id}/rating", {"rating": 5}, other_rider)[0] == 404
+        assert call("POST", f"/rides/{ride_id}/rating", {"rating": 5}, rider)[0] == 200
+        payment = {"ride_id": ride_id, "amount": 20.0, "payment_method": "Cash"}
+        assert call("POST", "/payments", dict(payment, amount=True), rider)[0] == 400
+        assert call("POST", "/payments", payment, driver)[0] == 403
+        assert call("POST", "/payments", payment, other_rider)[0] == 404
+        assert call("POST", "/payments", payment, rider)[0] == 200
+        assert call("GET", "/payments", token=other_rider)[1]["payments"] == []
+        
+        open_ride = call("POST", "/rides", {"pickup_location": "Central Park", "drop_location": "Times Square"},
+                         rider)[1]["ride_id"]
+        status, body = call("GET", f"/rides/{open_ride}", token=other_driver)
+        assert status == 200 and "rider_email" not in body and body["pickup_location"] == "Central Park"
+        assert call("GET", f"/rides/{open_ride}", token=rider)[1]["rider_email"] == "rider@example.com"
+        assert call("GET", "/rides/available", token=other_driver)[1]["rides"][0][1] is None
+        assert call("GET", "/analytics/summary", token=rider)[0] == 404
+        assert call("POST", f"/rides/{open_ride}/cancel", token=other_rider)[0] == 404
+        assert call("POST", f"/rides/{open_ride}/cancel", token=other_driver)[0] == 404
+        assert call("POST", f"/rides/{open_ride}/cancel", token=rider)[0] == 200
+        print("✓ Only a ride's own rider or driver can change it")
+        
+        assert call("PUT", "/drivers/me/location", {"lat": 40.758896, "lng": -73.985130}, driver)[0] == 200
+        nearest = "/drivers/nearest?lat=40.7484&lng=-73.9857"
+        assert call("GET", nearest, token=driver)[0] == 403
+        status, body = call("GET", nearest, token=rider)
+        assert status == 200 and body["drivers"] == [{"name": "Test", "distance_km": 1.2}], body
+        print("✓ Nearest drivers shown to riders without emails or exact distances")
+        
+        loop.call_soon_threadsafe(server.request_stop)
+        thread.join(5)
+        assert not thread.is_alive()
+        client.close()
+        loop.close()
+        print("✓ Server shuts down gracefully")
+        return True
+        
+    except Exception as e:
+        print(f"✗ API server test failed: {e}")
+        return False
+
+def test_logging():
+    """Test structured logging through the queue listener"""
+    print("\nTesting logging...")
+    
+    try:
+        import io
+        import json
+        import logging
+        from utils.log import SAMPLED, configure_logging, get_logger, shutdown_logging
+        
+        stream = io.StringIO()
+        configure_logging(level="INFO", json_format=True, stream=stream, sample_every=5)
+        logger = get_logger("test")
+        for i in range(10):
+            logger.info("Polled %d", i, extra=SAMPLED)
+        logger.debug("Not shown %s", object())
+        logger.warning("Ride %s failed", "RIDE1", extra={"ride_id": "RIDE1"})
+        shutdown_logging()
+        
+        entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert [entry["message"] for entry in entries] == ["Polled 0", "Polled 5", "Ride RIDE1 failed"]
+        assert entries[0]["sample_rate"] == 5 and entries[2]["ride_id"] == "RIDE1"
+        print("✓ JSON records, levels and sampling work")
+        
+        root = logging.getLogger("rideapp")
+        root.handlers, root.propagate = [], True
+        return True
+        
+    except Exception as e:
+        print(f"✗ Logging test failed: {e}")
+        return False
+
+def test_metrics():
+    """Test operation metrics and the Prometheus export"""
+    print("\nTesting metrics...")
+    
+    try:
+        import os
+        import tempfile
+        from utils.metrics import MetricsRegistry, OPERATION_SECONDS, OPERATIONS_TOTAL, timed
+        
+        registry = MetricsRegistry()
+        
+        @timed("ride.accept", registry=registry)
+        def accept(ok):
+            if ok is None:
+                raise RuntimeError("database down")
+            return (True, "accepted") if ok else (False, "Ride cannot be accepted")
+        
+        accept(True)
+        accept(False)
+        accept(False)
+        try:
+            accept(None)
+        except RuntimeError:
+            pass
+        for outcome, expected in (("ok", 1), ("failure", 2), ("error", 1)):
+            labels = {"action": "ride.accept", "outcome": outcome}
+            assert registry.counter_value(OPERATIONS_TOTAL, labels) == expected, outcome
+            assert registry.histogram(OPERATION_SECONDS, labels).count == expected
+        print("✓ Outcomes counted, including (False, ...) results and exceptions")
+        
+        from db.storage import MemoryDatabase
+        from auth.auth_manager import AuthManager
+        from core.ride_manager import RideManager
+        from models.user import Rider
+        from utils.metrics import metrics, record_error
+        
+        @timed("outer", registry=registry)
+        def outer():
+            inner()
+            return []
+        
+        @timed("inner", registry=registry)
+        def inner():
+            record_error()
+            return []
+        
+        outer()
+        assert registry.counter_value(OPERATIONS_TOTAL, {"action": "inner", "outcome": "error"}) == 1
+        assert registry.counter_value(OPERATIONS_TOTAL, {"action": "outer", "outcome": "ok"}) == 1
+        
+        def database_down(*args, **kwargs):
+            raise RuntimeError("database down")
+        
+        db = MemoryDatabase()
+        for method in ("find", "find_one", "aggregate", "update_one"):
+            setattr(db.rides, method, database_down)
+            setattr(db.users, method, database_down)
+        ride_manager, auth_manager = RideManager(db), AuthManager(db)
+        rider = Rider("rider@test.com", "x", "Rider", "555-0100")
+        rider.mark_clean()
+        rider.name = "Renamed Rider"
+        calls = (
+            ("RideManager.get_available_rides_page", ride_manager.get_available_rides_page, (), ([], None)),
+            ("RideManager.get_change_marker", ride_manager.get_change_marker, ("rider@test.com", "rider"), None),
+            ("AuthManager.save_user", auth_manager.save_user, (rider,), False),
+        )
+        for action, call, args, fallback in calls:
+            labels = {"action": action, "outcome": "error"}
+            before = metrics.counter_value(OPERATIONS_TOTAL, labels)
+            assert call(*args) == fallback, action
+            assert metrics.counter_value(OPERATIONS_TOTAL, labels) == before + 1, action
+        dashboard = ride_manager.get_rider_dashboard("rider@test.com")
+        assert dashboard["counts"] == {}
+        labels = {"action": "RideManager.get_rider_dashboard", "outcome": "error"}
+        assert metrics.counter_value(OPERATIONS_TOTAL, labels) >= 1
+        print("✓ Swallowed backend errors still count as errors")
+        
+        for ms in range(1, 101):
+            registry.observe("latency", ms / 1000)
+        histogram = registry.histogram("latency")
+        assert 0.025 <= histogram.quantile(0.5) <= 0.05 and 0.05 <= histogram.quantile(0.99) <= 0.1
+        
+        text = registry.render_prometheus()
+        assert f'{OPERATIONS_TOTAL}{{action="ride.accept",outcome="failure"}} 2' in text
+        assert f'{OPERATION_SECONDS}_bucket{{action="ride.accept",outcome="ok",le="+Inf"}} 1' in text
+        path = os.path.join(tempfile.mkdtemp(), "rideapp.prom")
+        registry.dump(path)
+        with open(path) as f:
+            assert f.read() == text
+        print("✓ Quantiles and Prometheus text export work")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Metrics test failed: {e}")
+        return False
+
+def test_command_monitoring():
+    """Test per-action round trips and the redacted slow-query log"""
+    print("\nTesting command monitoring...")
+    
+    try:
+        import logging
+        from types import SimpleNamespace
+        from db.monitoring import action_scope, command_monitor, filter_shape
+        from db.storage import MemoryDatabase
+        from core.ride_manager import RideManager
+        
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger("rideapp.db.monitoring")
+        logger.addHandler(handler)
+        command_monitor.reset()
+        command_monitor.enabled, command_monitor.slow_query_ms = True, 0
+        try:
+            db = MemoryDatabase()
+            db.command_listener = command_monitor
+            ride_manager = RideManager(db)
+            with action_scope("rider.request"):
+                ride_id = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+            for _ in range(2):
+                with action_scope("dashboard.refresh"):
+                    ride_manager.get_driver_dashboard("driver@example.com")
+            with action_scope("driver.accept") as scope:
+                ride_manager.accept_ride(ride_id, "driver@example.com")
+            
+            # a pymongo command seen through the listener interface
+            event = SimpleNamespace(command_name="find", connection_id=("localhost", 27017), request_id=7,
+                                    command={"find": "rides", "filter": {"rider_email": "rider@example.com"}},
+                                    reply={"ok": 1}, duration_micros=2500)
+            with action_scope("rider.history"):
+                command_monitor.started(event)
+                command_monitor.succeeded(event)
+        finally:
+            command_monitor.enabled, command_monitor.slow_query_ms = False, 100
+            logger.removeHandler(handler)
+        
+        summary = command_monitor.summary()
+        assert summary["driver.accept"]["invocations"] == 1
+        assert summary["driver.accept"]["round_trips"] == scope.round_trips > 0
+        refresh = summary["dashboard.refresh"]
+        assert refresh["invocations"] == 2 and refresh["round_trips_per_action"] == refresh["round_trips"] / 2
+        assert summary["rider.history"]["commands"] == {"find": 1}
+        assert "dashboard.refresh" in command_monitor.report()
+        print("✓ Round trips counted per user action, including pymongo events")
+        
+        messages = [record.getMessage() for record in records]
+        assert messages and not any("rider@example.com" in message or ride_id in message for message in messages)
+        assert any("{'rider_email': '?'}" in message for message in messages)
+        assert filter_shape({"status": {"$in": ["a", "b"]}, "fare": {"$gt": 5}}) == \
+            {"status": {"$in": ["?"]}, "fare": {"$gt": "?"}}
+        print("✓ Slow-query log shows filter shapes without values")
+        command_monitor.reset()
+        return True
+        
+    except Exception as e:
+        print(f"✗ Command monitoring test failed: {e}")
+        return False
+
+def test_load_generator():
+    """Test a short synthetic load run"""
+    print("\nTesting load generator...")
+    
+    try:
+        import contextlib
+        import io
+        import json
+        import loadtest
+        from db.indexes import IndexManager
+        
+        indexed = []
+        ensure_indexes = IndexManager.ensure_indexes
+        
+        def recording(self):
+            indexed.append(self.db)
+            return ensure_indexes(self)
+        
+        output = io.StringIO()
+        IndexManager.ensure_indexes = recording
+        try:
+            with contextlib.redirect_stdout(output):
+                status = loadtest.main(["--backend", "memory", "--riders", "20", "--drivers", "8", "--rates", "40",
+                                        "--stage-seconds", "0.5", "--pickup-seconds", "0", "--trip-seconds", "0.01",
+                                        "--concurrency", "8", "--json"])
+        finally:
+            IndexManager.ensure_indexes = ensure_indexes
+        report = json.loads(output.getvalue())
+        stage = report["stages"][0]
+        assert status == 0 and report["double_accepts"] == {} and len(indexed) == 1
+        assert stage["errors"] == 0 and stage["completed_rides"] > 0
+        accepts = stage["operations"]["accept_ride"]
+        assert accepts["count"] - accepts["failed"] >= stage["completed_rides"]
+        assert accepts["p50_ms"] <= accepts["p99_ms"] <= accepts["max_ms"]
+        print(f"✓ {stage['completed_rides']} rides completed, {stage['contention']} lost accept races, no double-accepts")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Load generator test failed: {e}")
+        return False
+
+def test_benchmarks():
+    """Test the micro-benchmark baselines and regression check"""
+    print("\nTesting benchmarks...")
+    
+    try:
+        import contextlib
+        import io
+        import json
+        import os
+        import tempfile
+        import benchmark
+        
+        path = os.path.join(tempfile.mkdtemp(), "baseline.json")
+        args = ["Rider.", "Ride._convert", "--min-time", "0.001", "--repeat", "2"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert benchmark.main(args + ["--save", path]) == 0
+        with open(path) as f:
+            baseline = json.load(f)
+        assert set(baseline["results"]) == {"Rider.to_dict", "Rider.from_dict", "Ride._convert_to_datetime"}
+        assert all(result["per_item_ns"] > 0 for result in baseline["results"].values())
+        print("✓ Baseline saved")
+        
+        # a baseline ten times faster than possible must fail the comparison
+        for result in baseline["results"].values():
+            result["per_item_ns"] /= 10
+        with open(path, "w") as f:
+            json.dump(baseline, f)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            assert benchmark.main(args + ["--compare", path, "--confirm", "0"]) == 1
+        assert "REGRESSION Rider.from_dict" in output.getvalue()
+        assert benchmark.compare({"x": {"per_item_ns": 105}}, {"results": {"x": {"per_item_ns": 100}}}) == []
+        print("✓ Regressions beyond the threshold fail the run")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Benchmark test failed: {e}")
+        return False
+
+def test_trace_replay():
+    """Test trace recording and replay against a fresh backend"""
+    print("\nTesting trace recording and replay...")
+    
+    try:
+        import os
+        import tempfile
+        import threading
+        import replay
+        from db.storage import MemoryDatabase
+        from core.ride_events import RideEventFeed
+        from core.ride_manager import RideManager
+        from core.payment_manager import PaymentManager
+        from utils.trace import start_tracing, stop_tracing
+        
+        path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+        db = MemoryDatabase()
+        ride_manager = RideManager(db, events=RideEventFeed())
+        requested = []
+        start_tracing(path)
+        try:
+            for _ in range(3):
+                requested.append(ride_manager.request_ride("rider@example.com", "12 Secret Lane", "Times Square")[1])
+            
+            def drive():
+                # another thread, as a driver would be
+                for ride_id in requested:
+                    ride_manager.accept_ride(ride_id, "driver@example.com")
+                ride_manager.accept_ride(requested[0], "other@example.com")
+                PaymentManager(db).process_payment(requested[0], 12.5, "Cash", "rider@example.com")
+            driver = threading.Thread(target=drive)
+            driver.start()
+            driver.join()
+        finally:
+            assert stop_tracing() == 0
+        
+        with open(path) as f:
+            text = f.read()
+        assert "rider@example.com" not in text and "Secret Lane" not in text and requested[0] in text
+        threads = replay.load_traces([path])
+        assert len(threads) == 2 and sum(len(entries) for entries in threads.values()) == 8
+        print("✓ Calls recorded per thread with pseudonymized arguments")
+        
+        fresh = MemoryDatabase()
+        fresh.users.insert_one({"email": "left.over@example.com"})
+        assert replay.prepare_backend(fresh)[0]
+        assert fresh.users.count_documents({}) == 0
+        assert "ride_id_unique" in fresh.rides._indexes
+        run = replay.Replay(fresh, threads, speed=0)
+        run.run()
+        report = run.report()
+        assert report["calls"] == 8 and report["diverged"] == 0, report["divergence_examples"]
+        assert report["operations"]["RideManager.accept_ride"]["count"] == 4
+        assert fresh.rides.count_documents({"status": "accepted"}) == 3
+        assert not fresh.rides.find_one({"ride_id": requested[0]})
+        print("✓ Replay remaps ride ids and matches the recorded results")
+        
+        path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+        start_tracing(path)
+        try:
+            ride_manager.update_driver_location("driver@example.com", 40.758896, -73.985130)
+            ride_manager.get_nearest_drivers(40.758896, -73.985130, max_km=2.345)
+        finally:
+            assert stop_tracing() == 0
+        with open(path) as f:
+            text = f.read()
+        assert "40.758896" not in text and "73.98513" not in text and "2.345" not in text
+        location, nearest = [entry["args"] for entries in replay.load_traces([path]).values() for entry in entries]
+        assert (location["lat"], location["lng"]) == (nearest["lat"], nearest["lng"])
+        assert abs(nearest["lat"] - 40.758896) <= 0.51 and nearest["max_km"] == 2.3
+        assert round(nearest["lat"] * 100, 6) == round(nearest["lat"] * 100)
+        print("✓ Coordinates shifted and coarsened in the trace")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Trace replay test failed: {e}")
+        return False
+
+def test_geospatial():
+    """Test driver positions, the grid index and nearest-driver queries"""
+    print("\nTesting geospatial queries...")
+    
+    try:
+        import random
+        from auth.auth_manager import AuthManager
+        from core.ride_events import RideEventFeed
+        from core.ride_manager import RideManager
+        from db.indexes import IndexManager
+        from db.storage import MemoryDatabase, SQLiteDatabase
+        from utils.geo_index import GeoGridIndex, haversine_km
+        
+        rng = random.Random(7)
+        points = {i: (40.75 + rng.uniform(-0.3, 0.3), -73.98 + rng.uniform(-0.3, 0.3)) for i in range(5000)}
+        grid = GeoGridIndex(cell_km=0.5)
+        for key, (lat, lng) in points.items():
+            grid.update(key, lat, lng)
+        grid.update(0, 40.7, -74.0)
+        points[0] = (40.7, -74.0)
+        grid.remove(1)
+        del points[1]
+        by_distance = sorted((haversine_km(40.75, -73.98, lat, lng), key) for key, (lat, lng) in points.items())
+        assert [key for _, key in grid.nearest(40.75, -73.98, 10)] == [key for _, key in by_distance[:10]]
+        assert [key for _, key in grid.within(40.75, -73.98, 2.0)] == [key for d, key in by_distance if d <= 2.0]
+        assert len(grid.nearest(40.75, -73.98, 3, accept=lambda key: key % 2 == 0)) == 3
+        print("✓ Grid index matches brute force")
+        
+        for db in (MemoryDatabase(), SQLiteDatabase()):
+            IndexManager(db).ensure_indexes()
+            auth_manager = AuthManager(db)
+            ride_manager = RideManager(db, events=RideEventFeed())
+            positions = {"near": (40.7585, -73.9850), "mid": (40.7484, -73.9857), "far": (40.6892, -74.0445),
+                         "busy": (40.7581, -73.9856), "offline": (40.7580, -73.9855)}
+            for name, (lat, lng) in positions.items():
+                auth_manager.register_user(f"{name}@example.com", "Passw0rd!", name, "1234567890", "driver",
+                                           f"DL{name.upper()}")
+                if name != "offline":
+                    assert ride_manager.update_driver_location(f"{name}@example.com", lat, lng)[0]
+            db.users.update_one({"email": "busy@example.com"}, {"$set": {"is_available": False}})
+            assert ride_manager.update_driver_location("nobody@example.com", 40.7, -74.0) == (False, "Driver not found")
+            assert not ride_manager.update_driver_location("near@example.com", 91, 0)[0]
+            
+            nearest = ride_manager.get_nearest_drivers(40.7580, -73.9855, k=2)
+            assert [driver.email for driver in nearest] == ["near@example.com", "mid@example.com"]
+            assert nearest[0].distance_km < 0.1 < nearest[1].distance_km
+            assert [d.email for d in ride_manager.get_nearest_drivers(40.7580, -73.9855, k=5, max_km=2)] == \
+                ["near@example.com", "mid@example.com"]
+            
+            ride_ids = {location: ride_manager.request_ride("rider@example.com", f"{location}, New York",
+                                                             "Central Park")[1]
+                        for location in ("Times Square", "Empire State Building", "Statue of Liberty")}
+            ride_manager.request_ride("rider@example.com", "Somewhere unknown", "Central Park")
+            ride_manager.accept_ride(ride_ids["Empire State Building"], "mid@example.com")
+            nearby = ride_manager.get_nearby_rides(40.7580, -73.9855, radius_km=5)
+            assert [row.ride_id for row, _ in nearby] == [ride_ids["Times Square"]]
+            nearby = ride_manager.get_nearby_rides(40.7580, -73.9855, radius_km=50)
+            assert [row.ride_id for row, _ in nearby] == [ride_ids["Times Square"], ride_ids["Statue of Liberty"]]
+            assert nearby[0][1] < 0.01 and 8 < nearby[1][1] < 10
+            assert ride_manager.get_ride_by_id(ride_ids["Times Square"]).pickup_point["coordinates"] == \
+                [-73.9855, 40.7580]
+            
+            ok, problems = IndexManager(db).verify_query_plans()
+            assert ok, problems
+        print("✓ Nearest drivers and nearby rides on memory and SQLite backends")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Geospatial test failed: {e}")
+        return False
+
+def test_database_settings():
+    """Test database settings defaults and environment parsing"""
+    print("\nTesting database settings...")
+    
+    try:
+        from db.settings import DatabaseSettings
+        
+        settings = DatabaseSettings.from_env({})
+        assert settings.backend == "mongo" and settings.database == "rideapp"
+        assert settings.max_pool_size is None and settings.pool_size() == settings.dispatch_workers + 2
+        assert settings.use_transactions is False and settings.slow_query_ms == 100
+        print("✓ Defaults without environment variables")
+        
+        settings = DatabaseSettings.from_env({
+            "RIDEAPP_DB_BACKEND": "sqlite", "RIDEAPP_DB_NAME": "other", "RIDEAPP_MONGO_MAX_POOL": "12",
+            "RIDEAPP_DISPATCH_WORKERS": "8", "RIDEAPP_USE_TRANSACTIONS": "Yes", "RIDEAPP_MONGO_RETRY_WRITES": "0",
+            "RIDEAPP_SLOW_QUERY_MS": "2.5", "RIDEAPP_MONGO_COMPRESSORS": "",
+        })
+        assert (settings.backend, settings.database, settings.dispatch_workers) == ("sqlite", "other", 8)
+        assert settings.pool_size() == 12 and settings.client_options()["maxPoolSize"] == 12
+        assert settings.use_transactions is True and settings.retry_writes is False
+        assert settings.slow_query_ms == 2.5 and settings.compressors == "zlib"
+        print("✓ Environment variables override defaults (empty values are ignored)")
+        
+        try:
+            DatabaseSettings.from_env({"RIDEAPP_MONGO_MAX_POOL": "ten"})
+            assert False, "non-integer pool size accepted"
+        except ValueError as e:
+            assert "RIDEAPP_MONGO_MAX_POOL" in str(e)
+        analytics = settings.for_workload("analytics")
+        assert analytics.max_pool_size == 2 and settings.max_pool_size == 12
+        try:
+            settings.for_workload("batch")
+            assert False, "unknown workload accepted"
+        except ValueError:
+            pass
+        print("✓ Invalid values are rejected with the variable name")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Database settings test failed: {e}")
+        return False
+
+def test_index_manager():
+    """Test index bootstrap idempotency and COLLSCAN detection"""
+    print("\nTesting index manager...")
+    
+    try:
+        from db.indexes import IndexManager
+        from db.storage import MemoryDatabase, SQLiteDatabase
+        
+        for db in (MemoryDatabase(), SQLiteDatabase()):
+            index_manager = IndexManager(db)
+            assert index_manager.ensure_indexes()[0]
+            if isinstance(db, SQLiteDatabase):
+                count_indexes = lambda: db._conn.execute(
+                    "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index'").fetchone()[0]
+            else:
+                count_indexes = lambda: sum(len(db[name]._indexes) for name in db.list_collection_names())
+            created = count_indexes()
+            assert index_manager.ensure_indexes()[0] and count_indexes() == created
+            
+            ok, problems = index_manager.verify_query_plans()
+            assert ok, problems
+            index_manager.QUERIES = IndexManager.QUERIES + [
+                ("Unindexed lookup", "users", {"phone": "1234567890"}, None)]
+            ok, problems = index_manager.verify_query_plans()
+            assert not ok and problems == ["Unindexed lookup: COLLSCAN on users"], problems
+        print("✓ ensure_indexes is idempotent and unindexed queries are flagged")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Index manager test failed: {e}")
+        return False
+
+def test_transactions():
+    """Test ride actions with use_transactions, including a failing second write"""
+    print("\nTesting transactional ride actions...")
+    
+    try:
+        from core.ride_events import RideEventFeed
+        from core.ride_manager import RideManager
+        from db.storage import DuplicateKeyError, InsertOne, MemoryDatabase, SQLiteDatabase
+        
+        for db in (MemoryDatabase(), SQLiteDatabase()):
+            ride_manager = RideManager(db, use_transactions=True, events=RideEventFeed())
+            for email in ("rider@example.com", "driver@example.com"):
+                db.users.insert_one({"email": email, "total_rides": 0, "is_available": True})
+            
+            ride_id = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+            assert ride_manager.accept_ride(ride_id, "driver@example.com")[0]
+            assert ride_manager.start_ride(ride_id, "driver@example.com")[0]
+            assert ride_manager.complete_ride(ride_id, "driver@example.com")[0]
+            assert db.users.find_one({"email": "rider@example.com"})["total_rides"] == 1
+            assert db.users.find_one({"email": "driver@example.com"})["is_available"] is True
+            
+            ride_id = ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")[1]
+            ride_manager.accept_ride(ride_id, "driver@example.com")
+            ride_manager.start_ride(ride_id, "driver@example.com")
+            users = db.users
+            
+            def fail(*args, **kwargs):
+                raise RuntimeError("users unavailable")
+            users.bulk_write = fail
+            try:
+                success, message = ride_manager.complete_ride(ride_id, "driver@example.com")
+            finally:
+                del users.bulk_write
+            assert not success and "users unavailable" in message
+            assert db.users.find_one({"email": "rider@example.com"})["total_rides"] == 1
+            # the ride update is rolled back with the failed write
+            status = ride_manager.get_ride_by_id(ride_id).status
+            assert status == "started", status
+            assert db.rides.count_documents({"status": "started"}) == 1
+            
+            db.payments.create_index("ride_id", unique=True)
+            try:
+                db.payments.bulk_write([InsertOne({"ride_id": "A"}), InsertOne({"ride_id": "A"})])
+                assert False, "duplicate insert accepted"
+            except DuplicateKeyError:
+                pass
+            assert db.payments.count_documents({}) == 0
+            db.payments.insert_one({"ride_id": "A"})
+        print("✓ A failed action is rolled back on SQLite and the memory backend")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Transaction test failed: {e}")
+        return False
+
+def test_model_hydration():
+    """Test from_dict hydrates models without side effects"""
+    print("\nTesting model hydration...")
+    
+    try:
+        from datetime import datetime
+        from models.ride import Ride
+        from models.user import Driver, Rider
+        
+        requested = datetime(2024, 3, 1, 9, 30)
+        data = Ride("rider@example.com", "Central Park", "Times Square").to_dict()
+        data.update(ride_id="RIDE0000000000000000042", fare=17.5, requested_at=requested,
+                    completed_at="2024-03-01T10:05:00Z", status="completed")
+        generator = Ride._id_generator
+        Ride._id_generator = None  # hydrating must not generate an ID
+        try:
+            ride = Ride.from_dict(data)
+        finally:
+            Ride._id_generator = generator
+        assert ride.ride_id == "RIDE0000000000000000042" and ride.fare == 17.5
+        assert ride.requested_at == requested and ride.updated_at == data["updated_at"]
+        assert ride.completed_at.year == 2024 and ride.completed_at.minute == 5
+        assert ride.changed_fields() == set() and ride.get_update() == {}
+        print("✓ Ride keeps stored ID, fare and timestamps and starts clean")
+        
+        created = datetime(2023, 6, 1, 12, 0)
+        driver_data = Driver("driver@example.com", "hash", "Test Driver", "1234567890", "DL12345").to_dict()
+        driver_data.update(created_at=created, rating=4.5, is_available=False)
+        driver = Driver.from_dict(driver_data)
+        rider = Rider.from_dict(dict(Rider("rider@example.com", "hash", "Rider", "1234567890").to_dict(),
+                                     created_at=created))
+        assert driver.created_at == created and rider.created_at == created
+        assert driver.password == "hash" and driver.rating == 4.5 and driver.is_available is False
+        assert driver.changed_fields() == set() and rider.changed_fields() == set()
+        print("✓ Users keep stored password hash and timestamps and start clean")
+        
+        for model in (ride, driver, rider):
+            try:
+                model.unknown_attribute = 1
+                assert False, f"{type(model).__name__} accepted an unknown attribute"
+            except AttributeError:
+                pass
+        print("✓ Unknown attributes raise AttributeError")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Model hydration test failed: {e}")
+        return False
+
+def test_ride_list_diff():
+    """Test which ride cards a refresh creates, updates or removes (no Tk window needed)"""
+    print("\nTesting ride card diffing...")
+    
+    try:
+        from gui.ride_list import RideListView, append_page, buttons_changed, plan_refresh
+        from models.ride import RideRow
+        
+        assert plan_refresh({}, [], ["A", "B"]) == ([], ["A", "B"], True)
+        assert plan_refresh({"A": 1, "B": 2}, ["A", "B"], ["A", "B"]) == ([], [], False)
+        assert plan_refresh({"A": 1, "B": 2, "C": 3}, ["A", "B", "C"], ["D", "A", "C"]) == (["B"], ["D"], True)
+        assert plan_refresh({"A": 1, "B": 2}, ["A", "B"], ["B", "A"]) == ([], [], True)
+        assert plan_refresh({"A": 1}, ["A"], []) == (["A"], [], True)
+        print("✓ Refresh plans destroy, create and re-pack only what changed")
+        
+        ride = RideRow("A", "r@example.com", None, "Central Park", "Times Square", "requested", 12.0, None)
+        accepted = ride._replace(status="accepted", driver_email="d@example.com")
+        state = (ride, ["Accept"], None)
+        assert buttons_changed(None, state)
+        assert not buttons_changed(state, (accepted, ["Accept"], "footer"))
+        assert buttons_changed(state, (accepted, ["Start", "Cancel"], None))
+        assert buttons_changed(state, (ride._replace(ride_id="B"), ["Accept"], None))
+        print("✓ Cards rebuild buttons only for new actions or a different ride")
+        
+        from db.storage import MemoryDatabase
+        from core.ride_manager import RideManager
+        
+        ride_manager = RideManager(MemoryDatabase())
+        for _ in range(RideListView.PAGE_SIZE + 5):
+            ride_manager.request_ride("rider@example.com", "Central Park", "Times Square")
+        rows, token = ride_manager.get_bucket_page("rider@example.com", "rider", "requested", RideListView.PAGE_SIZE)
+        assert len(rows) == RideListView.PAGE_SIZE and token is not None
+        more, token = ride_manager.get_bucket_page("rider@example.com", "rider", "requested",
+                                                   RideListView.PAGE_SIZE, token)
+        shown = append_page(rows, rows[-2:] + more)
+        assert len(shown) == RideListView.PAGE_SIZE + 5 and token is None
+        assert len({ride.ride_id for ride in shown}) == len(shown)
+        print("✓ Next pages append without repeating rides already shown")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Ride card diff test failed: {e}")
+        return False
+
+def test_virtual_window():
+    """Test the virtualized list's visible-row window maths (no Tk window needed)"""
+    print("\nTesting virtual list window...")
+    
+    try:
+        from gui.virtual_list import VirtualRideList, needs_more_rows, visible_rows
+        
+        row, buffer = VirtualRideList.ROW_HEIGHT, VirtualRideList.BUFFER_ROWS
+        # top of the list: rows 0-3 are in a 600px view, plus 3 below
+        assert visible_rows(0, 600, 100, row, buffer) == (0, 7)
+        # scrolled half a row into row 10: 3 rows of buffer above
+        assert visible_rows(10.5 * row, 600, 100, row, buffer) == (7, 18)
+        # near the end the window is clipped to the rows loaded
+        assert visible_rows(95 * row, 600, 100, row, buffer) == (92, 100)
+        # a window not laid out yet (height 1) still binds one row plus buffers
+        assert visible_rows(0, 1, 100, row, buffer) == (0, 5)
+        assert visible_rows(0, 600, 0, row, buffer) == (0, 0)
+        print("✓ Visible rows follow the scroll position with buffers, clipped to the rows")
+        
+        assert not needs_more_rows(7, 100, buffer)
+        assert needs_more_rows(97, 100, buffer) and needs_more_rows(100, 100, buffer)
+        assert needs_more_rows(0, 0, buffer)
+        print("✓ The next page is fetched when the window nears the last row")
+        return True
+        
+    except Exception as e:
+        print(f"✗ Virtual window test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("=== RIDE APP TEST SUITE ===\n")
@@ -107,7 +1353,32 @@ def main():
     tests = [
         test_models,
         test_validators,
-        test_location_utils
+        test_location_utils,
+        test_database_settings,
+        test_storage_backends,
+        test_index_manager,
+        test_concurrent_accept,
+        test_transactions,
+        test_change_tracking,
+        test_model_hydration,
+        test_ride_ids,
+        test_pagination,
+        test_ride_events,
+        test_background_runner,
+        test_ride_list_diff,
+        test_virtual_window,
+        test_dashboard_snapshot,
+        test_change_marker,
+        test_tab_cache,
+        test_startup,
+        test_api_server,
+        test_logging,
+        test_metrics,
+        test_command_monitoring,
+        test_load_generator,
+        test_benchmarks,
+        test_trace_replay,
+        test_geospatial
     ]
     
     passed = 0
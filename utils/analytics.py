@@ -2,17 +2,27 @@
 Simple analytics module for ride app data visualization
 """
 
-try:
+import importlib.util
+from utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# matplotlib takes longer to import than the rest of the app together:
+# only check it is installed here and import it when a plot is drawn
+MATPLOTLIB_AVAILABLE = importlib.util.find_spec("matplotlib") is not None
+if not MATPLOTLIB_AVAILABLE:
+    logger.info("Matplotlib not available. Analytics features will be limited.")
+
+
+def _pyplot():
+    """matplotlib.pyplot, imported on first use"""
     import matplotlib.pyplot as plt
-    import numpy as np
-    MATPLOTLIB_AVAILABLE = True
-except ImportError:
-    MATPLOTLIB_AVAILABLE = False
-    print("Matplotlib not available. Analytics features will be limited.")
+    return plt
 
 class Analytics:
     def __init__(self, db_connection):
-        self.db = db_connection.get_database()
+        # long-running aggregations use their own pool so they never starve the GUI
+        self.db = db_connection.get_database("analytics")
     
     def get_user_ratings(self):
         """Get all user ratings for analysis"""
@@ -50,14 +60,15 @@ class Analytics:
     def plot_ratings_distribution(self):
         """Plot distribution of user ratings"""
         if not MATPLOTLIB_AVAILABLE:
-            print("Matplotlib not available for plotting")
+            logger.warning("Matplotlib not available for plotting")
             return
         
         ratings = self.get_user_ratings()
         if not ratings:
-            print("No ratings data available")
+            logger.info("No ratings data available")
             return
         
+        plt = _pyplot()
         plt.figure(figsize=(8, 6))
         plt.hist(ratings, bins=10, alpha=0.7, color='skyblue', edgecolor='black')
         plt.title('Distribution of User Ratings')
@@ -69,17 +80,18 @@ class Analytics:
     def plot_ride_status_distribution(self):
         """Plot distribution of ride statuses"""
         if not MATPLOTLIB_AVAILABLE:
-            print("Matplotlib not available for plotting")
+            logger.warning("Matplotlib not available for plotting")
             return
         
         status_data = self.get_ride_status_distribution()
         if not status_data:
-            print("No ride status data available")
+            logger.info("No ride status data available")
             return
         
         labels = list(status_data.keys())
         values = list(status_data.values())
         
+        plt = _pyplot()
         plt.figure(figsize=(8, 6))
         plt.pie(values, labels=labels, autopct='%1.1f%%', startangle=90)
         plt.title('Ride Status Distribution')
@@ -89,12 +101,12 @@ class Analytics:
     def plot_monthly_rides(self, year):
         """Plot monthly ride counts for a year"""
         if not MATPLOTLIB_AVAILABLE:
-            print("Matplotlib not available for plotting")
+            logger.warning("Matplotlib not available for plotting")
             return
         
         monthly_data = self.get_monthly_rides(year)
         if not monthly_data:
-            print(f"No ride data available for {year}")
+            logger.info("No ride data available for %s", year)
             return
         
         months = list(range(1, 13))
@@ -103,6 +115,7 @@ class Analytics:
         month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
                       'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
         
+        plt = _pyplot()
         plt.figure(figsize=(10, 6))
         plt.bar(month_names, counts, color='lightgreen', alpha=0.7)
         plt.title(f'Monthly Ride Counts - {year}')
@@ -0,0 +1,140 @@
+"""
+Geospatial helpers: GeoJSON points, great-circle distances and an
+in-process grid index answering "k nearest" and "within R km" queries.
+
+GeoGridIndex buckets points into cells of roughly cell_km on a side, so a
+query only looks at the cells around it instead of every point. It backs
+2dsphere indexes in the memory storage backend, standing in for MongoDB's.
+Cells do not wrap across the antimeridian, which is fine for city-sized
+service areas but not for searches spanning longitude 180.
+"""
+
+import heapq
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def point(lat, lng):
+    """GeoJSON Point (GeoJSON puts longitude first)"""
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def lat_lng(geo_point):
+    """(lat, lng) of a GeoJSON Point, or None if it is not one"""
+    try:
+        if geo_point.get("type") != "Point":
+            return None
+        lng, lat = geo_point["coordinates"]
+        return float(lat), float(lng)
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def valid_lat_lng(lat, lng):
+    return -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoGridIndex:
+    """Thread-safe grid of keyed points"""
+
+    def __init__(self, cell_km=1.0):
+        self.cell_km = cell_km
+        self._cell_degrees = cell_km / KM_PER_DEGREE
+        self._cells = {}  # (row, col) -> {key: (lat, lng)}
+        self._points = {}  # key -> (lat, lng, cell)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def __contains__(self, key):
+        return key in self._points
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self._cell_degrees), math.floor(lng / self._cell_degrees)
+
+    def update(self, key, lat, lng):
+        """Add or move a point"""
+        cell = self._cell(lat, lng)
+        with self._lock:
+            old = self._points.get(key)
+            if old is not None and old[2] != cell:
+                self._discard(key, old[2])
+            self._cells.setdefault(cell, {})[key] = (lat, lng)
+            self._points[key] = (lat, lng, cell)
+
+    def remove(self, key):
+        with self._lock:
+            old = self._points.pop(key, None)
+            if old is not None:
+                self._discard(key, old[2])
+
+    def _discard(self, key, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(key, None)
+            if not members:
+                del self._cells[cell]
+
+    def _scan(self, lat, lng, radius_km, accept=None):
+        """[(distance km, key)] within radius_km, unsorted; call with the lock held"""
+        row, col = self._cell(lat, lng)
+        rows = math.ceil(radius_km / self.cell_km)
+        # a degree of longitude shrinks with the cosine of the latitude, so the
+        # column span is set by the latitude of the band nearest to a pole
+        edge_lat = abs(lat) + radius_km / KM_PER_DEGREE
+        cos_edge = math.cos(math.radians(edge_lat)) if edge_lat < 90 else 0.0
+        cols = math.ceil(radius_km / (self.cell_km * cos_edge)) if cos_edge > 1e-9 else None
+        if cols is None or (2 * rows + 1) * (2 * cols + 1) > len(self._cells):
+            # a wide radius: walking the occupied cells is cheaper
+            cells = list(self._cells.values())
+        else:
+            cells = [self._cells[cell] for cell in
+                     ((r, c) for r in range(row - rows, row + rows + 1) for c in range(col - cols, col + cols + 1))
+                     if cell in self._cells]
+        found = []
+        for members in cells:
+            for key, (p_lat, p_lng) in members.items():
+                if accept is not None and not accept(key):
+                    continue
+                distance = haversine_km(lat, lng, p_lat, p_lng)
+                if distance <= radius_km:
+                    found.append((distance, key))
+        return found
+
+    def within(self, lat, lng, radius_km, accept=None):
+        """[(distance km, key)] of the points within radius_km (and for which
+        accept(key) is true), nearest first"""
+        with self._lock:
+            found = self._scan(lat, lng, radius_km, accept)
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def nearest(self, lat, lng, k, max_km=None, accept=None):
+        """[(distance km, key)] of the k nearest points (optionally within max_km and
+        for which accept(key) is true), nearest first"""
+        if k <= 0:
+            return []
+        # search ever wider circles until one holds k points
+        radius_km = self.cell_km
+        limit_km = math.pi * EARTH_RADIUS_KM if max_km is None else max_km
+        with self._lock:
+            while True:
+                radius_km = min(radius_km, limit_km)
+                found = self._scan(lat, lng, radius_km, accept)
+                if len(found) >= k or radius_km >= limit_km:
+                    break
+                radius_km *= 4
+        return heapq.nsmallest(k, found, key=lambda item: item[0])
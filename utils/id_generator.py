@@ -0,0 +1,102 @@
+"""
+Time-ordered 64-bit ID generator: 41 bits of milliseconds since EPOCH_MS,
+10 bits of node ID and a 12-bit per-millisecond sequence.
+
+IDs are only unique across processes when every writer process has its own
+node ID (RIDEAPP_NODE_ID); api.server gives each of its workers one.
+"""
+
+import os
+import socket
+import threading
+import time
+import zlib
+from utils.log import get_logger
+
+NODE_ID_VAR = "RIDEAPP_NODE_ID"
+
+logger = get_logger(__name__)
+
+
+class IdGenerator:
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+    NODE_BITS = 10
+    SEQUENCE_BITS = 12
+    MAX_NODE = (1 << NODE_BITS) - 1
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+    TIMESTAMP_SHIFT = NODE_BITS + SEQUENCE_BITS
+
+    def __init__(self, node_id=None):
+        if node_id is not None and not 0 <= node_id <= self.MAX_NODE:
+            raise ValueError(f"Node ID must be between 0 and {self.MAX_NODE}")
+        self._configured_node_id = node_id
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # resolved on the first ID, so a worker process can set RIDEAPP_NODE_ID after import
+        self.node_id = self._configured_node_id
+        self._last_ms = -1
+        self._sequence = 0
+
+    @classmethod
+    def default_node_id(cls, environ=None):
+        """Node ID from RIDEAPP_NODE_ID. Without it the ID is a hash of the host name and
+        process ID, which another process shares with probability 1/1024, so a warning is logged."""
+        environ = os.environ if environ is None else environ
+        configured = environ.get(NODE_ID_VAR)
+        if configured:
+            node_id = int(configured)
+            if not 0 <= node_id <= cls.MAX_NODE:
+                raise ValueError(f"{NODE_ID_VAR} must be between 0 and {cls.MAX_NODE}")
+            return node_id
+        seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+        node_id = zlib.crc32(seed) & cls.MAX_NODE
+        logger.warning("%s is not set; using node ID %d from the host name and process ID, "
+                       "which may collide with another writer process", NODE_ID_VAR, node_id)
+        return node_id
+
+    @classmethod
+    def node_ids(cls, count, environ=None):
+        """Distinct node IDs for count writer processes: RIDEAPP_NODE_ID (default 0) onwards"""
+        environ = os.environ if environ is None else environ
+        base = int(environ.get(NODE_ID_VAR) or 0)
+        if base < 0 or base + count - 1 > cls.MAX_NODE:
+            raise ValueError(f"{NODE_ID_VAR}={base} leaves no node ID for {count} processes "
+                             f"(the maximum is {cls.MAX_NODE})")
+        return list(range(base, base + count))
+
+    @staticmethod
+    def _now_ms():
+        return time.time_ns() // 1_000_000
+
+    def next_id(self):
+        """Get the next ID; IDs from one generator are strictly increasing"""
+        with self._lock:
+            if os.getpid() != self._pid:
+                # forked child: never share the parent's node ID and sequence
+                self._reset()
+            if self.node_id is None:
+                self.node_id = self.default_node_id()
+            now = max(self._now_ms(), self._last_ms)  # ignore the clock stepping back
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & self.MAX_SEQUENCE
+                if self._sequence == 0:
+                    # sequence exhausted for this millisecond
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - self.EPOCH_MS) << self.TIMESTAMP_SHIFT) | (self.node_id << self.SEQUENCE_BITS) | self._sequence
+
+    @classmethod
+    def timestamp_ms(cls, generated_id):
+        """Unix time in milliseconds at which an ID was generated"""
+        return (generated_id >> cls.TIMESTAMP_SHIFT) + cls.EPOCH_MS
+
+    @classmethod
+    def min_id_at(cls, timestamp_ms):
+        """Smallest ID that can be generated at a given Unix time in milliseconds"""
+        return (timestamp_ms - cls.EPOCH_MS) << cls.TIMESTAMP_SHIFT
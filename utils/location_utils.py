@@ -4,8 +4,25 @@ Location utilities for the ride app
 
 import webbrowser
 import urllib.parse
+from utils.geo_index import valid_lat_lng
+from utils.log import get_logger
+
+logger = get_logger(__name__)
 
 class LocationUtils:
+    # Coordinates (lat, lng) of the sample locations; there is no geocoding service
+    KNOWN_LOCATIONS = {
+        "central park": (40.7829, -73.9654),
+        "times square": (40.7580, -73.9855),
+        "empire state building": (40.7484, -73.9857),
+        "brooklyn bridge": (40.7061, -73.9969),
+        "statue of liberty": (40.6892, -74.0445),
+        "central station": (40.7527, -73.9772),
+        "madison square garden": (40.7505, -73.9934),
+        "rockefeller center": (40.7587, -73.9787),
+    }
+    CITY_SUFFIX = ", new york"
+    
     @staticmethod
     def open_google_maps(pickup_location, drop_location):
         """Open Google Maps with directions from pickup to drop location"""
@@ -21,7 +38,7 @@ class LocationUtils:
             webbrowser.open(maps_url)
             return True
         except Exception as e:
-            print(f"Error opening Google Maps: {e}")
+            logger.warning("Error opening Google Maps: %s", e)
             return False
     
     @staticmethod
@@ -45,6 +62,22 @@ class LocationUtils:
             return False
         return True
     
+    @staticmethod
+    def geocode(location):
+        """(lat, lng) of a known place or a "lat, lng" string, or None"""
+        if not location:
+            return None
+        key = location.strip().lower()
+        if key.endswith(LocationUtils.CITY_SUFFIX):
+            key = key[:-len(LocationUtils.CITY_SUFFIX)].strip()
+        if key in LocationUtils.KNOWN_LOCATIONS:
+            return LocationUtils.KNOWN_LOCATIONS[key]
+        try:
+            lat, lng = (float(part) for part in key.split(","))
+        except ValueError:
+            return None
+        return (lat, lng) if valid_lat_lng(lat, lng) else None
+    
     @staticmethod
     def format_location(location):
         """Format location for display"""
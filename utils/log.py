@@ -0,0 +1,142 @@
+"""
+Structured, levelled logging for the ride app.
+
+Modules log through get_logger(__name__) with %-style arguments, which are
+only formatted when the level is enabled. configure_logging() sends all
+app records through a bounded queue to a background listener thread, so
+logging never blocks the caller on I/O. Hot-path records marked with
+extra=SAMPLED are thinned to one in every N per message.
+
+Environment: RIDEAPP_LOG_LEVEL (default INFO), RIDEAPP_LOG_FORMAT (text or
+json), RIDEAPP_LOG_FILE (default stderr), RIDEAPP_LOG_SAMPLE (N, default 10).
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+ROOT_LOGGER = "rideapp"
+QUEUE_SIZE = 10000
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# extra= for high-frequency records that may be sampled
+SAMPLED = {"sample": True}
+
+# attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime", "sample"}
+
+_listener = None
+_lock = threading.Lock()
+
+
+def get_logger(name):
+    """Logger under the app's root logger, e.g. get_logger(__name__)"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra= fields become top-level keys"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Passes one in every `every` records per logger and message for records
+    marked with extra=SAMPLED below min_level; everything else passes."""
+
+    def __init__(self, every=10, min_level=logging.WARNING):
+        super().__init__()
+        self.every = every
+        self.min_level = min_level
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno >= self.min_level or not getattr(record, "sample", False):
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sample_rate = self.every
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full instead of blocking"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=None, json_format=None, stream=None, sample_every=None, environ=None):
+    """Route app logging through a queue to a listener thread (idempotent; later calls reconfigure)"""
+    global _listener
+    environ = os.environ if environ is None else environ
+    level = level or environ.get("RIDEAPP_LOG_LEVEL", "INFO").upper()
+    if json_format is None:
+        json_format = environ.get("RIDEAPP_LOG_FORMAT", "text").lower() == "json"
+    if sample_every is None:
+        sample_every = int(environ.get("RIDEAPP_LOG_SAMPLE", 10))
+
+    if stream is not None:
+        output = logging.StreamHandler(stream)
+    elif environ.get("RIDEAPP_LOG_FILE"):
+        output = logging.FileHandler(environ["RIDEAPP_LOG_FILE"])
+    else:
+        output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    with _lock:
+        shutdown_logging()
+        log_queue = queue.Queue(QUEUE_SIZE)
+        handler = DroppingQueueHandler(log_queue)
+        handler.addFilter(SamplingFilter(sample_every))
+        root = logging.getLogger(ROOT_LOGGER)
+        root.handlers = [handler]
+        root.setLevel(level)
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(log_queue, output)
+        _listener.start()
+    return handler
+
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,286 @@
+"""
+In-process metrics: counters and latency histograms per manager operation,
+exported in the Prometheus text format.
+
+    @timed
+    def accept_ride(self, ride_id, driver_email): ...
+
+records rideapp_operations_total and rideapp_operation_duration_seconds
+labelled with the action ("RideManager.accept_ride") and its outcome: "ok",
+"failure" for (False, ...) result tuples, or "error" for exceptions. Read
+paths that swallow an exception and return an empty result call
+record_error() so the call still counts as "error".
+
+RIDEAPP_METRICS_PORT serves /metrics on localhost; RIDEAPP_METRICS_FILE
+rewrites a text file every RIDEAPP_METRICS_DUMP_SECONDS (for the
+node_exporter textfile collector). See start_exporters().
+"""
+
+import atexit
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+OPERATIONS_TOTAL = "rideapp_operations_total"
+OPERATION_SECONDS = "rideapp_operation_duration_seconds"
+
+# seconds; +Inf is implied
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics: a value lands in the first bucket >= it)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket (None when empty)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]  # beyond the last bound
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by metric name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._help = {
+            OPERATIONS_TOTAL: "Manager operations by action and outcome",
+            OPERATION_SECONDS: "Manager operation latency by action and outcome",
+        }
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    def inc(self, name, labels=None, value=1):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None, buckets=LATENCY_BUCKETS):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def record_operation(self, action, outcome, seconds):
+        """Count and time one manager operation"""
+        key = (("action", action), ("outcome", outcome))
+        with self._lock:
+            self._counters[(OPERATIONS_TOTAL, key)] = self._counters.get((OPERATIONS_TOTAL, key), 0) + 1
+            histogram = self._histograms.get((OPERATION_SECONDS, key))
+            if histogram is None:
+                histogram = self._histograms[(OPERATION_SECONDS, key)] = Histogram()
+            histogram.observe(seconds)
+
+    def counter_value(self, name, labels=None):
+        return self._counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name, labels=None):
+        return self._histograms.get(self._key(name, labels))
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def summary(self, name=OPERATION_SECONDS):
+        """{label text: {"count", "p50", "p99", "mean"}} for a histogram, latencies in seconds"""
+        with self._lock:
+            histograms = [(labels, h) for (metric, labels), h in self._histograms.items() if metric == name]
+            result = {}
+            for labels, histogram in sorted(histograms):
+                result[_label_text(labels) or name] = {
+                    "count": histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                }
+            return result
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(h.counts), h.sum, h.count, h.buckets)
+                                for key, h in self._histograms.items())
+        described = set()
+
+        def header(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for (name, labels), counts, total, count, buckets in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Write the Prometheus text to path atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
+
+
+def outcome_of(result):
+    """"ok", or "failure" for a (False, ...) result tuple"""
+    # managers report expected failures as (False, ..., message) tuples
+    if isinstance(result, tuple) and result and result[0] is False:
+        return "failure"
+    return "ok"
+
+
+_call_state = threading.local()
+
+
+def record_error():
+    """Mark the innermost running @timed call as an "error" although it returns normally"""
+    _call_state.failed = True
+
+
+# Sees every @timed call when set (utils.trace records them): enter() before
+# the call returns a token for exit(token, action, fn, args, kwargs, seconds, outcome, result)
+_call_hook = None
+
+
+def set_call_hook(hook):
+    global _call_hook
+    _call_hook = hook
+
+
+def timed(action=None, registry=None):
+    """Decorator recording count and latency per call; use as @timed or @timed("action")"""
+    if callable(action):
+        return timed()(action)
+
+    def decorate(fn):
+        name = action or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            hook = _call_hook
+            token = hook.enter() if hook is not None else None
+            started = time.perf_counter()
+            outcome = "error"
+            result = None
+            outer_failed = getattr(_call_state, "failed", False)
+            _call_state.failed = False
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "error" if _call_state.failed else outcome_of(result)
+                return result
+            finally:
+                _call_state.failed = outer_failed
+                elapsed = time.perf_counter() - started
+                (registry or metrics).record_operation(name, outcome, elapsed)
+                if hook is not None:
+                    hook.exit(token, name, fn, args, kwargs, elapsed, outcome, result)
+        return wrapper
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = metrics
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1", registry=None):
+    """Serve GET /metrics on a daemon thread; returns the HTTP server"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry or metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _dump_periodically(registry, path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            registry.dump(path)
+        except OSError:
+            pass
+
+
+def start_exporters(environ=None, registry=None):
+    """Start the exporters configured by RIDEAPP_METRICS_PORT / RIDEAPP_METRICS_FILE"""
+    environ = os.environ if environ is None else environ
+    registry = registry or metrics
+    port = environ.get("RIDEAPP_METRICS_PORT")
+    if port:
+        serve_metrics(int(port), registry=registry)
+    path = environ.get("RIDEAPP_METRICS_FILE")
+    if path:
+        interval = float(environ.get("RIDEAPP_METRICS_DUMP_SECONDS", 15))
+        threading.Thread(target=_dump_periodically, args=(registry, path, interval),
+                         name="metrics-dump", daemon=True).start()
+        atexit.register(registry.dump, path)
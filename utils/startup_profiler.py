@@ -0,0 +1,110 @@
+"""
+Startup profiling for `python main.py --profile-startup`: per-module import
+times and the time until the first window is on screen
+"""
+
+import sys
+import threading
+import time
+
+
+class _TimedLoader:
+    """Wraps a module loader and reports how long executing the module took"""
+
+    def __init__(self, loader, profiler, name):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit(self._name)
+
+    def __getattr__(self, name):
+        # resource readers, get_source() etc. come from the real loader
+        return getattr(self._loader, name)
+
+
+class _TimingFinder:
+    """sys.meta_path entry that finds modules with the other finders and times their loaders"""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self.profiler, name)
+        return spec
+
+
+class StartupProfiler:
+    """Records import times (inclusive and self) and named startup milestones"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = {}  # module -> (inclusive seconds, self seconds, thread name)
+        self.marks = []  # (label, seconds since start)
+        self._local = threading.local()
+        self._finder = _TimingFinder(self)
+
+    def install(self):
+        """Time every import from now on"""
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+
+    def uninstall(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def _enter(self, name):
+        # imports nest: each frame is [name, start, time spent in nested imports]
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self, name):
+        stack = self._local.stack
+        _, started, nested = stack.pop()
+        elapsed = time.perf_counter() - started
+        if stack:
+            stack[-1][2] += elapsed
+        self.imports[name] = (elapsed, elapsed - nested, threading.current_thread().name)
+
+    def mark(self, label):
+        """Record a milestone such as "first window" """
+        self.marks.append((label, time.perf_counter() - self.start))
+
+    def watch_first_window(self, root, on_shown=None):
+        """Mark "first window" once root is mapped, then call on_shown()"""
+        def mapped(event):
+            if event.widget is root and not any(label == "first window" for label, _ in self.marks):
+                self.mark("first window")
+                if on_shown:
+                    on_shown()
+        root.bind("<Map>", mapped, add="+")
+
+    def report(self, top=20):
+        """Text report: milestones, then the slowest imports by self time"""
+        lines = ["=== STARTUP PROFILE ==="]
+        for label, seconds in self.marks:
+            lines.append(f"{label:<28} {seconds * 1000:9.1f} ms")
+        total_self = sum(own for _, own, _ in self.imports.values())
+        lines.append(f"{len(self.imports)} modules imported, {total_self * 1000:.1f} ms in imports")
+        lines.append(f"{'module':<40} {'self ms':>9} {'total ms':>9}  thread")
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        for name, (inclusive, own, thread) in slowest:
+            lines.append(f"{name:<40} {own * 1000:9.1f} {inclusive * 1000:9.1f}  {thread}")
+        return "\n".join(lines)
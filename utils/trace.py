@@ -0,0 +1,221 @@
+"""
+Request traces: every manager call made through @timed (method, arguments,
+outcome, latency and a summary of the result) as one JSONL line, for
+time-scaled replay with replay.py.
+
+Recording sets the call hook in utils.metrics; only the outermost call on a
+thread is recorded, so replaying never repeats nested calls. Arguments are
+pseudonymized with a per-trace random key: an email maps to the same
+pseudonym throughout one trace but cannot be recovered from it, passwords
+become REPLAY_PASSWORD, and ride ids and other enumerated values are kept.
+Coordinates are shifted by a per-trace offset and snapped to a grid of
+about 1 km, so distances between recorded points survive but positions do
+not; distances in km are rounded to 0.1.
+Lines are serialized and written by a background thread; when it falls
+behind, calls are dropped and counted instead of slowing the caller.
+
+RIDEAPP_TRACE_FILE enables recording ("{pid}" in the path is replaced by
+the process id, for multi-worker API servers).
+"""
+
+import atexit
+import hashlib
+import hmac
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime
+from utils.metrics import set_call_hook
+
+TRACE_VERSION = 1
+QUEUE_SIZE = 10000
+REPLAY_PASSWORD = "replay-password"
+RIDE_ID_PREFIX = "RIDE"
+COORDINATE_GRID = 0.01  # degrees, about 1 km
+COORDINATE_SHIFT = 0.5  # largest per-trace offset, degrees
+
+# argument names whose string values are recorded as they are
+PLAIN_ARGUMENTS = {"ride_id", "after", "payment_method", "role", "bucket", "user_type", "statuses", "workload"}
+
+_recorder = None
+_lock = threading.Lock()
+
+
+def _message(value):
+    # manager messages are constant up to an optional ": <exception text>"
+    return value.split(":", 1)[0]
+
+
+def summarize(result):
+    """A small, value-free description of a manager result, comparable across runs"""
+    if result is None or isinstance(result, (bool, int, float)):
+        return result
+    if isinstance(result, str):
+        return result if result.startswith(RIDE_ID_PREFIX) else "str"
+    if isinstance(result, tuple):
+        summary = [summarize(item) for item in result]
+        if result and isinstance(result[-1], str) and not result[-1].startswith(RIDE_ID_PREFIX):
+            summary[-1] = _message(result[-1])
+        return summary
+    if isinstance(result, (list, set)):
+        return {"len": len(result)}
+    if isinstance(result, dict):
+        return {"keys": sorted(str(key) for key in result)}
+    if isinstance(result, (datetime, date)):
+        return "datetime"
+    return {"type": type(result).__name__}
+
+
+class TraceRecorder:
+    """Call hook writing one JSONL line per outermost manager call"""
+
+    def __init__(self, path, secret=None, queue_size=QUEUE_SIZE):
+        self.path = path
+        self._secret = secret or os.urandom(32)
+        digest = hmac.new(self._secret, b"coordinates", hashlib.sha256).digest()
+        self._lat_shift, self._lng_shift = (
+            (int.from_bytes(digest[i:i + 4], "big") / 2 ** 32 - 0.5) * 2 * COORDINATE_SHIFT for i in (0, 4))
+        self._queue = queue.Queue(queue_size)
+        self._local = threading.local()
+        self._threads = {}  # thread ident -> small index
+        self._signatures = {}  # function -> inspect.Signature
+        self._clock = time.perf_counter()
+        self.dropped = 0
+        self._file = open(path, "w")
+        self._file.write(json.dumps({"trace": TRACE_VERSION, "started": time.time(), "pid": os.getpid()}) + "\n")
+        self._writer = threading.Thread(target=self._write_loop, name="trace-writer", daemon=True)
+        self._writer.start()
+
+    # ---- call hook (runs on the caller's thread, keep it cheap) ----
+    def enter(self):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        return None if depth else time.perf_counter()
+
+    def exit(self, token, action, fn, args, kwargs, seconds, outcome, result):
+        self._local.depth -= 1
+        if token is None:
+            return  # nested in a recorded call
+        try:
+            self._queue.put_nowait((token, threading.get_ident(), action, fn, args, kwargs, seconds, outcome, result))
+        except queue.Full:
+            self.dropped += 1
+
+    # ---- writer thread ----
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._file.write(json.dumps(self._entry(*item), separators=(",", ":")) + "\n")
+            except Exception:
+                self.dropped += 1
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def _entry(self, started, thread, action, fn, args, kwargs, seconds, outcome, result):
+        return {
+            "t": round(started - self._clock, 6),
+            "th": self._threads.setdefault(thread, len(self._threads)),
+            "op": action,
+            "args": self._arguments(fn, args, kwargs),
+            "ms": round(seconds * 1000, 3),
+            "out": outcome,
+            "res": summarize(result),
+        }
+
+    def _arguments(self, fn, args, kwargs):
+        signature = self._signatures.get(fn)
+        if signature is None:
+            signature = self._signatures[fn] = inspect.signature(fn)
+        arguments = signature.bind(*args, **kwargs).arguments
+        arguments.pop("self", None)
+        return {name: self._scrub(name, value) for name, value in arguments.items()}
+
+    def _pseudonym(self, value):
+        return hmac.new(self._secret, value.encode(), hashlib.sha256).hexdigest()[:12]
+
+    def _coordinate(self, name, value):
+        if name == "lat" or name.endswith("_lat"):
+            value = min(90.0, max(-90.0, value + self._lat_shift))
+        else:
+            value = (value + self._lng_shift + 180) % 360 - 180
+        return round(round(value / COORDINATE_GRID) * COORDINATE_GRID, 2)
+
+    def _scrub(self, name, value):
+        if value is None or isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            if name in ("lat", "lng") or name.endswith(("_lat", "_lng")):
+                return self._coordinate(name, value)
+            if name.endswith("_km"):
+                return round(value, 1)
+            return value
+        if isinstance(value, str):
+            if name in PLAIN_ARGUMENTS:
+                return value
+            if "password" in name:
+                return REPLAY_PASSWORD
+            if "email" in name:
+                return f"u{self._pseudonym(value)}@trace.invalid"
+            if name == "phone":
+                return "5550000000"
+            if "license" in name:
+                return f"LIC{self._pseudonym(value)}"
+            return f"{name}-{self._pseudonym(value)}"
+        if isinstance(value, dict):
+            return {str(key): self._scrub(name, item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._scrub(name, item) for item in value]
+        # model objects etc. cannot be replayed
+        return {"$type": type(value).__name__}
+
+    def close(self):
+        """Write out queued calls and close the file"""
+        self._queue.put(None)
+        self._writer.join()
+
+
+def start_tracing(path, secret=None):
+    """Record manager calls to path until stop_tracing()"""
+    global _recorder
+    with _lock:
+        if _recorder is not None:
+            _stop()
+        _recorder = TraceRecorder(path.replace("{pid}", str(os.getpid())), secret)
+        set_call_hook(_recorder)
+        return _recorder
+
+
+def _stop():
+    global _recorder
+    set_call_hook(None)
+    _recorder.close()
+    _recorder = None
+
+
+def stop_tracing():
+    """Stop recording; returns the number of calls dropped"""
+    with _lock:
+        if _recorder is None:
+            return 0
+        dropped = _recorder.dropped
+        _stop()
+        return dropped
+
+
+def start_from_env(environ=None):
+    """Start recording when RIDEAPP_TRACE_FILE is set"""
+    environ = os.environ if environ is None else environ
+    path = environ.get("RIDEAPP_TRACE_FILE")
+    if path:
+        return start_tracing(path)
+    return None
+
+
+atexit.register(stop_tracing)